@@ -11,6 +11,7 @@ from torchvision import transforms
 from PIL import Image
 from soil_classifier.model import get_model
 from soil_classifier.dataset import load_data
+from pachacutin_camera.sources import CAMERA_SOURCE, open_capture
 
 # ---------- Estado compartido ----------
 latest_soil = {"soil_moisture": 40.0, "ts_soil": None}
@@ -79,11 +80,13 @@ def update_camera():
             time.sleep(5)
         return
 
-    cap = cv2.VideoCapture(0)
+    # CAMERA_SOURCE: índice de /dev/videoN o "bus" para leer del daemon de cámara
+    cap = open_capture(CAMERA_SOURCE)
     try:
         while True:
             if not cap.isOpened():
-                cap.open(0)
+                cap.release()
+                cap = open_capture(CAMERA_SOURCE)
                 time.sleep(0.5)
             ok, frame = cap.read()
             if not ok:
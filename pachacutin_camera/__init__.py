@@ -0,0 +1,2 @@
+# Piezas de cámara compartidas entre pachacutin_ai, pachacutin_unified,
+# usb_cam_server y soil_classifier (bus de frames, fuentes de video).
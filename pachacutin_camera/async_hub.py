@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming MJPEG asíncrono (ASGI) compartido por usb_cam_server/asgi.py y
+pachacutin_unified/asgi.py.
+
+Con uvicorn, `await send(...)` solo deja los bytes en el buffer del
+transporte asyncio (64 KiB por defecto) y este los pasa al socket sin
+esperar al cliente: un visor lento acumularía segundos de video sin que
+ninguna cuenta lo note. serve() arranca uvicorn con la cola de envío
+acotada por conexión (transporte y kernel), y stream_mjpeg() espera a que la parte salga del
+transporte antes de medir su latencia y de tomar el frame siguiente.
+"""
+import asyncio
+import threading
+import time
+
+from pachacutin_camera.streaming import CONTENT_TYPE, limit_send_buffer, mjpeg_part
+
+
+def _offer(queue, item):
+    # cola de 1 elemento: si el cliente no alcanzó a enviar el anterior, se reemplaza
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(item)
+
+
+class AsyncFrameHub:
+    """
+    Puente entre el hilo de captura y los clientes asyncio.
+
+    Un único hilo "pump" espera cada frame nuevo, codifica una vez cada
+    variante (w, h, q) pedida y deja el resultado en la cola de cada
+    suscriptor con `call_soon_threadsafe`. Los clientes no ocupan hilos:
+    solo una corrutina y una cola de tamaño 1.
+
+    `wait_new(last_seq, timeout)` debe bloquear hasta que exista un frame con
+    secuencia mayor y retornarla (o `last_seq` si vence el timeout).
+    `encode(*variant)` retorna (seq, ts, jpeg) del último frame en esa variante
+    (variant = (w, h, q) o (w, h, q, overlay)).
+    """
+
+    def __init__(self, wait_new, encode):
+        self._wait_new = wait_new
+        self._encode = encode
+        self._subs = {}
+        self._lock = threading.Lock()
+        self._has_subs = threading.Event()
+        self._thread = None
+
+    def subscribe(self, loop, variant=(None, None, None)):
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            self._subs[queue] = (loop, variant)
+            self._has_subs.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._pump, daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subs.pop(queue, None)
+            if not self._subs:
+                self._has_subs.clear()
+
+    def count(self):
+        with self._lock:
+            return len(self._subs)
+
+    def _pump(self):
+        seq = 0
+        while True:
+            if not self._has_subs.wait(timeout=5.0):
+                continue
+            t0 = time.monotonic()
+            new_seq = self._wait_new(seq, 1.0)
+            if new_seq <= seq:
+                # cámara detenida: wait_new retorna al instante, evitar girar en vacío
+                if time.monotonic() - t0 < 0.05:
+                    time.sleep(0.2)
+                continue
+            seq = new_seq
+            with self._lock:
+                groups = {}
+                for queue, (loop, variant) in self._subs.items():
+                    groups.setdefault(variant, []).append((loop, queue))
+            for variant, subs in groups.items():
+                item = self._encode(*variant)
+                if item[2] is None:
+                    continue
+                for loop, queue in subs:
+                    try:
+                        loop.call_soon_threadsafe(_offer, queue, item)
+                    except RuntimeError:
+                        # el loop del cliente ya se cerró
+                        self.unsubscribe(queue)
+
+
+async def _watch_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def stream_mjpeg(hub, send, receive, client, variant=(None, None, None), fps=None, active=None,
+                       timing=None):
+    """
+    Envía multipart/x-mixed-replace a un cliente ASGI hasta que se desconecte
+    (o `active()` sea False). Con `timing` (StageTimer) registra handoff
+    (captura -> turno de este cliente) y send (hasta que la parte salió del
+    transporte).
+    """
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", CONTENT_TYPE.encode()),
+            (b"cache-control", b"no-store, no-cache, must-revalidate, max-age=0"),
+        ],
+    })
+    loop = asyncio.get_running_loop()
+    queue = hub.subscribe(loop, variant)
+    disconnect = asyncio.ensure_future(_watch_disconnect(receive))
+    interval = 1.0 / fps if fps else 0.0
+    next_due = 0.0
+    try:
+        while not disconnect.done() and (active is None or active()):
+            if interval:
+                wait = next_due - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                next_due = time.monotonic() + interval
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnect}, timeout=1.0,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                continue
+            seq, ts, jpeg = getter.result()
+            if not client.accept(seq, ts):
+                continue
+            if timing is not None:
+                timing.record("handoff", time.time() - ts)
+            t_send = time.monotonic()
+            await send({
+                "type": "http.response.body",
+                "body": mjpeg_part(seq, ts, jpeg),
+                "more_body": True,
+            })
+            # un cuerpo vacío no escribe nada, pero uvicorn lo hace esperar a que el
+            # transporte drene si la parte anterior lo llenó (write paused)
+            await send({"type": "http.response.body", "body": b"", "more_body": True})
+            # send = escritura real de la parte (incluida la espera al cliente), no solo el await
+            if timing is not None:
+                timing.record("send", time.monotonic() - t_send)
+            client.sent(ts)
+    finally:
+        hub.unsubscribe(queue)
+        disconnect.cancel()
+
+
+def bounded_h11(send_buffer):
+    """Protocolo HTTP (h11) de uvicorn con la cola de envío (kernel y transporte) en `send_buffer` bytes."""
+    from uvicorn.protocols.http.h11_impl import H11Protocol
+
+    class BoundedH11Protocol(H11Protocol):
+        def connection_made(self, transport):
+            super().connection_made(transport)
+            limit_send_buffer(transport.get_extra_info("socket"), send_buffer)
+            # pasado este límite asyncio pausa la escritura y el próximo send() espera
+            transport.set_write_buffer_limits(high=send_buffer)
+
+    return BoundedH11Protocol
+
+
+def serve(app, host, port, send_buffer=0, **kwargs):
+    """uvicorn.run(app) con los buffers de envío acotados (send_buffer=0: los de siempre)."""
+    import uvicorn
+
+    if send_buffer:
+        kwargs["http"] = bounded_h11(send_buffer)
+    uvicorn.run(app, host=host, port=port, **kwargs)
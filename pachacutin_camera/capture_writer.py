@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import queue
+import threading
+
+
+class CaptureWriter:
+    """
+    Escritura diferida (write-behind) de capturas.
+
+    /capture entrega los bytes JPEG ya codificados y responde de inmediato;
+    un pool pequeño de hilos los escribe a disco desde una cola acotada.
+    Mientras la escritura está pendiente, la captura se sirve desde memoria
+    con get_pending(). Si la cola se llena, se escribe en el hilo de la
+    petición (la memoria nunca crece sin límite).
+    """
+
+    def __init__(self, directory, workers=2, max_pending=32, on_written=None, on_failed=None):
+        self.directory = directory
+        self.workers = workers
+        self.on_written = on_written
+        self.on_failed = on_failed
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self.written = 0
+        self.sync_writes = 0
+        self.errors = 0
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"capture-writer-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, name, data):
+        """Encola `data` para escribirse como `name` dentro del directorio de capturas."""
+        with self._lock:
+            self._pending[name] = data
+            self._ensure_workers()
+        try:
+            self._queue.put_nowait((name, data))
+        except queue.Full:
+            # cola llena: escribir aquí mismo en lugar de acumular en memoria
+            self.sync_writes += 1
+            self._write(name, data)
+
+    def get_pending(self, name):
+        """Bytes de una captura aún no escrita a disco (o None)."""
+        with self._lock:
+            return self._pending.get(name)
+
+    def path_for(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write(self, name, data):
+        path = self.path_for(name)
+        failed = False
+        tmp = path + ".part"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self.written += 1
+        except OSError as e:
+            self.errors += 1
+            failed = True
+            print(f"[ERROR] No se pudo guardar {name}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+        if failed:
+            if self.on_failed is not None:
+                self.on_failed(name)
+            return
+        if self.on_written is not None:
+            try:
+                self.on_written(name, path, data)
+            except Exception as e:
+                print(f"[WARN] on_written({name}) falló: {e}")
+
+    def _worker(self):
+        while True:
+            name, data = self._queue.get()
+            try:
+                self._write(name, data)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Bloquea hasta que todo lo encolado esté en disco."""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "written": self.written,
+                "sync_writes": self.sync_writes, "errors": self.errors}
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Codificación/decodificación JPEG intercambiable.
+
+    "opencv"     -> cv2.imencode / cv2.imdecode (siempre disponible)
+    "turbojpeg"  -> libjpeg-turbo vía PyTurboJPEG (pip install PyTurboJPEG),
+                    con DCT rápida y submuestreo de croma configurables
+    "auto"       -> turbojpeg si está instalado, si no opencv
+
+Todos los backends exponen encode(frame, quality) -> bytes | None y
+decode(data, scale=1.0, gray=False) -> ndarray | None. Con scale < 1 la
+imagen se decodifica ya reducida (1/2, 1/4 u 1/8 en el dominio DCT), lo que
+sirve para miniaturas y detección de movimiento sin pagar el tamaño completo.
+
+El backend por defecto se elige con PACHACUTIN_JPEG_CODEC,
+PACHACUTIN_JPEG_SUBSAMPLING ("444", "422", "420", "gray") y
+PACHACUTIN_JPEG_FAST_DCT=1.
+
+Benchmark (desde la raíz del repo):
+    python -m pachacutin_camera.codec
+    python -m pachacutin_camera.codec --sizes 640x480,1280x720 --quality 70,80 --json
+    python -m pachacutin_camera.codec --source "dir:soil_classifier/dataset"
+"""
+import os
+import time
+
+import numpy as np
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+try:
+    import turbojpeg
+except Exception:
+    turbojpeg = None
+
+JPEG_CODEC = os.environ.get("PACHACUTIN_JPEG_CODEC", "opencv")
+JPEG_SUBSAMPLING = os.environ.get("PACHACUTIN_JPEG_SUBSAMPLING", "")   # "" = el del backend
+JPEG_FAST_DCT = os.environ.get("PACHACUTIN_JPEG_FAST_DCT", "0") == "1"
+
+SUBSAMPLINGS = ("444", "422", "420", "gray")
+
+
+def _reduction(scale):
+    """Mayor divisor (1, 2, 4, 8) que no deja la imagen por debajo de `scale`."""
+    for d in (8, 4, 2):
+        if scale <= 1.0 / d:
+            return d
+    return 1
+
+
+class OpenCVCodec:
+    name = "opencv"
+
+    def __init__(self, subsampling=None, fast_dct=False):
+        self.subsampling = subsampling or None
+        # libjpeg dentro de OpenCV no expone la DCT rápida: se acepta y se ignora
+        self.fast_dct = False
+        self._extra = []
+        flag = {
+            "444": "IMWRITE_JPEG_SAMPLING_FACTOR_444",
+            "422": "IMWRITE_JPEG_SAMPLING_FACTOR_422",
+            "420": "IMWRITE_JPEG_SAMPLING_FACTOR_420",
+        }.get(self.subsampling)
+        if flag and hasattr(cv2, flag):
+            self._extra = [int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), int(getattr(cv2, flag))]
+
+    def encode(self, frame, quality=80):
+        if self.subsampling == "gray" and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)] + self._extra)
+        return buf.tobytes() if ok else None
+
+    def decode(self, data, scale=1.0, gray=False):
+        flag = {
+            (1, False): cv2.IMREAD_COLOR, (1, True): cv2.IMREAD_GRAYSCALE,
+            (2, False): cv2.IMREAD_REDUCED_COLOR_2, (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+            (4, False): cv2.IMREAD_REDUCED_COLOR_4, (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+            (8, False): cv2.IMREAD_REDUCED_COLOR_8, (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+        }[(_reduction(scale), bool(gray))]
+        return cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+
+    def info(self):
+        return {"name": self.name, "subsampling": self.subsampling, "fast_dct": self.fast_dct,
+                "version": cv2.__version__}
+
+
+class TurboJPEGCodec:
+    name = "turbojpeg"
+
+    def __init__(self, subsampling=None, fast_dct=False, lib_path=None):
+        if turbojpeg is None:
+            raise RuntimeError("PyTurboJPEG no está instalado")
+        self._tj = turbojpeg.TurboJPEG(lib_path) if lib_path else turbojpeg.TurboJPEG()
+        self.subsampling = subsampling or "420"
+        self.fast_dct = bool(fast_dct)
+        self._samp = {
+            "444": turbojpeg.TJSAMP_444, "422": turbojpeg.TJSAMP_422,
+            "420": turbojpeg.TJSAMP_420, "gray": turbojpeg.TJSAMP_GRAY,
+        }[self.subsampling]
+        self._flags = turbojpeg.TJFLAG_FASTDCT if self.fast_dct else 0
+        # al decodificar también se permite el upsampling rápido de croma
+        self._dflags = (turbojpeg.TJFLAG_FASTDCT | turbojpeg.TJFLAG_FASTUPSAMPLE) if self.fast_dct else 0
+
+    def encode(self, frame, quality=80):
+        fmt = turbojpeg.TJPF_GRAY if frame.ndim == 2 else turbojpeg.TJPF_BGR
+        samp = turbojpeg.TJSAMP_GRAY if frame.ndim == 2 else self._samp
+        try:
+            return self._tj.encode(frame, quality=int(quality), pixel_format=fmt,
+                                   jpeg_subsample=samp, flags=self._flags)
+        except (OSError, ValueError):
+            return None
+
+    def decode(self, data, scale=1.0, gray=False):
+        d = _reduction(scale)
+        try:
+            return self._tj.decode(data, pixel_format=turbojpeg.TJPF_GRAY if gray else turbojpeg.TJPF_BGR,
+                                   scaling_factor=(1, d) if d > 1 else None, flags=self._dflags)
+        except (OSError, ValueError):
+            return None
+
+    def info(self):
+        return {"name": self.name, "subsampling": self.subsampling, "fast_dct": self.fast_dct,
+                "version": getattr(turbojpeg, "__version__", None)}
+
+
+BACKENDS = {"opencv": OpenCVCodec, "turbojpeg": TurboJPEGCodec}
+
+
+def available():
+    """Nombres de los backends que se pueden usar en esta máquina."""
+    names = ["opencv"] if cv2 is not None else []
+    if turbojpeg is not None:
+        try:
+            turbojpeg.TurboJPEG()
+            names.append("turbojpeg")
+        except Exception:
+            pass   # módulo instalado pero sin libturbojpeg
+    return names
+
+
+def make_codec(name=None, subsampling=None, fast_dct=None):
+    """Crea el backend pedido (por defecto el de las variables de entorno); si no está, cae a opencv."""
+    name = (name or JPEG_CODEC).lower()
+    subsampling = JPEG_SUBSAMPLING if subsampling is None else subsampling
+    fast_dct = JPEG_FAST_DCT if fast_dct is None else fast_dct
+    if subsampling and subsampling not in SUBSAMPLINGS:
+        print(f"[WARN] Submuestreo JPEG desconocido '{subsampling}', se usa el del backend")
+        subsampling = None
+    if name == "auto":
+        name = "turbojpeg" if "turbojpeg" in available() else "opencv"
+    if name == "turbojpeg":
+        try:
+            return TurboJPEGCodec(subsampling, fast_dct)
+        except Exception as e:
+            print(f"[WARN] Codec turbojpeg no disponible ({e}); se usa opencv")
+    elif name != "opencv":
+        print(f"[WARN] Codec JPEG desconocido '{name}'; se usa opencv")
+    return OpenCVCodec(subsampling, fast_dct)
+
+
+_default = None
+
+
+def default_codec():
+    """Backend compartido del proceso (creado con la configuración de entorno la primera vez)."""
+    global _default
+    if _default is None:
+        _default = make_codec()
+    return _default
+
+
+# --------------------------------------------------------------------------- benchmark
+
+def _bench_frames(source, size, count):
+    """`count` frames BGR de `size`: de una fuente (dir:, file:...) o sintéticos."""
+    from pachacutin_camera.sources import SyntheticSource, open_capture
+    cap = open_capture(source) if source else SyntheticSource(size[0], size[1], clock="virtual")
+    frames = []
+    try:
+        for _ in range(count * 4):
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                break
+            if (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            frames.append(frame.copy())
+            if len(frames) >= count:
+                break
+    finally:
+        cap.release()
+    if not frames:
+        raise SystemExit(f"❌ No se pudieron leer frames de {source}")
+    return frames
+
+
+def benchmark(codec, frames, quality, repeat=3, decode_scale=0.25):
+    """ms/frame y MB/s (de píxeles BGR crudos) de encode, decode y decode reducido."""
+    raw_bytes = frames[0].nbytes
+    encoded = [codec.encode(f, quality) for f in frames]   # calentamiento + muestras para decode
+    if any(e is None for e in encoded):
+        return None
+
+    def _run(fn, items):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for item in items:
+                fn(item)
+            dt = (time.perf_counter() - t0) / len(items)
+            best = dt if best is None else min(best, dt)
+        return best
+
+    enc = _run(lambda f: codec.encode(f, quality), frames)
+    dec = _run(lambda d: codec.decode(d), encoded)
+    dec_small = _run(lambda d: codec.decode(d, scale=decode_scale), encoded)
+    h, w = frames[0].shape[:2]
+    return {
+        "codec": codec.name,
+        "subsampling": codec.subsampling,
+        "fast_dct": codec.fast_dct,
+        "size": f"{w}x{h}",
+        "quality": quality,
+        "encode_ms": round(enc * 1000, 3),
+        "encode_mb_s": round(raw_bytes / enc / 1e6, 1),
+        "decode_ms": round(dec * 1000, 3),
+        "decode_mb_s": round(raw_bytes / dec / 1e6, 1),
+        f"decode_1_{_reduction(decode_scale)}_ms": round(dec_small * 1000, 3),
+        "jpeg_kb": round(sum(len(e) for e in encoded) / len(encoded) / 1024, 1),
+    }
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Benchmark de backends JPEG")
+    parser.add_argument("--codecs", default=",".join(available()),
+                        help="Backends a medir (opencv,turbojpeg)")
+    parser.add_argument("--sizes", default="320x240,640x480,1280x720,1920x1080")
+    parser.add_argument("--quality", default="70,80", help="Calidades JPEG separadas por coma")
+    parser.add_argument("--subsampling", default="", help="444, 422, 420 o gray (vacío = del backend)")
+    parser.add_argument("--fast-dct", action="store_true")
+    parser.add_argument("--frames", type=int, default=30, help="Frames distintos por tamaño")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--source", default=None,
+                        help="Fuente de frames reales (dir:..., file:...); por defecto sintética")
+    parser.add_argument("--json", action="store_true", help="Salida JSON en lugar de tabla")
+    args = parser.parse_args()
+
+    sizes = []
+    for text in args.sizes.split(","):
+        w, h = text.lower().split("x", 1)
+        sizes.append((int(w), int(h)))
+    qualities = [int(q) for q in args.quality.split(",") if q]
+    codecs = [make_codec(name, args.subsampling or None, args.fast_dct)
+              for name in args.codecs.split(",") if name]
+
+    results = []
+    for size in sizes:
+        frames = _bench_frames(args.source, size, args.frames)
+        for q in qualities:
+            for codec in codecs:
+                r = benchmark(codec, frames, q, repeat=args.repeat)
+                if r is not None:
+                    results.append(r)
+                    if not args.json:
+                        print(f"{r['codec']:>10} {r['size']:>10} q={q:<3} "
+                              f"enc {r['encode_ms']:7.2f} ms {r['encode_mb_s']:7.1f} MB/s | "
+                              f"dec {r['decode_ms']:7.2f} ms {r['decode_mb_s']:7.1f} MB/s | "
+                              f"dec 1/4 {r['decode_1_4_ms']:6.2f} ms | {r['jpeg_kb']:6.1f} KB")
+    if args.json:
+        print(json.dumps({"codecs": [c.info() for c in codecs], "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Daemon dueño de la cámara: abre /dev/videoN una sola vez y publica cada
+frame en el bus de memoria compartida para el resto de procesos.
+
+Uso (desde la raíz del repo):
+    python -m pachacutin_camera.daemon --index 0 --width 640 --height 480 --fps 15
+    python -m pachacutin_camera.daemon --source synthetic   # sin cámara (pruebas)
+Luego, en los demás procesos:
+    PACHACUTIN_CAMERA_SOURCE=bus python -m pachacutin_unified.run_unified
+"""
+import argparse
+import signal
+import time
+
+import cv2
+
+from pachacutin_camera.shm_bus import DEFAULT_NAME, FrameBusWriter
+from pachacutin_camera.sources import open_capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon de cámara -> bus de memoria compartida")
+    parser.add_argument("--index", type=int, default=0, help="Índice de /dev/videoN")
+    parser.add_argument("--source", default=None,
+                        help="Otra fuente en lugar de --index (file:..., dir:..., synthetic)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--slots", type=int, default=4, help="Tamaño del anillo de frames")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="Nombre del segmento de memoria compartida")
+    args = parser.parse_args()
+
+    running = True
+
+    def _stop(*_):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    source = args.source if args.source else args.index
+    cap = open_capture(source)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+    cap.set(cv2.CAP_PROP_FPS, args.fps)
+    if not cap.isOpened():
+        raise SystemExit(f"❌ No se pudo abrir la cámara {source}")
+
+    bus = FrameBusWriter(args.name, args.width, args.height, slots=args.slots)
+    print(f"[INFO] Publicando {source} en el bus '{args.name}' "
+          f"({args.width}x{args.height}, {args.slots} slots)")
+    size = (args.width, args.height)
+    try:
+        while running:
+            ok, frame = cap.read()
+            if not ok:
+                time.sleep(0.05)
+                continue
+            if (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size)
+            bus.publish(frame)
+    finally:
+        cap.release()
+        bus.close()
+        print("[INFO] Daemon de cámara detenido")
+
+
+if __name__ == "__main__":
+    main()
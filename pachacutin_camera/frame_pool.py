@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de buffers de frame preasignados.
+
+El hilo lector pide un buffer libre (acquire), escribe el frame ahí
+(cap.read(image=...) o cv2.resize(dst=...)) y lo publica. Los lectores no
+reciben el array del pool sino un *préstamo* (Lease): una vista de solo
+lectura que mantiene el buffer reservado hasta que se cierra, sin copias por
+lector ni datos a medio pisar y, en régimen, sin asignar memoria por frame.
+
+El préstamo se devuelve explícitamente (close() o `with`), así el buffer
+vuelve al pool apenas se terminó de usar. La vista no debe usarse después
+de cerrarlo: el hilo lector puede escribir otro frame en ese buffer.
+
+Si un préstamo se pierde sin cerrar, al recolectarse solo se anota en una
+cola (sin tomar el lock del pool, porque el recolector puede correr dentro
+de acquire()/stats()) y el pool la procesa en el próximo acquire().
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class _ReadOnly:
+    """Exporta el array del buffer como solo lectura."""
+
+    def __init__(self, array):
+        iface = dict(array.__array_interface__)
+        iface["data"] = (iface["data"][0], True)
+        self.__array_interface__ = iface
+
+
+class Lease:
+    """Préstamo de un FrameBuffer: `array` es válido hasta close()."""
+    __slots__ = ("array", "_buffer")
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self.array = np.asarray(_ReadOnly(buffer.array))
+
+    def close(self):
+        buffer, self._buffer = self._buffer, None
+        if buffer is not None:
+            buffer.release()
+
+    def __enter__(self):
+        return self.array
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # préstamo olvidado: nada de locks acá, el pool lo devuelve en acquire()
+        buffer, self._buffer = self._buffer, None
+        if buffer is not None:
+            buffer._pool._returned.append(buffer)
+
+
+class FrameBuffer:
+    __slots__ = ("array", "refs", "_pool")
+
+    def __init__(self, array, pool):
+        self.array = array
+        self.refs = 0
+        self._pool = pool
+
+    def retain(self):
+        with self._pool._lock:
+            self.refs += 1
+
+    def release(self):
+        with self._pool._lock:
+            self._release()
+
+    def _release(self):
+        if self.refs <= 0:
+            raise RuntimeError("FrameBuffer liberado más veces de las que se tomó")
+        self.refs -= 1
+
+    def lease(self):
+        """Préstamo de solo lectura que reserva el buffer hasta cerrarlo."""
+        self.retain()
+        return Lease(self)
+
+
+class FramePool:
+    def __init__(self, size=4, max_size=16):
+        self.size = size
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # préstamos recolectados sin cerrar (deque.append no necesita lock)
+        self._returned = deque()
+        self._shape = None
+        self._dtype = None
+        self._buffers = []
+        self.grown = 0       # buffers agregados porque los lectores retenían todos
+        self.overflow = 0    # pool al máximo: buffer temporal fuera del pool
+        self.reshaped = 0    # cambios de tamaño (p.ej. otro modo de cámara)
+        self.leaked = 0      # préstamos devueltos por el recolector y no con close()
+
+    def _drain_returned(self):
+        # con _lock tomado
+        while self._returned:
+            self._returned.popleft()._release()
+            self.leaked += 1
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Buffer libre de `shape` con una referencia ya tomada (la del escritor)."""
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            self._drain_returned()
+            if shape != self._shape or dtype != self._dtype:
+                # los buffers viejos siguen vivos mientras algún préstamo los use
+                self._buffers = [FrameBuffer(np.empty(shape, dtype), self) for _ in range(self.size)]
+                self._shape, self._dtype = shape, dtype
+                self.reshaped += 1
+            for buf in self._buffers:
+                if buf.refs == 0:
+                    buf.refs = 1
+                    return buf
+            buf = FrameBuffer(np.empty(shape, dtype), self)
+            buf.refs = 1
+            if len(self._buffers) < self.max_size:
+                self._buffers.append(buf)
+                self.grown += 1
+            else:
+                self.overflow += 1
+            return buf
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def stats(self):
+        with self._lock:
+            self._drain_returned()
+            return {
+                "shape": list(self._shape) if self._shape else None,
+                "buffers": len(self._buffers),
+                "in_use": sum(1 for b in self._buffers if b.refs),
+                "grown": self.grown,
+                "overflow": self.overflow,
+                "reshaped": self.reshaped,
+                "leaked": self.leaked,
+            }
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga del streaming MJPEG con visores simulados.
+
+Levanta usb_cam_server o pachacutin_unified con una fuente sintética (sin
+cámara), abre N clientes MJPEG (una parte de ellos limitados a poco ancho de
+banda, como un celular con datos) y mide por cliente los FPS recibidos, la
+latencia captura -> recepción (cabecera X-Timestamp) y los frames perdidos
+(saltos en X-Frame-Seq); del servidor, CPU y RSS. Repite con N creciente y
+guarda todo en JSON + CSV para comparar entre versiones.
+
+Uso (desde la raíz del repo):
+    python -m pachacutin_camera.loadtest --app usb --clients 1,4,8,16
+    python -m pachacutin_camera.loadtest --app unified --asgi --slow-fraction 0.5 --slow-kbps 128
+    python -m pachacutin_camera.loadtest --app usb --query "w=320&q=60" --out loadtest_results
+    python -m pachacutin_camera.loadtest --url http://192.168.1.50:5000/video   # servidor ya corriendo
+"""
+import argparse
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from pachacutin_camera.metrics import percentiles
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# fin de cada parte: EOI del JPEG + CRLF (el relleno FF00 impide que aparezca antes)
+_PART_END = b"\xff\xd9\r\n"
+
+
+# --------------------------------------------------------------------------- servidor
+
+def _launch(app, port, source, asgi):
+    """Arranca la app en un subproceso y retorna (Popen, ruta del stream, log de stderr)."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    if app == "usb":
+        boot = (
+            "import config; "
+            f"config.CAMERA_INDEX = {source!r}; config.CAMERA_PROBE = False; "
+            f"config.HOST = '127.0.0.1'; config.PORT = {port}; config.DEBUG = False; "
+        )
+        if asgi:
+            boot += ("import asgi; "
+                     f"asgi.serve(asgi.app, '127.0.0.1', {port}, send_buffer=config.STREAM_SEND_BUFFER, "
+                     "log_level='warning')")
+        else:
+            boot += f"import run; run.app.run(host='127.0.0.1', port={port}, threaded=True)"
+        cmd, cwd, path = [sys.executable, "-c", boot], os.path.join(REPO_ROOT, "usb_cam_server"), "/video"
+    else:
+        env.update(PACHACUTIN_CAMERA_SOURCE=source, PACHACUTIN_HOST="127.0.0.1",
+                   PACHACUTIN_PORT=str(port), PACHACUTIN_DEBUG="0")
+        module = "pachacutin_unified.asgi" if asgi else "pachacutin_unified.run_unified"
+        cmd, cwd, path = [sys.executable, "-m", module], REPO_ROOT, "/live"
+    # stderr a un archivo: un pipe que nadie lee se llena con los logs de cada
+    # petición y bloquea al servidor en plena medición
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    return proc, path, log
+
+
+def _get(base, path, timeout=5.0):
+    with urllib.request.urlopen(base + path, timeout=timeout) as r:
+        return json.loads(r.read().decode() or "null")
+
+
+def _wait_ready(base, proc, log=None, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            log.seek(0)
+            err = log.read().decode(errors="replace")[-2000:]
+            raise SystemExit(f"❌ El servidor terminó al arrancar:\n{err}")
+        try:
+            _get(base, "/stream_stats", timeout=1.0)
+            return
+        except Exception:
+            time.sleep(0.3)
+    raise SystemExit("❌ El servidor no respondió a tiempo")
+
+
+class ProcessMonitor(threading.Thread):
+    """Muestrea CPU (%) y RSS (MB) de un proceso desde /proc (o psutil si está)."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []   # (t, cpu_s, rss_mb)
+        self._halt = threading.Event()
+        self._lock = threading.Lock()
+        try:
+            import psutil
+            self._proc = psutil.Process(pid)
+        except Exception:
+            self._proc = None
+        self._tick = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _read(self):
+        if self._proc is not None:
+            t = self._proc.cpu_times()
+            return t.user + t.system, self._proc.memory_info().rss / 1e6
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / self._tick
+        rss = None
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) / 1024.0
+        return cpu, rss
+
+    def run(self):
+        while not self._halt.is_set():
+            try:
+                cpu, rss = self._read()
+            except Exception:
+                return   # proceso terminado o sin /proc
+            with self._lock:
+                self.samples.append((time.monotonic(), cpu, rss))
+            self._halt.wait(self.interval)
+
+    def window(self, t0, t1):
+        """CPU medio (% de un núcleo) y RSS máximo entre t0 y t1."""
+        with self._lock:
+            s = [x for x in self.samples if t0 <= x[0] <= t1]
+        if len(s) < 2:
+            return {"cpu_percent": None, "rss_mb_max": None}
+        cpu = (s[-1][1] - s[0][1]) / (s[-1][0] - s[0][0]) * 100
+        rss = [x[2] for x in s if x[2] is not None]
+        return {"cpu_percent": round(cpu, 1), "rss_mb_max": round(max(rss), 1) if rss else None}
+
+    def stop(self):
+        self._halt.set()
+
+
+# --------------------------------------------------------------------------- clientes
+
+class MJPEGClient(threading.Thread):
+    """Visor simulado: lee el multipart y registra fps, latencia y saltos de secuencia."""
+
+    def __init__(self, host, port, path, rate_bps=None, name=None):
+        super().__init__(daemon=True, name=name)
+        self.host, self.port, self.path = host, port, path
+        self.rate_bps = rate_bps
+        self._halt = threading.Event()
+        self._lock = threading.Lock()
+        self.error = None
+        self.reset()
+
+    def reset(self):
+        """Empieza una ventana de medición nueva (descarta el calentamiento)."""
+        with self._lock:
+            self.t0 = time.monotonic()
+            self.frames = 0
+            self.bytes = 0
+            self.dropped = 0
+            self.latencies_ms = []
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.rate_bps:
+            # buffer chico: el servidor siente la contrapresión como en un enlace lento real
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)
+        sock.settimeout(5.0)
+        sock.connect((self.host, self.port))
+        sock.sendall(f"GET {self.path} HTTP/1.0\r\nHost: {self.host}\r\nConnection: close\r\n\r\n".encode())
+        return sock
+
+    def run(self):
+        try:
+            sock = self._connect()
+        except OSError as e:
+            self.error = str(e)
+            return
+        buf = b""
+        headers_done = False
+        last_seq = None
+        started = time.monotonic()
+        received = 0
+        try:
+            while not self._halt.is_set():
+                try:
+                    data = sock.recv(4096 if self.rate_bps else 65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    self.error = self.error or "closed"
+                    break
+                received += len(data)
+                if self.rate_bps:
+                    # token bucket: no superar rate_bps en promedio
+                    ahead = received / self.rate_bps - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                buf += data
+                if not headers_done:
+                    end = buf.find(b"\r\n\r\n")
+                    if end < 0:
+                        continue
+                    status = buf.split(b"\r\n", 1)[0]
+                    if b" 200 " not in status + b" ":
+                        self.error = status.decode(errors="replace")
+                        break
+                    buf = buf[end + 4:]
+                    headers_done = True
+                while True:
+                    start = buf.find(b"--frame\r\n")
+                    if start < 0:
+                        break
+                    head_end = buf.find(b"\r\n\r\n", start)
+                    if head_end < 0:
+                        break
+                    body_end = buf.find(_PART_END, head_end + 4)
+                    if body_end < 0:
+                        break
+                    now = time.time()
+                    head = buf[start:head_end].decode(errors="replace").split("\r\n")
+                    part = dict(h.split(": ", 1) for h in head[1:] if ": " in h)
+                    size = body_end + 2 - (head_end + 4)
+                    buf = buf[body_end + len(_PART_END):]
+                    self._on_frame(now, part, size)
+                    last_seq = self._seq_gap(part, last_seq)
+        except OSError as e:
+            self.error = str(e)
+        finally:
+            sock.close()
+
+    def _on_frame(self, now, part, size):
+        with self._lock:
+            self.frames += 1
+            self.bytes += size
+            ts = part.get("X-Timestamp")
+            if ts:
+                self.latencies_ms.append((now - float(ts)) * 1000.0)
+
+    def _seq_gap(self, part, last_seq):
+        seq = part.get("X-Frame-Seq")
+        if seq is None:
+            return last_seq
+        seq = int(seq)
+        if last_seq is not None and seq > last_seq + 1:
+            with self._lock:
+                self.dropped += seq - last_seq - 1
+        return seq
+
+    def result(self):
+        with self._lock:
+            elapsed = max(1e-6, time.monotonic() - self.t0)
+            lat = percentiles(self.latencies_ms)
+            return {
+                "name": self.name,
+                "throttled_kbps": round(self.rate_bps * 8 / 1000) if self.rate_bps else None,
+                "frames": self.frames,
+                "fps": round(self.frames / elapsed, 2),
+                "kbps": round(self.bytes * 8 / elapsed / 1000, 1),
+                "dropped": self.dropped,
+                "latency_ms": {k: (round(v, 1) if v is not None else None) for k, v in lat.items()},
+                "error": self.error,
+            }
+
+    def stop(self):
+        self._halt.set()
+
+
+# --------------------------------------------------------------------------- corrida
+
+def _group(results):
+    """Resumen de un grupo de clientes (rápidos o lentos)."""
+    if not results:
+        return None
+    fps = [r["fps"] for r in results]
+    lat = [r["latency_ms"]["p50"] for r in results if r["latency_ms"]["p50"] is not None]
+    p99 = [r["latency_ms"]["p99"] for r in results if r["latency_ms"]["p99"] is not None]
+    return {
+        "clients": len(results),
+        "fps_mean": round(sum(fps) / len(fps), 2),
+        "fps_min": min(fps),
+        "latency_p50_ms": round(sorted(lat)[len(lat) // 2], 1) if lat else None,
+        "latency_p99_ms_max": round(max(p99), 1) if p99 else None,
+        "dropped": sum(r["dropped"] for r in results),
+        "errors": sum(1 for r in results if r["error"]),
+    }
+
+
+def run_step(host, port, path, n, n_slow, slow_bps, warmup_s, duration_s, monitor, base):
+    clients = []
+    for i in range(n):
+        slow = i < n_slow
+        clients.append(MJPEGClient(host, port, path, rate_bps=slow_bps if slow else None,
+                                   name=f"{'slow' if slow else 'fast'}-{i}"))
+    for c in clients:
+        c.start()
+    time.sleep(warmup_s)
+    for c in clients:
+        c.reset()
+    try:
+        _get(base, "/stream_stats?reset=1")
+    except Exception:
+        pass
+    t0 = time.monotonic()
+    time.sleep(duration_s)
+    t1 = time.monotonic()
+    per_client = [c.result() for c in clients]
+    try:
+        stream_stats = _get(base, "/stream_stats")
+    except Exception as e:
+        stream_stats = {"error": str(e)}
+    for c in clients:
+        c.stop()
+    for c in clients:
+        c.join(timeout=6.0)
+    fast = [r for r in per_client if not r["throttled_kbps"]]
+    slow = [r for r in per_client if r["throttled_kbps"]]
+    return {
+        "clients": n,
+        "slow_clients": n_slow,
+        "duration_s": round(t1 - t0, 2),
+        "fast": _group(fast),
+        "slow": _group(slow),
+        "server": monitor.window(t0, t1) if monitor else {"cpu_percent": None, "rss_mb_max": None},
+        "per_client": per_client,
+        "stream_stats": stream_stats,
+    }
+
+
+def _write_results(out_dir, report):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(out_dir, f"loadtest_{report['config']['app']}_{stamp}")
+    with open(base + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(base + ".csv", "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["clients", "slow_clients", "fast_fps_mean", "fast_fps_min", "fast_latency_p50_ms",
+                    "fast_latency_p99_ms_max", "fast_dropped", "slow_fps_mean", "slow_dropped",
+                    "server_cpu_percent", "server_rss_mb_max", "errors"])
+        for s in report["steps"]:
+            fast, slow = s["fast"] or {}, s["slow"] or {}
+            w.writerow([s["clients"], s["slow_clients"], fast.get("fps_mean"), fast.get("fps_min"),
+                        fast.get("latency_p50_ms"), fast.get("latency_p99_ms_max"), fast.get("dropped"),
+                        slow.get("fps_mean"), slow.get("dropped"),
+                        s["server"]["cpu_percent"], s["server"]["rss_mb_max"],
+                        fast.get("errors", 0) + slow.get("errors", 0)])
+    return base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga MJPEG con visores simulados")
+    parser.add_argument("--app", choices=("usb", "unified"), default="usb")
+    parser.add_argument("--asgi", action="store_true", help="Servir con uvicorn (asgi.py) en lugar de Flask")
+    parser.add_argument("--url", default=None,
+                        help="Stream de un servidor ya en marcha (no se lanza ninguno; sin CPU/RSS)")
+    parser.add_argument("--source", default="synthetic:640x480@15", help="Fuente de frames del servidor")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--query", default="", help="Variante pedida por los clientes, p.ej. 'w=320&q=60'")
+    parser.add_argument("--clients", default="1,2,4,8,16", help="Cantidades de clientes a probar")
+    parser.add_argument("--slow-fraction", type=float, default=0.25, help="Fracción de clientes limitados")
+    parser.add_argument("--slow-kbps", type=float, default=256, help="Ancho de banda de los clientes lentos")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos medidos por paso")
+    parser.add_argument("--stop-fps-ratio", type=float, default=0.0,
+                        help="Cortar cuando los clientes rápidos bajen de esta fracción del fps del paso 1")
+    parser.add_argument("--out", default="loadtest_results", help="Carpeta de resultados (JSON + CSV)")
+    args = parser.parse_args()
+
+    proc = monitor = log = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        base = f"{parts.scheme}://{parts.netloc}"
+        _wait_ready(base, None)
+    else:
+        host, port = "127.0.0.1", args.port
+        proc, path, log = _launch(args.app, port, args.source, args.asgi)
+        base = f"http://{host}:{port}"
+        _wait_ready(base, proc, log)
+        monitor = ProcessMonitor(proc.pid)
+        monitor.start()
+    if args.query:
+        path += ("&" if "?" in path else "?") + args.query.lstrip("?")
+
+    report = {
+        "config": {"app": args.app if not args.url else "external", "asgi": args.asgi, "url": base + path,
+                   "source": None if args.url else args.source, "slow_kbps": args.slow_kbps,
+                   "slow_fraction": args.slow_fraction, "warmup_s": args.warmup,
+                   "duration_s": args.duration, "started": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "steps": [],
+    }
+    try:
+        if args.app == "unified" and not args.url:
+            _get(base, "/mode?m=monitor")   # /live solo entrega frames en modo monitor
+        baseline = None
+        for n in [int(x) for x in args.clients.split(",") if x]:
+            n_slow = int(round(n * args.slow_fraction)) if n > 1 else 0
+            step = run_step(host, port, path, n, n_slow, args.slow_kbps * 1000 / 8,
+                            args.warmup, args.duration, monitor, base)
+            report["steps"].append(step)
+            fast, slow, srv = step["fast"] or {}, step["slow"] or {}, step["server"]
+            print(f"N={n:<3} lentos={n_slow:<3} fps {fast.get('fps_mean')} (min {fast.get('fps_min')}) "
+                  f"lat p50 {fast.get('latency_p50_ms')} ms p99 {fast.get('latency_p99_ms_max')} ms "
+                  f"perdidos {fast.get('dropped')} | lentos fps {slow.get('fps_mean')} | "
+                  f"CPU {srv['cpu_percent']}% RSS {srv['rss_mb_max']} MB", flush=True)
+            fps = fast.get("fps_mean")
+            if baseline is None:
+                baseline = fps
+            elif args.stop_fps_ratio and baseline and fps is not None and fps < args.stop_fps_ratio * baseline:
+                print("[INFO] El fps cayó bajo el umbral; fin de la prueba")
+                break
+    finally:
+        if monitor:
+            monitor.stop()
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if log:
+            log.close()
+    path = _write_results(args.out, report)
+    print(f"[INFO] Resultados en {path}.json y {path}.csv")
+
+
+if __name__ == "__main__":
+    main()
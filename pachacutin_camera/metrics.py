@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Tiempos por etapa del pipeline de video (lectura, resize, codificación,
+entrega a cada cliente...). Cada etapa guarda las últimas `window` muestras
+y reporta percentiles e histograma en ms, para ajustar FPS / calidad /
+resolución con datos y no a ojo.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+# límites superiores (ms) de los buckets del histograma; el último es "más que eso"
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """{"p50": .., "p90": .., ...} de una lista de valores (método nearest-rank)."""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {f"p{p}": ordered[min(n - 1, max(0, math.ceil(p / 100.0 * n) - 1))] for p in points}
+
+
+def histogram(samples_ms):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for v in samples_ms:
+        for i, edge in enumerate(BUCKETS_MS):
+            if v <= edge:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = [f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+    return dict(zip(labels, counts))
+
+
+class StageTimer:
+    """Muestras (en segundos) por etapa; thread-safe y de memoria acotada."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._stages = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._stages.get(stage)
+            if samples is None:
+                samples = self._stages[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+            samples.append(seconds)
+            self._counts[stage] += 1
+
+    def time(self, stage):
+        """`with timer.time("encode"): ...`"""
+        return _Span(self, stage)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {k: list(v) for k, v in self._stages.items()}
+            counts = dict(self._counts)
+        out = {}
+        for stage, samples in stages.items():
+            ms = [s * 1000.0 for s in samples]
+            p = percentiles(ms)
+            out[stage] = {
+                "count": counts[stage],
+                "window": len(ms),
+                "mean_ms": round(sum(ms) / len(ms), 2) if ms else None,
+                "max_ms": round(max(ms), 2) if ms else None,
+                **{k: (round(v, 2) if v is not None else None) for k, v in p.items()},
+                "histogram_ms": histogram(ms),
+            }
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counts.clear()
+
+
+class _Span:
+    __slots__ = ("timer", "stage", "t0")
+
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.stage, time.perf_counter() - self.t0)
+
+
+class RateMeter:
+    """FPS real de un flujo (p.ej. lo que recibe un cliente) con media móvil exponencial."""
+
+    __slots__ = ("alpha", "_last", "_interval")
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._last = None
+        self._interval = None
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self._last is not None:
+            dt = now - self._last
+            self._interval = dt if self._interval is None else (1 - self.alpha) * self._interval + self.alpha * dt
+        self._last = now
+
+    @property
+    def fps(self):
+        if not self._interval:
+            return None
+        # si el flujo se cortó, la tasa cae en vez de quedar congelada
+        idle = time.monotonic() - self._last
+        return round(1.0 / max(self._interval, idle), 2)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Detector de cambios barato para escenas estáticas (la cámara de suelo
+    suele apuntar a un terreno que no se mueve).
+
+    Compara una versión en gris y reducida (p.ej. 64x48) de cada frame con
+    el último frame publicado. Mientras hay movimiento, o durante
+    `idle_after_s` segundos después, todos los frames pasan; si la escena
+    sigue quieta, solo pasa un frame cada `keepalive_s` segundos.
+    """
+
+    def __init__(self, threshold=3.0, idle_after_s=3.0, keepalive_s=1.0, sample_size=(64, 48)):
+        self.threshold = threshold
+        self.idle_after_s = idle_after_s
+        self.keepalive_s = keepalive_s
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._ref = None
+        self._last_motion = 0.0
+        self._last_publish = 0.0
+        self.last_score = None
+        self.seen = 0
+        self.published = 0
+
+    def _sample(self, frame):
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(frame, self.sample_size, interpolation=cv2.INTER_AREA)
+
+    def check(self, frame):
+        """True si el frame (BGR) debe publicarse."""
+        return self._decide(self._sample(frame))
+
+    def check_jpeg(self, jpeg, codec=None):
+        """Como check() pero sobre bytes JPEG, decodificando a 1/8 en gris (modo passthrough)."""
+        if codec is not None:
+            small = codec.decode(jpeg, scale=1 / 8, gray=True)
+        else:
+            small = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if small is None:
+            return True
+        return self._decide(self._sample(small))
+
+    def _decide(self, small):
+        now = time.monotonic()
+        with self._lock:
+            self.seen += 1
+            if self._ref is None or self._ref.shape != small.shape:
+                score = float("inf")
+            else:
+                score = float(cv2.absdiff(small, self._ref).mean())
+            self.last_score = score if score != float("inf") else None
+            if score >= self.threshold:
+                self._last_motion = now
+            idle = (now - self._last_motion) >= self.idle_after_s
+            if idle and (now - self._last_publish) < self.keepalive_s:
+                return False
+            # el frame publicado pasa a ser la referencia
+            self._ref = small
+            self._last_publish = now
+            self.published += 1
+            return True
+
+    def is_idle(self):
+        with self._lock:
+            return (time.monotonic() - self._last_motion) >= self.idle_after_s
+
+    def as_dict(self):
+        idle = self.is_idle()
+        with self._lock:
+            return {
+                "state": "idle" if idle else "motion",
+                "threshold": self.threshold,
+                "idle_after_s": self.idle_after_s,
+                "keepalive_s": self.keepalive_s,
+                "sample_size": list(self.sample_size),
+                "last_score": (round(self.last_score, 2) if self.last_score is not None else None),
+                "seconds_since_motion": round(time.monotonic() - self._last_motion, 1) if self._last_motion else None,
+                "frames_seen": self.seen,
+                "frames_published": self.published,
+                "frames_suppressed": self.seen - self.published,
+            }
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+Bus de frames en memoria compartida (multiprocessing.shared_memory).
+
+Un solo proceso (el daemon de cámara) es dueño de /dev/videoN y publica
+cada frame en un anillo de N slots. Cualquier cantidad de procesos lectores
+se conectan por nombre y leen el último frame sin volver a abrir la cámara.
+
+Layout del segmento:
+    cabecera global  (64 bytes): magic, versión, w, h, canales, slots,
+                                 tamaño de slot, último seq, ts del escritor, pid
+    N x [cabecera de slot (16 bytes): seq, ts][píxeles BGR w*h*c]
+
+El escritor marca el slot como inválido (seq=0), copia los píxeles, escribe
+ts y por último el seq; el lector verifica el seq antes y después de copiar
+(seqlock), así nunca entrega un frame a medio escribir.
+
+Aviso de frame nuevo: cada lector abre un socket unix de datagramas y se
+suscribe al del escritor; tras cada publish el escritor le manda el seq y el
+lector duerme en select() hasta recibirlo, sin sondear la memoria. Donde no
+hay sockets unix abstractos (fuera de Linux) el lector sondea con una espera
+que crece hasta el intervalo entre frames.
+"""
+import os
+import select
+import socket
+import struct
+import sys
+import time
+
+import numpy as np
+from multiprocessing import shared_memory
+
+try:
+    from multiprocessing import resource_tracker
+except Exception:
+    resource_tracker = None
+
+DEFAULT_NAME = "pachacutin_cam"
+MAGIC = b"PCB1"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sIIIIIQQdI")   # magic, ver, w, h, c, slots, slot_size, latest_seq, writer_ts, pid
+_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<Qd")        # seq, ts
+_SLOT_HEADER_SIZE = 16
+_LATEST_OFFSET = struct.calcsize("<4sIIIIIQ")
+_LATEST = struct.Struct("<Qd")             # latest_seq, writer_ts
+
+# segmentos creados por este proceso (el resource_tracker ya los tiene registrados)
+_created_here = set()
+
+_NOTIFY = struct.Struct("<Q")              # seq publicado
+_SUBSCRIBE = b"sub"
+_NOTIFY_WAIT_S = 0.1     # con avisos: igual se mira el seq cada tanto (escritor sin socket)
+_POLL_MIN_S = 0.002      # sin avisos: sondeo que crece hasta el intervalo entre frames
+_POLL_MAX_S = 0.05
+_RETRY_MIN_S = 0.25      # sin segmento (daemon caído): reintentos de open()
+_RETRY_MAX_S = 5.0
+
+
+def _notify_address(name):
+    """Dirección del socket de avisos del escritor (espacio abstracto de Linux) o None."""
+    if not sys.platform.startswith("linux") or not hasattr(socket, "AF_UNIX"):
+        return None
+    return "\0pachacutin_bus." + name
+
+
+class FrameBusWriter:
+    """Lado del daemon: crea el segmento y publica frames BGR de tamaño fijo."""
+
+    def __init__(self, name=DEFAULT_NAME, width=640, height=480, channels=3, slots=4):
+        self.name = name
+        self.shape = (height, width, channels)
+        self.slots = slots
+        self.frame_size = width * height * channels
+        self.slot_size = _SLOT_HEADER_SIZE + self.frame_size
+        size = _HEADER_SIZE + slots * self.slot_size
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # segmento huérfano de un daemon anterior
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created_here.add(name)
+        self._buf = self._shm.buf
+        self._buf[:_HEADER_SIZE] = b"\0" * _HEADER_SIZE
+        _HEADER.pack_into(self._buf, 0, MAGIC, VERSION, width, height, channels, slots,
+                          self.slot_size, 0, 0.0, os.getpid())
+        self._frames = [
+            np.ndarray(self.shape, dtype=np.uint8, buffer=self._buf,
+                       offset=_HEADER_SIZE + i * self.slot_size + _SLOT_HEADER_SIZE)
+            for i in range(slots)
+        ]
+        self.seq = 0
+        self._subscribers = set()
+        self._notify = None
+        address = _notify_address(name)
+        if address is not None:
+            try:
+                self._notify = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._notify.bind(address)
+                self._notify.setblocking(False)
+            except OSError:
+                # otro escritor con el mismo nombre: los lectores sondean
+                self._notify.close()
+                self._notify = None
+
+    def _notify_readers(self, seq):
+        # altas pendientes: cada lector manda su dirección al abrir el bus
+        while True:
+            try:
+                _, address = self._notify.recvfrom(16)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            if address:
+                self._subscribers.add(address)
+        msg = _NOTIFY.pack(seq)
+        for address in list(self._subscribers):
+            try:
+                self._notify.sendto(msg, address)
+            except BlockingIOError:
+                pass    # el lector no vació su cola (p.ej. en standby): ya tiene avisos
+            except OSError:
+                self._subscribers.discard(address)    # lector cerrado
+
+    def publish(self, frame, ts=None):
+        """Copia `frame` (h, w, c uint8) al siguiente slot y lo hace visible. Retorna el seq."""
+        if frame.shape != self.shape:
+            raise ValueError(f"frame {frame.shape} no coincide con el bus {self.shape}")
+        seq = self.seq + 1
+        slot = seq % self.slots
+        off = _HEADER_SIZE + slot * self.slot_size
+        ts = time.time() if ts is None else ts
+        _SLOT_HEADER.pack_into(self._buf, off, 0, 0.0)
+        np.copyto(self._frames[slot], frame)
+        _SLOT_HEADER.pack_into(self._buf, off, seq, ts)
+        _LATEST.pack_into(self._buf, _LATEST_OFFSET, seq, ts)
+        self.seq = seq
+        if self._notify is not None:
+            self._notify_readers(seq)
+        return seq
+
+    def close(self, unlink=True):
+        self._frames = []
+        self._buf = None
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+            self._subscribers.clear()
+        try:
+            self._shm.close()
+        finally:
+            if unlink:
+                try:
+                    self._shm.unlink()
+                except FileNotFoundError:
+                    pass
+                _created_here.discard(self.name)
+
+
+class FrameBusReader:
+    """
+    Lado cliente, con la misma interfaz básica que cv2.VideoCapture
+    (read / isOpened / release / get / set) para poder reemplazarlo
+    sin tocar los bucles existentes.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, timeout=2.0):
+        self.name = name
+        self.timeout = timeout
+        self.last_seq = 0
+        self.last_ts = None
+        self._shm = None
+        self._notify = None
+        self._retry_s = _RETRY_MIN_S
+        self._retry_at = 0.0
+        self.open(name)
+
+    def open(self, name=None):
+        self.release()
+        self.name = name if isinstance(name, str) else self.name
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return False
+        # al solo adjuntarnos, el resource_tracker no debe borrar el segmento al salir
+        if resource_tracker is not None and self.name not in _created_here:
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        magic, ver, w, h, c, slots, slot_size, _, _, pid = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or ver != VERSION:
+            shm.close()
+            return False
+        self._shm = shm
+        self.shape = (h, w, c)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.writer_pid = pid
+        self._frames = [
+            np.ndarray(self.shape, dtype=np.uint8, buffer=shm.buf,
+                       offset=_HEADER_SIZE + i * slot_size + _SLOT_HEADER_SIZE)
+            for i in range(slots)
+        ]
+        self._subscribe()
+        return True
+
+    def _subscribe(self):
+        """Socket propio para los avisos del escritor (None: se sondea)."""
+        address = _notify_address(self.name)
+        if address is None:
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind("")    # dirección abstracta única asignada por el kernel
+            sock.setblocking(False)
+            sock.sendto(_SUBSCRIBE, address)
+        except OSError:
+            # escritor sin socket de avisos
+            sock.close()
+            return
+        self._notify = sock
+
+    def _drain_notify(self):
+        while True:
+            try:
+                self._notify.recv(64)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+
+    def isOpened(self):
+        return self._shm is not None
+
+    def release(self):
+        self._frames = []
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except Exception:
+                pass
+        self._shm = None
+
+    def _reattach(self, timeout):
+        """Sin segmento (daemon caído o aún no iniciado): reintenta open() con espera creciente."""
+        wait = self._retry_at - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if time.monotonic() < self._retry_at:
+                return False
+        if self.open():
+            self._retry_s = _RETRY_MIN_S
+            return True
+        self._retry_at = time.monotonic() + self._retry_s
+        self._retry_s = min(self._retry_s * 2, _RETRY_MAX_S)
+        return False
+
+    def latest(self):
+        """(seq, ts) del último frame publicado."""
+        if self._shm is None:
+            return 0, None
+        return _LATEST.unpack_from(self._shm.buf, _LATEST_OFFSET)
+
+    def _wait_new(self, timeout):
+        deadline = time.monotonic() + timeout
+        poll = _POLL_MIN_S
+        while True:
+            # vaciar los avisos antes de mirar el seq: uno que llegue después despierta al select
+            if self._notify is not None:
+                self._drain_notify()
+            seq, ts = self.latest()
+            if seq > self.last_seq or (seq and self.last_seq > seq):
+                return seq
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 0
+            if self._notify is not None:
+                select.select([self._notify], [], [], min(remaining, _NOTIFY_WAIT_S))
+            else:
+                time.sleep(min(remaining, poll))
+                poll = min(poll * 2, _POLL_MAX_S)
+
+    def read_view(self, timeout=None):
+        """
+        Sin copia: (seq, ts, vista de solo lectura del slot) o (0, None, None).
+        La vista es válida mientras `is_valid(seq)` sea True (hasta que el
+        escritor dé la vuelta al anillo).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if self._shm is None and not self._reattach(timeout):
+            return 0, None, None
+        seq = self._wait_new(timeout)
+        if not seq:
+            # daemon caído o reiniciado (segmento nuevo con el mismo nombre): re-adjuntar
+            self.open()
+            return 0, None, None
+        slot = seq % self.slots
+        s_seq, ts = _SLOT_HEADER.unpack_from(self._shm.buf, _HEADER_SIZE + slot * self.slot_size)
+        if s_seq != seq:
+            return 0, None, None
+        self.last_seq, self.last_ts = seq, ts
+        view = self._frames[slot].view()
+        view.flags.writeable = False
+        return seq, ts, view
+
+    def is_valid(self, seq):
+        """True si el slot de `seq` todavía no fue sobrescrito."""
+        if self._shm is None or not seq:
+            return False
+        slot = seq % self.slots
+        s_seq, _ = _SLOT_HEADER.unpack_from(self._shm.buf, _HEADER_SIZE + slot * self.slot_size)
+        return s_seq == seq
+
+    def read(self, image=None):
+        """Como cv2.VideoCapture.read(): espera un frame nuevo y retorna (ok, copia)."""
+        for _ in range(3):
+            seq, ts, view = self.read_view()
+            if view is None:
+                return False, None
+            if image is not None and image.shape == view.shape:
+                np.copyto(image, view)
+                out = image
+            else:
+                out = view.copy()
+            if self.is_valid(seq):
+                return True, out
+            # el escritor pisó el slot durante la copia: reintentar con el siguiente
+        return False, None
+
+    def grab(self):
+        return self.read()[0]
+
+    def get(self, prop):
+        import cv2
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.shape[1]) if self._shm is not None else 0.0
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.shape[0]) if self._shm is not None else 0.0
+        return 0.0
+
+    def set(self, prop, value):
+        # el formato lo decide el daemon dueño de la cámara
+        return False
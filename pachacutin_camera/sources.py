@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Abre una fuente de frames a partir de un texto de configuración:
+
+    "0", "2", 0               -> cv2.VideoCapture(índice)
+    "bus" / "bus:<nombre>"    -> FrameBusReader (memoria compartida del daemon de cámara)
+    "file:<ruta>"             -> video en bucle (p.ej. una grabación del taladro)
+    "dir:<carpeta>"           -> imágenes de una carpeta en bucle (p.ej. el dataset de suelos)
+    "synthetic[:WxH@FPS]"     -> patrón generado, sin hardware
+
+Las fuentes file/dir/synthetic aceptan opciones al final: "?fps=15&clock=virtual".
+Con clock=virtual no se duerme entre frames y el contenido y los tiempos
+(CAP_PROP_POS_MSEC) dependen solo del número de frame: las corridas son
+repetibles y tan rápidas como el consumidor. PACHACUTIN_CAMERA_CLOCK cambia
+el reloj por defecto.
+
+Todas las fuentes exponen read() / grab() / isOpened() / release() / get() / set()
+como cv2.VideoCapture.
+"""
+import os
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from pachacutin_camera.shm_bus import DEFAULT_NAME, FrameBusReader
+
+# fuente por defecto para todos los procesos (p.ej. PACHACUTIN_CAMERA_SOURCE=bus)
+CAMERA_SOURCE = os.environ.get("PACHACUTIN_CAMERA_SOURCE", "0")
+# "real" (respeta el fps) o "virtual" (determinista, sin esperas)
+CAMERA_CLOCK = os.environ.get("PACHACUTIN_CAMERA_CLOCK", "real")
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def is_bus(source):
+    return isinstance(source, str) and (source == "bus" or source.startswith("bus:"))
+
+
+def is_device(source):
+    """True si `source` es un índice de /dev/videoN (lo único que se puede sondear/configurar)."""
+    return isinstance(source, int) or (isinstance(source, str) and source.strip().isdigit())
+
+
+class _PacedSource:
+    """Base de las fuentes simuladas: ritmo a `fps` (o reloj virtual) y propiedades tipo VideoCapture."""
+
+    def __init__(self, fps=15.0, clock=None):
+        self.fps = float(fps) or 15.0
+        self.virtual = (clock or CAMERA_CLOCK) == "virtual"
+        self.frame_index = 0
+        self._next_due = None
+        self._opened = True
+        self._grabbed = None
+
+    def _tick(self):
+        if not self.virtual:
+            now = time.monotonic()
+            if self._next_due is None:
+                self._next_due = now
+            wait = self._next_due - now
+            if wait > 0:
+                time.sleep(wait)
+            # sin acumular atraso si el consumidor se demoró
+            self._next_due = max(self._next_due, now) + 1.0 / self.fps
+        self.frame_index += 1
+
+    def _frame(self):
+        raise NotImplementedError
+
+    def grab(self):
+        # avanza un frame; retrieve() entrega ese mismo frame sin volver a avanzar
+        if not self._opened:
+            return False
+        self._tick()
+        self._grabbed = self._frame()
+        return self._grabbed is not None
+
+    def retrieve(self, image=None):
+        frame = self._grabbed
+        if frame is None:
+            return False, None
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def isOpened(self):
+        return self._opened
+
+    def release(self):
+        self._opened = False
+
+    def get(self, prop):
+        import cv2
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.frame_index)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.frame_index * 1000.0 / self.fps
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            shape = self._shape()
+            if shape is None:
+                return 0.0
+            return float(shape[1] if prop == cv2.CAP_PROP_FRAME_WIDTH else shape[0])
+        return 0.0
+
+    def set(self, prop, value):
+        import cv2
+        if prop == cv2.CAP_PROP_FPS and value > 0:
+            self.fps = float(value)
+            return True
+        return False
+
+    def _shape(self):
+        return None
+
+
+class SyntheticSource(_PacedSource):
+    """Barras de color que se desplazan + un bloque que marca el número de frame (determinista)."""
+
+    def __init__(self, width=640, height=480, fps=15.0, clock=None):
+        super().__init__(fps, clock)
+        self.width, self.height = int(width), int(height)
+        self._base = None
+
+    def _build(self):
+        x = np.arange(self.width, dtype=np.uint16)
+        y = np.arange(self.height, dtype=np.uint16)[:, None]
+        base = np.empty((self.height, self.width, 3), np.uint8)
+        base[..., 0] = (x * 255 // max(1, self.width - 1)).astype(np.uint8)
+        base[..., 1] = (y * 255 // max(1, self.height - 1)).astype(np.uint8)
+        base[..., 2] = ((x[None, :] // 40 + y // 40) % 2 * 180).astype(np.uint8)
+        self._base = base
+
+    def _frame(self):
+        if self._base is None or self._base.shape[:2] != (self.height, self.width):
+            self._build()
+        n = self.frame_index
+        frame = np.roll(self._base, (n * 4) % self.width, axis=1)
+        # contador binario en la esquina: cada frame es distinto y reconocible
+        for bit in range(16):
+            if (n >> bit) & 1:
+                frame[4:12, 4 + bit * 8:10 + bit * 8] = 255
+        return frame
+
+    def _shape(self):
+        return (self.height, self.width)
+
+    def set(self, prop, value):
+        import cv2
+        if prop == cv2.CAP_PROP_FRAME_WIDTH and value > 0:
+            self.width = int(value)
+            return True
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT and value > 0:
+            self.height = int(value)
+            return True
+        return super().set(prop, value)
+
+
+class ImageDirSource(_PacedSource):
+    """Recorre en bucle (orden alfabético, subcarpetas incluidas) las imágenes de una carpeta."""
+
+    def __init__(self, path, fps=5.0, clock=None, size=None, cache=256):
+        super().__init__(fps, clock)
+        self.path = path
+        self.size = size
+        self.files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names if name.lower().endswith(IMAGE_EXTS)
+        )
+        self._opened = bool(self.files)
+        # decodificar cada archivo una sola vez (hasta `cache` imágenes)
+        self._cache = {}
+        self._cache_max = cache
+        self._last = None
+
+    def _frame(self):
+        import cv2
+        if not self.files:
+            return None
+        i = (self.frame_index - 1) % len(self.files)
+        frame = self._cache.get(i)
+        if frame is None:
+            frame = cv2.imread(self.files[i], cv2.IMREAD_COLOR)
+            if frame is None:
+                return self._last
+            if self.size:
+                frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+            if len(self._cache) < self._cache_max:
+                self._cache[i] = frame
+        self._last = frame
+        return frame
+
+    def _shape(self):
+        return self._last.shape if self._last is not None else None
+
+
+class VideoFileSource(_PacedSource):
+    """Video en bucle; con clock=real se entrega al fps del archivo (o el pedido)."""
+
+    def __init__(self, path, fps=None, clock=None, loop=True):
+        import cv2
+        self._cap = cv2.VideoCapture(path)
+        file_fps = self._cap.get(cv2.CAP_PROP_FPS) if self._cap.isOpened() else 0
+        super().__init__(fps or file_fps or 15.0, clock)
+        self.path = path
+        self.loop = loop
+        self._opened = self._cap.isOpened()
+        self._last = None
+
+    def _frame(self):
+        import cv2
+        ok, frame = self._cap.read()
+        if not ok and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._cap.read()
+        if not ok:
+            return None
+        self._last = frame
+        return frame
+
+    def _shape(self):
+        return self._last.shape if self._last is not None else None
+
+    def release(self):
+        super().release()
+        self._cap.release()
+
+
+def _split_options(spec):
+    """"ruta?fps=5&clock=virtual" -> ("ruta", {"fps": "5", "clock": "virtual"})"""
+    if "?" not in spec:
+        return spec, {}
+    spec, query = spec.split("?", 1)
+    return spec, {k: v[-1] for k, v in parse_qs(query).items()}
+
+
+def _parse_size(text):
+    try:
+        w, h = text.lower().split("x", 1)
+        return int(w), int(h)
+    except ValueError:
+        return None
+
+
+def open_capture(source=None):
+    """Abre `source` (por defecto CAMERA_SOURCE) y retorna un objeto tipo VideoCapture."""
+    if source is None:
+        source = CAMERA_SOURCE
+    if is_bus(source):
+        name = source[4:] if source.startswith("bus:") else ""
+        return FrameBusReader(name or DEFAULT_NAME)
+    if isinstance(source, str):
+        if source.startswith("synthetic"):
+            spec, opts = _split_options(source[len("synthetic"):].lstrip(":"))
+            size, fps = spec, opts.get("fps")
+            if "@" in spec:
+                size, fps = spec.split("@", 1)
+            w, h = _parse_size(size) or (640, 480)
+            return SyntheticSource(w, h, float(fps or 15), opts.get("clock"))
+        if source.startswith("dir:"):
+            path, opts = _split_options(source[4:])
+            return ImageDirSource(path, float(opts.get("fps", 5)), opts.get("clock"),
+                                  size=_parse_size(opts.get("size", "")))
+        if source.startswith("file:"):
+            path, opts = _split_options(source[5:])
+            return VideoFileSource(path, float(opts["fps"]) if "fps" in opts else None,
+                                   opts.get("clock"), loop=opts.get("loop", "1") != "0")
+        if source.strip().isdigit():
+            source = int(source)
+    import cv2
+    return cv2.VideoCapture(source)
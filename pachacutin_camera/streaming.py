@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Piezas del streaming MJPEG compartidas por usb_cam_server y pachacutin_unified.
+
+    Variant         -> último JPEG codificado de una variante (tamaño, calidad)
+    StreamClient    -> estado y métricas de una conexión (entregados/descartados)
+    ClientRegistry  -> conexiones activas de una cámara (para /stream_stats)
+    mjpeg_part      -> una parte de multipart/x-mixed-replace
+    iter_mjpeg      -> generador WSGI que envía siempre el frame más nuevo
+    limit_send_buffer -> acota los datos en vuelo hacia un visor
+
+La latencia de cada frame se mide cuando la escritura terminó, no cuando se
+entrega al servidor: con buffers de envío grandes el kernel acepta segundos
+de video para un cliente lento y el atraso real no se vería. Por eso las
+conexiones de video acotan lo que queda en cola sin enviar (limit_send_buffer):
+la escritura se bloquea mientras el cliente no recibe y los frames producidos
+en ese tiempo se descartan (skipped) en lugar de encolarse.
+
+La versión asíncrona (un hilo pump y una corrutina por visor) está en
+pachacutin_camera.async_hub.
+"""
+import itertools
+import socket
+import threading
+import time
+from collections import deque
+
+from pachacutin_camera.metrics import RateMeter, percentiles
+
+CONTENT_TYPE = "multipart/x-mixed-replace; boundary=frame"
+
+_client_ids = itertools.count(1)
+
+
+class Variant:
+    """Último JPEG codificado para una combinación (tamaño, calidad)."""
+    __slots__ = ("lock", "seq", "ts", "jpeg")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.ts = 0.0
+        self.jpeg = None
+
+
+class StreamClient:
+    """
+    Estado de una conexión MJPEG. El generador siempre toma el frame más
+    nuevo; los intermedios y los que superan `max_latency` se cuentan como
+    descartados en lugar de acumularse para un cliente lento.
+
+    accept() decide antes de escribir (skipped / stale); sent() registra la
+    latencia captura -> escrito al socket y cuenta como `late` las partes
+    que terminaron de escribirse pasado `max_latency`.
+    """
+
+    def __init__(self, remote=None, max_latency=0.5, variant=None):
+        self.id = next(_client_ids)
+        self.remote = remote
+        self.max_latency = max_latency
+        self.variant = variant or {}
+        self.started = time.time()
+        self.last_seq = 0
+        self.delivered = 0
+        self.skipped = 0
+        self.stale = 0
+        self.late = 0
+        self.last_latency_ms = None
+        # fps que realmente recibe y latencia captura -> escrito (últimos 200 frames)
+        self.rate = RateMeter()
+        self.latencies_ms = deque(maxlen=200)
+
+    def accept(self, seq, ts):
+        """Registra el frame `seq` capturado en `ts`; retorna False si debe descartarse por viejo."""
+        if self.last_seq:
+            self.skipped += max(0, seq - self.last_seq - 1)
+        self.last_seq = seq
+        if time.time() - ts > self.max_latency:
+            self.stale += 1
+            return False
+        return True
+
+    def sent(self, ts):
+        """La parte del frame capturado en `ts` terminó de escribirse al socket."""
+        age = time.time() - ts
+        if age > self.max_latency:
+            self.late += 1
+        self.delivered += 1
+        self.last_latency_ms = int(age * 1000)
+        self.latencies_ms.append(age * 1000)
+        self.rate.tick()
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "remote": self.remote,
+            "variant": self.variant,
+            "since": round(self.started, 3),
+            "delivered": self.delivered,
+            "dropped": self.skipped + self.stale,
+            "skipped": self.skipped,
+            "stale": self.stale,
+            "late": self.late,
+            "last_latency_ms": self.last_latency_ms,
+            "max_latency_ms": int(self.max_latency * 1000),
+            "fps": self.rate.fps,
+            "latency_ms": {k: (round(v, 1) if v is not None else None)
+                           for k, v in percentiles(list(self.latencies_ms)).items()},
+        }
+
+
+class ClientRegistry:
+    """Conexiones activas de una cámara, por id."""
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def add(self, client):
+        with self._lock:
+            self._clients[client.id] = client
+
+    def remove(self, client):
+        with self._lock:
+            self._clients.pop(client.id, None)
+
+    def stats(self):
+        with self._lock:
+            return [c.as_dict() for c in self._clients.values()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+def mjpeg_part(seq, ts, jpeg):
+    """Parte multipart con el JPEG y su marca de captura (X-Timestamp / X-Frame-Seq)."""
+    return (b"--frame\r\nContent-Type: image/jpeg\r\n"
+            + f"X-Timestamp: {ts:.3f}\r\nX-Frame-Seq: {seq}\r\n\r\n".encode()
+            + jpeg + b"\r\n")
+
+
+def limit_send_buffer(sock, size):
+    """
+    Acota a unos `size` bytes lo que el kernel acepta sin enviar hacia un visor
+    (0/None = no tocar). Con TCP_NOTSENT_LOWAT (Linux, macOS) la escritura
+    espera a que quede menos de `size` en cola sin limitar lo que ya va por la
+    red; donde no existe se achica SO_SNDBUF. Retorna False si no se pudo
+    (sin socket, o el servidor no lo expone).
+    """
+    if sock is None or not size:
+        return False
+    try:
+        if hasattr(socket, "TCP_NOTSENT_LOWAT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, int(size))
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, int(size))
+    except (OSError, AttributeError):
+        return False
+    return True
+
+
+def iter_mjpeg(client, next_frame, fps=None, timing=None, running=None):
+    """
+    Generador WSGI de multipart/x-mixed-replace para un cliente.
+
+    `next_frame(last_seq)` debe esperar un frame más nuevo que `last_seq` y
+    retornar (seq, ts, jpeg) en la variante del cliente (jpeg None si no
+    hubo). Corre mientras `running()` sea verdadero (o siempre, si es None).
+    Con `timing` (StageTimer) registra handoff (captura -> turno de este
+    cliente) y send (escritura de la parte al socket).
+
+    El servidor WSGI escribe cada parte antes de pedir la siguiente, así que
+    al reanudarse el generador la parte ya está en el socket; con el buffer
+    de envío acotado (limit_send_buffer) eso significa que el cliente la
+    está recibiendo, y no que quedó en cola en el kernel.
+    """
+    interval = 1.0 / fps if fps else 0.0
+    seq = 0
+    next_due = 0.0
+    while running is None or running():
+        # limita el FPS de este cliente sin afectar a los demás
+        if interval:
+            wait = next_due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            next_due = time.monotonic() + interval
+        # siempre el frame más nuevo: lo que se perdió mientras el cliente
+        # recibía el anterior se descarta en vez de encolarse
+        seq, ts, jpeg = next_frame(seq)
+        if jpeg is None or not client.accept(seq, ts):
+            continue
+        # captura -> entrega a este cliente
+        if timing is not None:
+            timing.record("handoff", time.time() - ts)
+        t_send = time.monotonic()
+        yield mjpeg_part(seq, ts, jpeg)
+        # el generador se reanuda cuando el servidor terminó de escribir la parte
+        if timing is not None:
+            timing.record("send", time.monotonic() - t_send)
+        client.sent(ts)
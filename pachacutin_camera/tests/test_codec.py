@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+import pytest
+
+from pachacutin_camera import codec
+from pachacutin_camera.codec import OpenCVCodec, make_codec
+
+
+def _frame():
+    # degradé con algo de detalle: comprime distinto según la calidad
+    x = np.linspace(0, 255, 64, dtype=np.uint8)
+    frame = np.dstack([np.tile(x, (48, 1)), np.tile(x[::-1], (48, 1)), np.full((48, 64), 128, np.uint8)])
+    frame[::7, ::5] = 255
+    return np.ascontiguousarray(frame)
+
+
+def test_default_name_is_opencv():
+    assert make_codec("opencv").name == "opencv"
+    assert make_codec("OpenCV").name == "opencv"
+
+
+def test_unknown_name_falls_back_to_opencv(capsys):
+    assert isinstance(make_codec("nvjpeg"), OpenCVCodec)
+    assert "desconocido" in capsys.readouterr().out
+
+
+def test_turbojpeg_missing_falls_back_to_opencv(monkeypatch, capsys):
+    monkeypatch.setattr(codec, "turbojpeg", None)
+    assert make_codec("turbojpeg").name == "opencv"
+    assert "turbojpeg no disponible" in capsys.readouterr().out
+    assert "turbojpeg" not in codec.available()
+
+
+def test_auto_picks_turbojpeg_only_when_available(monkeypatch):
+    class _Turbo:
+        name = "turbojpeg"
+
+        def __init__(self, subsampling, fast_dct):
+            self.subsampling, self.fast_dct = subsampling, fast_dct
+
+    monkeypatch.setattr(codec, "TurboJPEGCodec", _Turbo)
+    monkeypatch.setattr(codec, "available", lambda: ["opencv"])
+    assert make_codec("auto").name == "opencv"
+    monkeypatch.setattr(codec, "available", lambda: ["opencv", "turbojpeg"])
+    chosen = make_codec("auto", subsampling="444", fast_dct=True)
+    assert (chosen.name, chosen.subsampling, chosen.fast_dct) == ("turbojpeg", "444", True)
+
+
+def test_bad_subsampling_is_ignored(capsys):
+    c = make_codec("opencv", subsampling="411")
+    assert c.subsampling is None
+    assert "Submuestreo" in capsys.readouterr().out
+
+
+def test_environment_defaults(monkeypatch):
+    monkeypatch.setattr(codec, "JPEG_CODEC", "opencv")
+    monkeypatch.setattr(codec, "JPEG_SUBSAMPLING", "420")
+    c = make_codec()
+    assert (c.name, c.subsampling, c.fast_dct) == ("opencv", "420", False)
+
+
+@pytest.mark.parametrize("name", ["opencv", "turbojpeg"])
+def test_roundtrip_and_reduced_decode(name):
+    if name not in codec.available():
+        pytest.skip(f"{name} no disponible")
+    c = make_codec(name)
+    frame = _frame()
+    data = c.encode(frame, 90)
+    assert data[:2] == b"\xff\xd8"
+    assert len(c.encode(frame, 30)) < len(data)
+    full = c.decode(data)
+    assert full.shape == frame.shape
+    assert np.abs(full.astype(int) - frame).mean() < 10
+    assert c.decode(data, scale=0.25).shape == (12, 16, 3)
+    assert c.decode(data, scale=0.5, gray=True).shape == (24, 32)
+
+
+def test_opencv_gray_subsampling_encodes_one_channel():
+    data = make_codec("opencv", subsampling="gray").encode(_frame(), 80)
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED).ndim == 2
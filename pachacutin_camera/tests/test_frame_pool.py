@@ -0,0 +1,82 @@
+import gc
+import threading
+
+import pytest
+
+from pachacutin_camera.frame_pool import FramePool
+
+SHAPE = (24, 32, 3)
+
+
+def test_closed_leases_are_reused_without_gc():
+    pool = FramePool(size=2, max_size=2)
+    gc.disable()
+    try:
+        for i in range(1000):
+            buf = pool.acquire(SHAPE)
+            buf.array[:] = i % 256
+            with buf.lease() as frame:
+                assert not frame.flags.writeable
+                assert frame[0, 0, 0] == i % 256
+            buf.release()
+    finally:
+        gc.enable()
+    stats = pool.stats()
+    assert (stats["buffers"], stats["in_use"], stats["grown"], stats["overflow"]) == (2, 0, 0, 0)
+    assert stats["leaked"] == 0
+
+
+def test_open_lease_keeps_buffer_reserved():
+    pool = FramePool(size=2, max_size=2)
+    buf = pool.acquire(SHAPE)
+    lease = buf.lease()
+    buf.release()
+    # el préstamo abierto reserva el buffer: el escritor recibe otro
+    assert pool.acquire(SHAPE) is not buf
+    lease.close()
+    lease.close()   # cerrar dos veces el mismo préstamo no suelta otra referencia
+    assert pool.acquire(SHAPE) is buf
+
+
+def test_double_release_raises():
+    pool = FramePool()
+    buf = pool.acquire(SHAPE)
+    buf.release()
+    with pytest.raises(RuntimeError):
+        buf.release()
+
+
+def test_dropped_lease_returns_on_next_acquire():
+    pool = FramePool(size=1, max_size=1)
+    buf = pool.acquire(SHAPE)
+    buf.lease()     # perdido sin close()
+    buf.release()
+    gc.collect()
+    assert pool.acquire(SHAPE) is buf
+    assert pool.stats()["leaked"] == 1
+
+
+class _Cycle:
+    """Ciclo de referencias: solo lo libera el recolector, cuando sea que corra."""
+
+    def __init__(self, lease):
+        self.lease = lease
+        self.me = self
+
+
+def test_gc_with_pool_lock_held_does_not_deadlock():
+    pool = FramePool(size=1, max_size=1)
+    buf = pool.acquire(SHAPE)
+    _Cycle(buf.lease())
+    buf.release()
+    done = threading.Event()
+
+    def collect_inside_pool():
+        # como si el recolector corriera dentro de acquire()/stats()
+        with pool._lock:
+            gc.collect()
+        done.set()
+
+    threading.Thread(target=collect_inside_pool, daemon=True).start()
+    assert done.wait(2.0), "el recolector se bloqueó con el lock del pool tomado"
+    assert pool.stats()["in_use"] == 0
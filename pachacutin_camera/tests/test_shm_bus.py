@@ -0,0 +1,106 @@
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from pachacutin_camera.shm_bus import FrameBusReader, FrameBusWriter
+
+SHAPE = (24, 32, 3)
+
+
+@pytest.fixture
+def name():
+    return f"pcb_test_{uuid.uuid4().hex[:8]}"
+
+
+def _writer(name):
+    return FrameBusWriter(name, width=SHAPE[1], height=SHAPE[0], slots=3)
+
+
+def _frame(v):
+    return np.full(SHAPE, v, np.uint8)
+
+
+def test_publish_and_read(name):
+    writer = _writer(name)
+    try:
+        reader = FrameBusReader(name, timeout=0.5)
+        assert reader.isOpened()
+        writer.publish(_frame(7))
+        ok, frame = reader.read()
+        assert ok and frame.shape == SHAPE and frame[0, 0, 0] == 7
+        # sin frames nuevos vence el timeout en lugar de repetir el último
+        assert reader.read_view(timeout=0.05) == (0, None, None)
+        reader.release()
+    finally:
+        writer.close()
+
+
+def test_reader_attaches_when_daemon_starts_later(name):
+    reader = FrameBusReader(name, timeout=0.2)
+    assert not reader.isOpened()
+    assert reader.read() == (False, None)
+    writer = _writer(name)
+    try:
+        deadline = time.monotonic() + 3.0
+        ok = False
+        while not ok and time.monotonic() < deadline:
+            writer.publish(_frame(1))
+            ok, _ = reader.read()
+        assert ok and reader.isOpened()
+        reader.release()
+    finally:
+        writer.close()
+
+
+def test_reader_reattaches_after_daemon_restart(name):
+    writer = _writer(name)
+    reader = FrameBusReader(name, timeout=0.2)
+    writer.publish(_frame(1))
+    assert reader.read()[0]
+    writer.close()
+    # daemon caído: el lector se queda sin segmento pero sigue reintentando
+    assert reader.read() == (False, None)
+    assert reader.read() == (False, None)
+    writer = _writer(name)
+    try:
+        deadline = time.monotonic() + 5.0
+        frame = None
+        while frame is None and time.monotonic() < deadline:
+            writer.publish(_frame(9))
+            ok, frame = reader.read()
+        assert frame is not None and frame[0, 0, 0] == 9
+        reader.release()
+    finally:
+        writer.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="avisos por socket unix abstracto")
+def test_reader_sleeps_until_notified(name):
+    writer = _writer(name)
+    try:
+        reader = FrameBusReader(name, timeout=2.0)
+        assert reader._notify is not None
+        woke = []
+
+        def read():
+            seq, _, _ = reader.read_view()
+            woke.append((seq, time.monotonic()))
+
+        thread = threading.Thread(target=read)
+        cpu = time.process_time()
+        thread.start()
+        time.sleep(0.5)
+        published = time.monotonic()
+        seq = writer.publish(_frame(3))
+        thread.join(2.0)
+        # esperando no sondea la memoria (antes: ~250 despertares en 0.5 s)
+        assert time.process_time() - cpu < 0.1
+        assert woke and woke[0][0] == seq
+        assert woke[0][1] - published < 0.05
+        reader.release()
+    finally:
+        writer.close()
@@ -0,0 +1,131 @@
+import os
+import socket
+import statistics
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from pachacutin_camera.metrics import StageTimer
+from pachacutin_camera.streaming import CONTENT_TYPE, StreamClient, iter_mjpeg, limit_send_buffer
+
+FPS = 50
+PART_BYTES = 20 * 1024
+SEND_BUFFER = 16 * 1024
+
+
+class _Source:
+    """Frames de ~20 KB a 50 fps desde un hilo (simula el hilo lector de la cámara)."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.ts = 0.0
+        self.jpeg = None
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self.running:
+            with self.cond:
+                self.seq += 1
+                self.ts = time.time()
+                self.jpeg = os.urandom(PART_BYTES)
+                self.cond.notify_all()
+            time.sleep(1.0 / FPS)
+
+    def next_frame(self, last_seq):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > last_seq or not self.running, timeout=1.0)
+            return self.seq, self.ts, self.jpeg
+
+
+def _read_slowly(port, seconds, bytes_per_s):
+    """Cliente con poco ancho de banda; retorna la edad (s) de cada parte al recibirla."""
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024)
+    sock.connect(("127.0.0.1", port))
+    sock.sendall(b"GET /video HTTP/1.0\r\nHost: test\r\n\r\n")
+    ages, data = [], b""
+    t_end = time.monotonic() + seconds
+    while time.monotonic() < t_end:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+        while True:
+            start = data.find(b"X-Timestamp: ")
+            if start < 0 or data.find(b"\r\n", start) < 0:
+                break
+            end = data.find(b"\r\n", start)
+            ages.append(time.time() - float(data[start + 13:end]))
+            data = data[end:]
+        time.sleep(len(chunk) / bytes_per_s)
+    sock.close()
+    return ages
+
+
+def _serve(source, client, send_buffer, timing=None):
+    def app(environ, start_response):
+        limit_send_buffer(environ.get("werkzeug.socket"), send_buffer)
+        start_response("200 OK", [("Content-Type", CONTENT_TYPE)])
+        return iter_mjpeg(client, source.next_frame, timing=timing, running=lambda: source.running)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_slow_reader_drops_frames_and_stays_within_bound():
+    source = _Source()
+    client = StreamClient(max_latency=0.5)
+    timing = StageTimer()
+    server = _serve(source, client, SEND_BUFFER, timing)
+    try:
+        # ~64 KB/s: cerca de 3 de los 50 frames por segundo caben
+        ages = _read_slowly(server.server_port, 4.0, 64 * 1024)
+    finally:
+        source.running = False
+        server.shutdown()
+
+    assert len(ages) >= 4
+    # lo que no alcanzó a enviarse se descartó (y se contó) en lugar de encolarse
+    assert client.skipped + client.stale > 3 * FPS
+    # la latencia vista por el cliente no crece con el tiempo
+    recent = ages[len(ages) // 2:]
+    assert statistics.median(recent) < 1.0
+    # y la que reporta el servidor (medida al terminar la escritura) no es la del generador
+    assert statistics.median(client.latencies_ms) > 50
+    # la etapa send mide la escritura bloqueada por el cliente lento
+    stages = timing.snapshot()
+    assert stages["send"]["p50"] > 50
+    assert stages["handoff"]["p50"] < stages["send"]["p50"]
+
+
+def test_limit_send_buffer_ignores_missing_socket():
+    assert not limit_send_buffer(None, SEND_BUFFER)
+    sock = socket.socket()
+    try:
+        assert not limit_send_buffer(sock, 0)
+        assert limit_send_buffer(sock, SEND_BUFFER)
+        if hasattr(socket, "TCP_NOTSENT_LOWAT"):
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT) == SEND_BUFFER
+        else:
+            # Linux duplica el valor pedido (reserva para su contabilidad)
+            assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) <= 2 * SEND_BUFFER
+    finally:
+        sock.close()
+
+
+def test_client_accounting():
+    client = StreamClient(max_latency=0.2)
+    now = time.time()
+    assert client.accept(1, now)
+    client.sent(now)
+    assert client.accept(4, now)           # 2 y 3 no llegaron a enviarse
+    client.sent(now - 1.0)                 # escrito pasado el límite
+    assert not client.accept(5, now - 1)   # ya viejo antes de escribir
+    stats = client.as_dict()
+    assert (stats["delivered"], stats["skipped"], stats["stale"], stats["late"]) == (2, 2, 1, 1)
+    assert stats["dropped"] == 3
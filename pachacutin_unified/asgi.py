@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Modo asíncrono (ASGI) para /live y /video_feed: cada visor es una corrutina
+# en lugar de un hilo del servidor Flask. El resto de endpoints (/mode,
+# /capture, /sensors, /cmd, ...) se sirven con la app Flask de siempre.
+#
+# Uso (desde la raíz del repo):
+#   python -m pachacutin_unified.asgi
+#   uvicorn pachacutin_unified.asgi:app --host 0.0.0.0 --port 5000   (sin acotar el buffer de envío)
+from urllib.parse import parse_qs
+
+from pachacutin_unified.config import HOST, PORT, STREAM_MAX_LATENCY_S, STREAM_SEND_BUFFER
+from pachacutin_unified.run_unified import create_app
+from pachacutin_unified.blueprints.video import streamer
+from pachacutin_camera.streaming import StreamClient
+from pachacutin_camera.async_hub import AsyncFrameHub, serve, stream_mjpeg
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except Exception:
+    WsgiToAsgi = None
+
+STREAM_PATHS = {"/live", "/video_feed"}
+
+hub = AsyncFrameHub(
+    wait_new=lambda last_seq, timeout: streamer.wait_frame(last_seq, timeout)[0],
+    encode=streamer.encode_variant,
+)
+flask_app = create_app()
+_wsgi = WsgiToAsgi(flask_app) if WsgiToAsgi is not None else None
+
+
+def _int_arg(args, name):
+    try:
+        v = int(args.get(name, [""])[0])
+    except ValueError:
+        return None
+    return v if v > 0 else None
+
+
+async def _plain(send, status, body):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http" and scope["path"] in STREAM_PATHS:
+        if not streamer.enabled:
+            await _plain(send, 409, "Monitor desactivado (entra a Monitoreo Visual).".encode("utf-8"))
+            return
+        args = parse_qs(scope.get("query_string", b"").decode())
+        w, h, q, fps = (_int_arg(args, k) for k in ("w", "h", "q", "fps"))
+        overlay = args.get("overlay", [""])[0].lower() in ("1", "true", "yes")
+        max_latency_ms = _int_arg(args, "max_latency_ms")
+        client = StreamClient(
+            remote=(scope.get("client") or [None])[0],
+            max_latency=(max_latency_ms / 1000.0 if max_latency_ms else STREAM_MAX_LATENCY_S),
+            variant={"w": w, "h": h, "q": q, "fps": fps, "overlay": overlay, "async": True},
+        )
+        streamer.add_client(client)
+        try:
+            await stream_mjpeg(hub, send, receive, client, variant=(w, h, q, overlay), fps=fps,
+                               active=lambda: streamer.enabled, timing=streamer.timing)
+        except OSError:
+            pass  # el cliente cerró la conexión
+        finally:
+            streamer.remove_client(client)
+        return
+
+    if _wsgi is not None:
+        await _wsgi(scope, receive, send)
+        return
+
+    await _plain(send, 404, "Ruta no disponible en modo ASGI (instala asgiref)".encode("utf-8"))
+
+
+if __name__ == "__main__":
+    serve(app, HOST, PORT, send_buffer=STREAM_SEND_BUFFER, log_level="warning")
@@ -3,16 +3,42 @@ import time
 import logging
 from flask import Blueprint, jsonify, request, Response, send_from_directory
 
-from pachacutin_unified.config import TOKEN, CAPTURE_DIR
+from pachacutin_unified.config import (TOKEN, CAPTURE_DIR, STREAM_MAX_LATENCY_S, STREAM_SEND_BUFFER,
+                                       CAPTURE_WORKERS, CAPTURE_QUEUE_MAX, CAPTURE_QUALITY, JPEG_QUALITY,
+                                       CAPTURE_DB, CAPTURE_MAX_MB, CAPTURE_MAX_AGE_DAYS,
+                                       CAPTURE_HOT_N, THUMB_SIZES, THUMB_QUALITY,
+                                       RECORD_DIR, RECORD_SEGMENT_S, RECORD_FPS, RECORD_MAX_MB)
 from pachacutin_unified.blueprints.video import streamer
+from pachacutin_camera.streaming import StreamClient, limit_send_buffer
 from pachacutin_unified.services.sensor_manager import sensors
 from pachacutin_unified.services.serial_bridge import serial_bridge
+from pachacutin_camera.capture_writer import CaptureWriter
+from pachacutin_unified.services.capture_store import CaptureStore
+from pachacutin_unified.services.thumbnails import Thumbnailer, parse_sizes
+from pachacutin_unified.services.recorder import SegmentRecorder
+from pachacutin_unified.services.overlay import sensor_lines
+from pachacutin_unified.services import archive
 # Comentamos la importación del clasificador
 # from pachacutin_unified.services.soil_classifier import classify_soil_from_bgr_image
 from pachacutin_unified.services.recommender import get_recommendation
 
 logger = logging.getLogger(__name__)
 unified_bp = Blueprint("unified", __name__)
+thumbnailer = Thumbnailer(CAPTURE_DIR, parse_sizes(THUMB_SIZES), quality=THUMB_QUALITY, codec=streamer.codec)
+capture_store = CaptureStore(CAPTURE_DB, CAPTURE_DIR,
+                             max_bytes=int(CAPTURE_MAX_MB * 1024 * 1024),
+                             max_age_s=int(CAPTURE_MAX_AGE_DAYS * 86400),
+                             hot_n=CAPTURE_HOT_N,
+                             on_evict=thumbnailer.remove)
+capture_store.import_existing_async()
+# al terminar de escribir se generan las miniaturas; si falla, la captura sale del índice
+capture_writer = CaptureWriter(CAPTURE_DIR, workers=CAPTURE_WORKERS, max_pending=CAPTURE_QUEUE_MAX,
+                               on_written=thumbnailer.on_written,
+                               on_failed=capture_store.remove)
+# texto del overlay (?overlay=1): se dibuja una vez por frame con el estado actual
+streamer.overlay_lines = lambda ts: sensor_lines(sensors.get_payload(), ts)
+recorder = SegmentRecorder(streamer, RECORD_DIR, segment_s=RECORD_SEGMENT_S, fps=RECORD_FPS,
+                           max_bytes=int(RECORD_MAX_MB * 1024 * 1024))
 
 # -------------------- MODO / ACTIVACIÓN POR PANTALLA --------------------
 @unified_bp.route("/mode")
@@ -52,12 +78,37 @@ def mode():
 
 
 # -------------------- STREAM --------------------
+def _int_arg(name):
+    try:
+        v = int(request.args.get(name, ""))
+    except ValueError:
+        return None
+    return v if v > 0 else None
+
+
+def _flag_arg(name):
+    return request.args.get(name, "").lower() in ("1", "true", "yes")
+
+
 @unified_bp.route("/live")
 def live():
     if not streamer.enabled:
         return Response(b"Monitor desactivado (entra a Monitoreo Visual).",
                         status=409, mimetype="text/plain")
-    return Response(streamer.mjpeg_generator(),
+    # /live?w=320&q=50&fps=5 -> variante liviana para celulares con mala señal
+    # /live?overlay=1 -> con tipo de suelo, humedad y hora dibujados en el video
+    w, h, q, fps = _int_arg("w"), _int_arg("h"), _int_arg("q"), _int_arg("fps")
+    overlay = _flag_arg("overlay")
+    max_latency_ms = _int_arg("max_latency_ms")
+    client = StreamClient(
+        remote=request.remote_addr,
+        max_latency=(max_latency_ms / 1000.0 if max_latency_ms else STREAM_MAX_LATENCY_S),
+        variant={"w": w, "h": h, "q": q, "fps": fps, "overlay": overlay},
+    )
+    # poco video en cola: si el visor no recibe, la escritura se bloquea y se descartan frames
+    limit_send_buffer(request.environ.get("werkzeug.socket"), STREAM_SEND_BUFFER)
+    gen = streamer.mjpeg_generator(client, w=w, h=h, q=q, fps=fps, overlay=overlay)
+    return Response(gen,
                     mimetype="multipart/x-mixed-replace; boundary=frame")
 
 
@@ -66,6 +117,64 @@ def video_feed():
     return live()
 
 
+@unified_bp.route("/frame.jpg")
+def frame_jpg():
+    # último frame desde memoria (MIT App Inventor no soporta multipart).
+    # ETag = número de secuencia; 304 si no hay nada nuevo; ?after=<seq> espera uno nuevo.
+    if not streamer.enabled:
+        return jsonify({"ok": False, "error": "monitor_disabled"}), 409
+    w, h, q = _int_arg("w"), _int_arg("h"), _int_arg("q")
+    after = request.args.get("after", type=int)
+    if after is not None:
+        wait_s = max(0.0, min(request.args.get("wait", default=10.0, type=float), 30.0))
+        seq, frame = streamer.wait_frame(after, timeout=wait_s)
+        if frame is None:
+            return _not_modified(after)
+    else:
+        # recién encendido el monitor: la cámara abre en el hilo productor
+        streamer.wait_first_frame()
+
+    seq, ts, jpeg = streamer.encode_variant(w, h, q, _flag_arg("overlay"))
+    if jpeg is None:
+        return jsonify({"ok": False, "error": "no_frame"}), 503
+    if request.if_none_match.contains(str(seq)):
+        return _not_modified(seq)
+    resp = Response(jpeg, mimetype="image/jpeg")
+    resp.set_etag(str(seq))
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Frame-Seq"] = str(seq)
+    resp.headers["X-Frame-Timestamp"] = f"{ts:.3f}"
+    return resp
+
+
+def _not_modified(seq):
+    resp = Response(status=304)
+    resp.set_etag(str(seq))
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Frame-Seq"] = str(seq)
+    return resp
+
+
+@unified_bp.route("/stream_stats")
+def stream_stats():
+    # frames entregados vs descartados por conexión
+    # + percentiles/histograma por etapa (?reset=1 vacía las muestras)
+    clients = streamer.clients_stats()
+    stages = streamer.timing.snapshot()
+    if _flag_arg("reset"):
+        streamer.timing.reset()
+    return jsonify({"clients": clients, "count": len(clients), "stages": stages}), 200
+
+
+@unified_bp.route("/motion")
+def motion_status():
+    # umbrales y estado actual del detector de movimiento
+    gate = streamer.motion_gate
+    if gate is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **gate.as_dict()}), 200
+
+
 # -------------------- SENSORES --------------------
 @unified_bp.route("/sensors")
 def sensors_endpoint():
@@ -91,43 +200,192 @@ def capture():
     if not streamer.enabled:
         return jsonify({"ok": False, "error": "monitor_disabled"}), 409
 
-    frame = streamer.get_frame()
-    if frame is None:
+    # reutiliza el JPEG ya codificado para /live si tiene la calidad de captura (si no,
+    # se codifica aparte, una vez por frame); el disco lo escribe otro hilo
+    streamer.wait_first_frame()
+    _, _, jpeg = streamer.encode_variant(q=CAPTURE_QUALITY if CAPTURE_QUALITY > JPEG_QUALITY else None)
+    if jpeg is None:
         return jsonify({"ok": False, "error": "no_frame"}), 500
 
-    ts_ms = int(time.time() * 1000)
-    filename = f"capture_{ts_ms}.jpg"
-    path = os.path.join(CAPTURE_DIR, filename)
-    try:
-        import cv2
-        ok = cv2.imwrite(path, frame)
-        if not ok:
-            raise RuntimeError("cv2.imwrite returned False")
-    except Exception:
-        # crear archivo vacío para no romper rutas
-        try:
-            open(path, "ab").close()
-        except Exception:
-            logger.exception("No se pudo escribir archivo de captura")
-
     # Omitimos la clasificación de suelo
     soil = "not found"
     sensors.set_soil_type(soil)
     logger.info("Soil classified on capture: %s", soil)
 
+    ts_ms = int(time.time() * 1000)
+    filename = f"capture_{ts_ms}.jpg"
+    entry, is_new = capture_store.add(filename, jpeg, ts_ms, soil_type=soil,
+                                      sensors=sensors.get_payload())
+    if is_new:
+        capture_writer.submit(filename, jpeg)
+    else:
+        # mismo contenido que una captura anterior (escena sin cambios): se reutiliza
+        filename, ts_ms = entry["name"], entry["ts"]
+
     base = request.host_url.rstrip("/")
     full_url = f"{base}/captures/{filename}"
     return jsonify({
         "ok": True,
         "filename": filename,
         "full_url_nocache": f"{full_url}?ts={ts_ms}",
-        "soil_type": soil
+        "soil_type": soil,
+        "duplicate": not is_new
     }), 200
 
 
+@unified_bp.route("/captures")
+def list_captures():
+    """Listado paginado: ?limit=&cursor=&from=&to= (ms) &soil=&order=asc|desc"""
+    limit = max(1, min(_int_arg("limit") or 50, 500))
+    items, next_cursor = capture_store.list(
+        limit=limit,
+        cursor=request.args.get("cursor"),
+        since_ms=_int_arg("from"),
+        until_ms=_int_arg("to"),
+        soil_type=request.args.get("soil"),
+        newest_first=request.args.get("order", "desc") != "asc",
+    )
+    base = request.host_url.rstrip("/")
+    for item in items:
+        item["url"] = f"{base}/captures/{item['name']}"
+    return jsonify({"items": items, "next_cursor": next_cursor}), 200
+
+
+def _export_entries(since_ms, until_ms, soil):
+    # página a página (orden cronológico) para no cargar el rango completo
+    cursor = None
+    while True:
+        items, cursor = capture_store.list(limit=200, cursor=cursor, since_ms=since_ms,
+                                           until_ms=until_ms, soil_type=soil, newest_first=False)
+        for item in items:
+            name = item["name"]
+            # desde disco, sin pasar por el LRU: un export largo no debe desplazar a
+            # las capturas recientes que pide la galería. Solo las que el escritor
+            # aún no guardó salen de memoria.
+            pending = capture_writer.get_pending(name)
+            yield name, item["ts"] / 1000.0, pending if pending is not None else os.path.join(CAPTURE_DIR, name)
+        if cursor is None:
+            return
+
+
+@unified_bp.route("/captures/export")
+def export_captures():
+    """Todas las capturas de ?from=&to= (ms) en un solo ZIP/tar generado al vuelo (?format=zip|tar, &soil=)."""
+    fmt = (request.args.get("format") or "zip").lower()
+    if fmt not in archive.FORMATS:
+        return jsonify({"ok": False, "error": "unknown_format", "formats": list(archive.FORMATS)}), 400
+    since_ms, until_ms = _int_arg("from"), _int_arg("to")
+    build, mimetype = archive.FORMATS[fmt]
+    entries = _export_entries(since_ms, until_ms, request.args.get("soil"))
+    filename = f"captures_{since_ms or 0}_{until_ms or int(time.time() * 1000)}.{fmt}"
+    resp = Response(build(entries), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    # sin buffering en proxies (nginx) para que el archivo empiece a bajar de inmediato
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+# las capturas nunca cambian (nombre único): caché larga en la app y en proxies
+CAPTURE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _capture_bytes_response(data, sha):
+    resp = Response(data, mimetype="image/jpeg")
+    if sha:
+        resp.set_etag(sha)
+    resp = resp.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    resp.headers["Cache-Control"] = CAPTURE_CACHE_CONTROL
+    return resp
+
+
 @unified_bp.route("/captures/<path:name>")
 def serve_captures(name):
-    return send_from_directory(CAPTURE_DIR, name)
+    size = request.args.get("size")
+    if size and size != "full":
+        return _serve_derived(name, size)
+    # recientes: desde el LRU en memoria (incluye las que aún se están escribiendo)
+    hot = capture_store.hot(name)
+    if hot is not None:
+        return _capture_bytes_response(*hot)
+    pending = capture_writer.get_pending(name)
+    if pending is not None:
+        return _capture_bytes_response(pending, capture_store.sha_of(name))
+    # desde disco: send_file maneja If-None-Match, Range y sendfile del servidor WSGI
+    sha = capture_store.sha_of(name)
+    resp = send_from_directory(CAPTURE_DIR, name, mimetype="image/jpeg",
+                               etag=sha if sha else True)
+    resp.headers["Cache-Control"] = CAPTURE_CACHE_CONTROL
+    return resp
+
+
+def _serve_derived(name, size):
+    if size not in thumbnailer.sizes:
+        return jsonify({"ok": False, "error": "unknown_size", "sizes": list(thumbnailer.sizes)}), 400
+    if os.path.basename(name) != name:
+        return jsonify({"ok": False, "error": "not_found"}), 404
+    hot = capture_store.hot(name)
+    source = hot[0] if hot is not None else capture_writer.get_pending(name)
+    path = thumbnailer.get(name, size, source=source)
+    if path is None:
+        return jsonify({"ok": False, "error": "not_found"}), 404
+    sha = capture_store.sha_of(name)
+    resp = send_from_directory(os.path.dirname(path), name, mimetype="image/jpeg",
+                               etag=f"{sha}-{size}" if sha else True)
+    resp.headers["Cache-Control"] = CAPTURE_CACHE_CONTROL
+    return resp
+
+
+@unified_bp.route("/capture_stats")
+def capture_stats():
+    return jsonify({"writer": capture_writer.stats(), "store": capture_store.stats(),
+                    "thumbnails": thumbnailer.stats()}), 200
+
+
+# -------------------- GRABACIÓN POR SEGMENTOS --------------------
+@unified_bp.route("/record")
+def record():
+    action = (request.args.get("action") or "status").lower()
+    if action in ("start", "stop") and request.args.get("token", "") != TOKEN:
+        return jsonify({"ok": False, "error": "bad token"}), 401
+    if action == "start":
+        recorder.start()
+    elif action == "stop":
+        recorder.stop()
+    elif action != "status":
+        return jsonify({"ok": False, "error": "unknown action"}), 400
+    return jsonify({"ok": True, **recorder.stats()}), 200
+
+
+@unified_bp.route("/recordings")
+def list_recordings():
+    """Segmentos que se solapan con ?from=&to= (ms epoch)."""
+    segs = recorder.segments(since_ms=_int_arg("from"), until_ms=_int_arg("to"))
+    base = request.host_url.rstrip("/")
+    for seg in segs:
+        seg["url"] = f"{base}/recordings/{seg['name']}"
+    return jsonify({"segments": segs}), 200
+
+
+@unified_bp.route("/recordings/frame.jpg")
+def recording_frame():
+    """Frame grabado más cercano (en o antes) a ?ts= (ms epoch)."""
+    ts_ms = _int_arg("ts")
+    if ts_ms is None:
+        return jsonify({"ok": False, "error": "missing ts"}), 400
+    frame_ts, jpeg = recorder.frame_at(ts_ms)
+    if jpeg is None:
+        return jsonify({"ok": False, "error": "not_found"}), 404
+    resp = Response(jpeg, mimetype="image/jpeg")
+    resp.headers["X-Frame-Timestamp"] = str(frame_ts)
+    return resp
+
+
+@unified_bp.route("/recordings/<name>")
+def serve_recording(name):
+    path = recorder.segment_path(name)
+    if path is None:
+        return jsonify({"ok": False, "error": "not_found"}), 404
+    return send_from_directory(RECORD_DIR, name, mimetype="video/x-motion-jpeg")
 
 
 # -------------------- CLASIFICADOR DE SUELO --------------------
@@ -212,9 +470,14 @@ def debug_cam():
             is_open = bool(cap is not None and cap.isOpened())
         except Exception:
             is_open = False
+        seq, frame_ts, _ = streamer.get_latest()
         return jsonify({
             "streamer_enabled": bool(streamer.enabled),
+            "streamer_state": streamer.state,
             "cap_is_open": is_open,
+            "cam_info": streamer.cam_info,
+            "frame_seq": seq,
+            "frame_age_ms": (int((time.time() - frame_ts) * 1000) if frame_ts else None),
             "current_soil_type": sensors.soil_type
         }), 200
     except Exception:
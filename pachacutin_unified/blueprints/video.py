@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
-import time, logging
+import json, time, logging, threading
+from collections import OrderedDict
 from typing import Optional
 try:
     import cv2
@@ -7,17 +8,121 @@ except Exception as e:
     cv2 = None
     logging.warning("OpenCV no disponible: %s", e)
 
-from pachacutin_unified.config import CAM_INDEX, CAM_TRY_INDICES
+from pachacutin_unified.config import (
+    CAM_INDEX, CAM_TRY_INDICES, CAM_CACHE_FILE, CAM_STANDBY_S, JPEG_QUALITY, STREAM_MAX_VARIANTS,
+    JPEG_CODEC, JPEG_SUBSAMPLING, JPEG_FAST_DCT,
+    MOTION_GATE, MOTION_THRESHOLD, MOTION_IDLE_AFTER_S, MOTION_KEEPALIVE_S,
+)
+
+try:
+    from pachacutin_camera.motion import MotionGate
+except Exception:
+    MotionGate = None
+
+from pachacutin_camera.metrics import StageTimer
+from pachacutin_camera.streaming import ClientRegistry, StreamClient, Variant, iter_mjpeg
+from pachacutin_camera.codec import default_codec, make_codec
+
+try:
+    from pachacutin_unified.services.overlay import draw_overlay
+except Exception:
+    draw_overlay = None
+
+try:
+    from pachacutin_camera.sources import CAMERA_SOURCE, is_bus, is_device, open_capture
+except Exception as e:
+    CAMERA_SOURCE, is_bus, open_capture = None, (lambda _s: False), None
+    is_device = lambda _s: True
+    logging.warning("pachacutin_camera no disponible: %s", e)
+
 
 class VideoStreamer:
-    def __init__(self):
+    """
+    Un solo hilo productor es dueño de la cámara y deja el último frame en un
+    slot compartido (frame, timestamp, secuencia). /live, /capture y
+    /classify_soil leen de ese slot; nadie más llama a cap.read().
+    """
+    def __init__(self, motion_gate=None, codec=None):
         self.cap = None
         self.enabled = False
+        # backend JPEG (pachacutin_camera.codec): opencv o turbojpeg
+        self.codec = codec or default_codec()
+        # detector de movimiento opcional: con la escena quieta baja a un keep-alive
+        self.motion_gate = motion_gate
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._frame = None
+        self._frame_ts: Optional[float] = None
+        self._seq = 0
+        # caché de codificación: cada variante (w, h, q) se codifica a lo
+        # sumo una vez por frame y la comparten todos los clientes de /live
+        self._variants = OrderedDict()
+        self._variants_lock = threading.Lock()
+        # overlay (?overlay=1): `overlay_lines(ts)` retorna el texto a dibujar; el
+        # frame anotado se genera una vez por secuencia y lo usan todas sus variantes
+        self.overlay_lines = None
+        self._overlay_lock = threading.Lock()
+        self._overlay_seq = 0
+        self._overlay_frame = None
+        # tiempos por etapa: read, motion, overlay, resize, encode, handoff, send
+        self.timing = StageTimer()
+        # conexiones activas (para /stream_stats)
+        self._clients = ClientRegistry()
+        # standby en caliente: stop() solo pausa la lectura, el dispositivo
+        # sigue abierto para que /mode?m=monitor vuelva en milisegundos
+        self.state = "off"
+        self.cam_info = {}
+        self._wake = threading.Event()
+        self._warm_requested = False
+
+    # -------- descubrimiento de cámara (con caché) --------
+    def _load_cam_cache(self) -> dict:
+        try:
+            with open(CAM_CACHE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_cam_cache(self, index: int, cap):
+        info = {
+            "index": index,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0),
+            "fps": float(cap.get(cv2.CAP_PROP_FPS) or 0),
+            "ts": time.time(),
+        }
+        self.cam_info = info
+        try:
+            with open(CAM_CACHE_FILE, "w", encoding="utf-8") as f:
+                json.dump(info, f)
+        except Exception:
+            logging.debug("No se pudo guardar %s", CAM_CACHE_FILE)
 
     def _open_any(self) -> Optional["cv2.VideoCapture"]:
         if cv2 is None:
             return None
+        if is_bus(CAMERA_SOURCE):
+            # otro proceso (pachacutin_camera.daemon) es dueño de la cámara
+            cap = open_capture(CAMERA_SOURCE)
+            if cap.isOpened():
+                logging.info("Leyendo frames del bus de memoria compartida '%s'", cap.name)
+                return cap
+            logging.error("No hay daemon de cámara publicando en el bus.")
+            return None
+        if CAMERA_SOURCE is not None and not is_device(CAMERA_SOURCE):
+            # video, carpeta de imágenes o patrón sintético (pruebas sin cámara)
+            cap = open_capture(CAMERA_SOURCE)
+            if cap.isOpened():
+                logging.info("Usando fuente de frames %s", CAMERA_SOURCE)
+                return cap
+            logging.error("No se pudo abrir la fuente %s", CAMERA_SOURCE)
+            return None
+        # primero el último índice que funcionó (y su configuración), luego el resto
+        cached = self._load_cam_cache()
         indices = []
+        if isinstance(cached.get("index"), int):
+            indices.append(cached["index"])
         if CAM_INDEX is not None:
             try:
                 indices.append(int(CAM_INDEX))
@@ -31,18 +136,75 @@ class VideoStreamer:
             seen.add(i)
             cap = cv2.VideoCapture(i)
             if cap is not None and cap.isOpened():
+                if i == cached.get("index"):
+                    if cached.get("width") and cached.get("height"):
+                        cap.set(cv2.CAP_PROP_FRAME_WIDTH, cached["width"])
+                        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cached["height"])
+                    if cached.get("fps"):
+                        cap.set(cv2.CAP_PROP_FPS, cached["fps"])
                 logging.info("Cámara abierta en /dev/video%d", i)
+                self._save_cam_cache(i, cap)
                 return cap
             if cap is not None:
                 cap.release()
         logging.error("No se pudo abrir ninguna cámara.")
         return None
 
+    # -------- ciclo de vida: running / standby / off --------
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
+    def warmup(self):
+        """Abre la cámara en segundo plano y la deja en standby (fuera del camino de las peticiones)."""
+        if cv2 is None:
+            return
+        self._warm_requested = True
+        self._wake.set()
+        self._ensure_thread()
+
     def start(self):
+        # no bloquea: el hilo productor reanuda la lectura (o abre la cámara) por su cuenta
         self.enabled = True
+        if cv2 is None:
+            return
+        self._wake.set()
+        self._ensure_thread()
 
     def stop(self):
+        # pasa a standby: se deja de leer pero el dispositivo sigue abierto CAM_STANDBY_S
         self.enabled = False
+        with self._cond:
+            self._frame = None
+            self._frame_ts = None
+            self._cond.notify_all()
+        self._wake.set()
+
+    def _standby(self):
+        """Espera (sin leer) a que vuelvan a habilitar el streamer; libera la cámara si pasa CAM_STANDBY_S."""
+        self.state = "standby" if self.cap is not None else "off"
+        deadline = time.monotonic() + CAM_STANDBY_S
+        while not self.enabled:
+            if self.cap is not None and time.monotonic() >= deadline:
+                self._release_cap()
+                self.state = "off"
+                logging.info("Cámara liberada tras %.0f s en standby", CAM_STANDBY_S)
+            if self._warm_requested:
+                if self.cap is None:
+                    return      # _capture_loop abre la cámara y consume el pedido
+                # ya está abierta: el pedido queda cumplido y el standby vuelve a contar
+                self._warm_requested = False
+                deadline = time.monotonic() + CAM_STANDBY_S
+            self._wake.wait(1.0)
+            self._wake.clear()
+        if self.cap is not None:
+            # arranque en caliente: descartar frames viejos del buffer V4L2
+            for _ in range(4):
+                self.cap.grab()
+
+    def _release_cap(self):
         if self.cap is not None:
             try:
                 self.cap.release()
@@ -50,34 +212,171 @@ class VideoStreamer:
                 pass
             self.cap = None
 
+    def _capture_loop(self):
+        # el hilo productor abre, lee y libera la cámara; nadie más la toca
+        try:
+            while True:
+                if self.cap is None or not self.cap.isOpened():
+                    if self.enabled or self._warm_requested:
+                        self._warm_requested = False
+                        self.state = "opening"
+                        self.cap = self._open_any()
+                    if self.cap is None and self.enabled:
+                        time.sleep(1.0)
+                        continue
+                elif self._warm_requested:
+                    # warmup() con la cámara ya abierta: no hay nada que abrir
+                    self._warm_requested = False
+                if not self.enabled:
+                    self._standby()
+                    continue
+                self.state = "running"
+                t0 = time.perf_counter()
+                ok, frame = self.cap.read()
+                if not ok:
+                    time.sleep(0.02)
+                    continue
+                # hora de captura: viaja con el frame hasta cada cliente (X-Timestamp)
+                captured = time.time()
+                self.timing.record("read", time.perf_counter() - t0)
+                if self.motion_gate:
+                    with self.timing.time("motion"):
+                        moved = self.motion_gate.check(frame)
+                    if not moved:
+                        # escena quieta: no se publica, nadie codifica ni envía
+                        continue
+                with self._cond:
+                    if not self.enabled:
+                        continue
+                    self._frame = frame
+                    self._frame_ts = captured
+                    self._seq += 1
+                    self._cond.notify_all()
+        finally:
+            self._release_cap()
+            self.state = "off"
+
+    def get_latest(self):
+        """Retorna (seq, ts, frame) del slot compartido sin tocar la cámara."""
+        with self._lock:
+            return self._seq, self._frame_ts, self._frame
+
     def get_frame(self):
         if cv2 is None or not self.enabled:
             return None
-        if self.cap is None or not self.cap.isOpened():
-            self.cap = self._open_any()
-            if self.cap is None:
-                return None
-        ok, frame = self.cap.read()
-        if not ok:
-            time.sleep(0.02)
-            return None
-        return frame
+        with self._lock:
+            return self._frame
+
+    def wait_frame(self, last_seq=0, timeout=1.0):
+        """Espera un frame con secuencia mayor a `last_seq`. Retorna (seq, frame) o (last_seq, None)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or not self.enabled, timeout)
+            if not self.enabled or self._seq <= last_seq or self._frame is None:
+                return last_seq, None
+            return self._seq, self._frame
+
+    def wait_first_frame(self, timeout=3.0):
+        """Si aún no hay frame (p.ej. recién se pasó a monitor), espera el primero hasta `timeout` s."""
+        seq, _, frame = self.get_latest()
+        if frame is None and self.enabled:
+            self.wait_frame(seq, timeout)
+
+    @staticmethod
+    def variant_size(src_w, src_h, w=None, h=None):
+        """Tamaño (w, h) de una variante: mantiene la proporción si falta un lado y nunca agranda."""
+        if not w and not h:
+            return src_w, src_h
+        if not h:
+            h = round(w * src_h / src_w)
+        elif not w:
+            w = round(h * src_w / src_h)
+        return max(16, min(int(w), src_w)), max(16, min(int(h), src_h))
+
+    def get_jpeg(self, w=None, h=None, q=None):
+        """Retorna (seq, jpeg) del último frame en el tamaño/calidad pedidos, codificando a lo sumo una vez por frame."""
+        seq, _, jpeg = self.encode_variant(w, h, q)
+        return seq, jpeg
 
-    def mjpeg_generator(self):
+    def _annotated(self, seq, ts, frame):
+        """Frame `seq` con el overlay dibujado (una sola vez por secuencia)."""
+        with self._overlay_lock:
+            if self._overlay_seq != seq or self._overlay_frame is None:
+                lines = self.overlay_lines(ts) if self.overlay_lines else []
+                self._overlay_frame = draw_overlay(frame, lines)
+                self._overlay_seq = seq
+            return self._overlay_frame
+
+    def encode_variant(self, w=None, h=None, q=None, overlay=False):
+        q = JPEG_QUALITY if not q else max(10, min(int(q), 95))
+        overlay = bool(overlay) and draw_overlay is not None
+        with self._lock:
+            seq, ts, frame = self._seq, self._frame_ts, self._frame
+        if frame is None or not self.enabled:
+            return seq, ts, None
+        # la clave es el tamaño resultante: ?w=320, ?w=320&h=240 o ?w=9999 comparten entrada
+        src_h, src_w = frame.shape[:2]
+        size = self.variant_size(src_w, src_h, w, h)
+        key = (size, q, overlay)
+        with self._variants_lock:
+            entry = self._variants.get(key)
+            if entry is None:
+                entry = self._variants[key] = Variant()
+                while len(self._variants) > STREAM_MAX_VARIANTS:
+                    self._variants.popitem(last=False)
+            else:
+                self._variants.move_to_end(key)
+
+        with entry.lock:
+            # otro cliente pudo codificar este frame (o uno más nuevo) mientras esperábamos
+            if entry.seq >= seq and entry.jpeg is not None:
+                return entry.seq, entry.ts, entry.jpeg
+            if overlay:
+                with self.timing.time("overlay"):
+                    frame = self._annotated(seq, ts, frame)
+            if size != (src_w, src_h):
+                with self.timing.time("resize"):
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            with self.timing.time("encode"):
+                jpeg = self.codec.encode(frame, q)
+            if jpeg is None:
+                return seq, ts, None
+            entry.seq, entry.ts, entry.jpeg = seq, ts, jpeg
+            return seq, ts, entry.jpeg
+
+    def add_client(self, client: StreamClient):
+        self._clients.add(client)
+
+    def remove_client(self, client: StreamClient):
+        self._clients.remove(client)
+
+    def clients_stats(self):
+        return self._clients.stats()
+
+    def mjpeg_generator(self, client: Optional[StreamClient] = None, w=None, h=None, q=None, fps=None,
+                        overlay=False):
         if cv2 is None:
             while self.enabled:
                 yield (b"--frame\r\nContent-Type: text/plain\r\n\r\nOpenCV no disponible\r\n\r\n")
                 time.sleep(1.0)
             return
-        while self.enabled:
-            frame = self.get_frame()
+        client = client or StreamClient()
+
+        def next_frame(last_seq):
+            seq, frame = self.wait_frame(last_seq, timeout=1.0)
             if frame is None:
-                time.sleep(0.2)
-                continue
-            ok, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            if not ok:
-                continue
-            jpg = buffer.tobytes()
-            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg + b"\r\n")
+                return seq, 0.0, None
+            return self.encode_variant(w, h, q, overlay)
+
+        self.add_client(client)
+        try:
+            yield from iter_mjpeg(client, next_frame, fps=fps, timing=self.timing,
+                                  running=lambda: self.enabled)
+        finally:
+            self.remove_client(client)
 
-streamer = VideoStreamer()
+streamer = VideoStreamer(
+    motion_gate=(MotionGate(threshold=MOTION_THRESHOLD,
+                            idle_after_s=MOTION_IDLE_AFTER_S,
+                            keepalive_s=MOTION_KEEPALIVE_S) if MOTION_GATE and MotionGate is not None else None),
+    codec=make_codec(JPEG_CODEC, JPEG_SUBSAMPLING, JPEG_FAST_DCT),
+)
@@ -14,10 +14,51 @@ BASE_DIR    = os.path.dirname(__file__)
 STATIC_DIR  = os.path.join(BASE_DIR, "static")
 CAPTURE_DIR = os.path.join(STATIC_DIR, "captures")
 os.makedirs(CAPTURE_DIR, exist_ok=True)
+# escritura diferida de /capture: la respuesta no espera al disco
+CAPTURE_WORKERS   = int(os.environ.get("PACHACUTIN_CAPTURE_WORKERS", "2"))
+CAPTURE_QUEUE_MAX = int(os.environ.get("PACHACUTIN_CAPTURE_QUEUE", "32"))  # llena -> escritura en la petición
+# calidad JPEG de /capture (la de cv2.imwrite); el JPEG de /live se reutiliza solo si ya la alcanza
+CAPTURE_QUALITY   = int(os.environ.get("PACHACUTIN_CAPTURE_QUALITY", "95"))
+# índice SQLite de capturas y retención (0 = sin límite)
+CAPTURE_DB           = os.path.join(BASE_DIR, "captures.db")
+CAPTURE_MAX_MB       = float(os.environ.get("PACHACUTIN_CAPTURE_MAX_MB", "2048"))
+CAPTURE_MAX_AGE_DAYS = float(os.environ.get("PACHACUTIN_CAPTURE_MAX_AGE_DAYS", "0"))
+CAPTURE_HOT_N        = int(os.environ.get("PACHACUTIN_CAPTURE_HOT_N", "32"))   # capturas recientes en memoria
+# miniaturas (/captures/<name>?size=thumb): nombre:lado mayor en px
+THUMB_SIZES   = os.environ.get("PACHACUTIN_THUMB_SIZES", "thumb:160,preview:640")
+THUMB_QUALITY = int(os.environ.get("PACHACUTIN_THUMB_QUALITY", "75"))
 
 # Cámara
 CAM_INDEX = os.environ.get("PACHACUTIN_CAM_INDEX")  # "0","1","2"... o None
 CAM_TRY_INDICES = [0,1,2,3]
+CAM_CACHE_FILE  = os.path.join(BASE_DIR, "cam_cache.json")   # último índice que funcionó + ajustes
+CAM_STANDBY_S   = float(os.environ.get("PACHACUTIN_CAM_STANDBY", "120"))  # cámara abierta sin leer tras salir de monitor
+CAM_WARMUP      = os.environ.get("PACHACUTIN_CAM_WARMUP", "1") == "1"     # abrir la cámara en segundo plano al iniciar
+JPEG_QUALITY = int(os.environ.get("PACHACUTIN_JPEG_QUALITY", "80"))
+# backend JPEG: opencv | turbojpeg (PyTurboJPEG) | auto; medir con python -m pachacutin_camera.codec
+JPEG_CODEC       = os.environ.get("PACHACUTIN_JPEG_CODEC", "opencv")
+JPEG_SUBSAMPLING = os.environ.get("PACHACUTIN_JPEG_SUBSAMPLING", "")   # 420 | 422 | 444 | "" (del backend)
+JPEG_FAST_DCT    = os.environ.get("PACHACUTIN_JPEG_FAST_DCT", "0") == "1"
+# máximo de variantes (w, h, q) distintas en caché para /live?w=&h=&q=&fps=
+STREAM_MAX_VARIANTS = int(os.environ.get("PACHACUTIN_STREAM_VARIANTS", "8"))
+# latencia máxima por cliente: frames más viejos se descartan (?max_latency_ms= lo ajusta)
+STREAM_MAX_LATENCY_S = float(os.environ.get("PACHACUTIN_STREAM_MAX_LATENCY", "0.5"))
+# bytes en cola sin enviar por visor: acota el video atrasado hacia un cliente lento (0 = sin límite)
+STREAM_SEND_BUFFER = int(os.environ.get("PACHACUTIN_STREAM_SNDBUF", str(16 * 1024)))
+
+# Compuerta de movimiento: con la escena quieta solo se publica un frame cada MOTION_KEEPALIVE_S
+# (apagada por defecto: se publican todos los frames; PACHACUTIN_MOTION_GATE=1 la activa)
+MOTION_GATE         = os.environ.get("PACHACUTIN_MOTION_GATE", "0") == "1"
+MOTION_THRESHOLD    = float(os.environ.get("PACHACUTIN_MOTION_THRESHOLD", "3.0"))
+MOTION_IDLE_AFTER_S = float(os.environ.get("PACHACUTIN_MOTION_IDLE_AFTER", "3.0"))
+MOTION_KEEPALIVE_S  = float(os.environ.get("PACHACUTIN_MOTION_KEEPALIVE", "1.0"))
+
+# Grabación continua por segmentos (/record?action=start|stop, /recordings?from=&to=)
+RECORD_DIR       = os.path.join(BASE_DIR, "recordings")
+RECORD_SEGMENT_S = int(os.environ.get("PACHACUTIN_RECORD_SEGMENT_S", "60"))
+RECORD_FPS       = float(os.environ.get("PACHACUTIN_RECORD_FPS", "5"))
+RECORD_MAX_MB    = float(os.environ.get("PACHACUTIN_RECORD_MAX_MB", "4096"))   # 0 = sin límite
+RECORD_AUTOSTART = os.environ.get("PACHACUTIN_RECORD_AUTOSTART", "0") == "1"
 
 # Serial (Arduino)
 SERIAL_PORT = os.environ.get("PACHACUTIN_SERIAL", "/dev/ttyACM0").strip()   # p.ej. /dev/ttyACM0
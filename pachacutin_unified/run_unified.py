@@ -1,26 +1,42 @@
 # -*- coding: utf-8 -*-
+import os
 import logging
-from flask import Flask
+from flask import Flask, request
 from flask_cors import CORS
 
-from pachacutin_unified.config import HOST, PORT, DEBUG
-from pachacutin_unified.blueprints.unified import unified_bp
+from pachacutin_unified.config import HOST, PORT, DEBUG, CAM_WARMUP, RECORD_AUTOSTART
+from pachacutin_unified.blueprints.unified import unified_bp, recorder
+from pachacutin_unified.blueprints.video import streamer
 
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s [%(levelname)s] %(message)s")
 
+# endpoints que manejan su propia política de caché (ETag / 304)
+CACHE_EXEMPT_ENDPOINTS = {"unified.frame_jpg", "unified.serve_captures"}
+
 def create_app():
     app = Flask(__name__)
     CORS(app)
 
     @app.after_request
     def _no_cache(resp):
+        if request.endpoint in CACHE_EXEMPT_ENDPOINTS:
+            return resp
         resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
         resp.headers["Pragma"] = "no-cache"
         resp.headers["Expires"] = "0"
         return resp
 
     app.register_blueprint(unified_bp)
+
+    # descubrir/abrir la cámara en segundo plano: el primer /mode?m=monitor no espera
+    # (con el reloader de debug, solo en el proceso hijo que sirve las peticiones)
+    serving = not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    if CAM_WARMUP and serving:
+        streamer.warmup()
+    # la grabación queda armada y escribe mientras el modo monitor tenga la cámara activa
+    if RECORD_AUTOSTART and serving:
+        recorder.start()
     return app
 
 if __name__ == "__main__":
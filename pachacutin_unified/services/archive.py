@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Archivos ZIP / tar generados al vuelo para descargar muchas capturas en una
+sola petición (/captures/export).
+
+Nada se arma en memoria ni en disco: cada entrada se lee del archivo (o de
+los bytes en memoria) por bloques y se entrega tal cual. Los JPEG ya vienen
+comprimidos, así que las entradas van "stored" (sin recompresión) y el CPU
+del equipo casi no participa.
+
+Cada entrada es una tupla (nombre_en_el_archivo, mtime_s, fuente), donde la
+fuente es `bytes` o la ruta de un archivo.
+"""
+import os
+import tarfile
+import time
+import zipfile
+
+CHUNK = 64 * 1024
+
+
+class _Sink:
+    """Destino de escritura no posicionable: acumula lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self._parts = []
+        self._offset = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _size(source):
+    return len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+
+
+def _chunks(source, size):
+    """Exactamente `size` bytes de la fuente, por bloques (rellena con ceros si el archivo se acortó)."""
+    if isinstance(source, (bytes, bytearray)):
+        for i in range(0, size, CHUNK):
+            yield source[i:i + CHUNK]
+        return
+    left = size
+    with open(source, "rb") as f:
+        while left > 0:
+            block = f.read(min(CHUNK, left))
+            if not block:
+                break
+            left -= len(block)
+            yield block
+    if left > 0:
+        yield b"\0" * left
+
+
+def _readable(entries):
+    """Descarta entradas cuyo archivo ya no existe (p.ej. borrado por la retención)."""
+    for name, mtime, source in entries:
+        try:
+            size = _size(source)
+        except OSError:
+            continue
+        yield name, mtime, source, size
+
+
+def stream_zip(entries):
+    """Genera los bytes de un ZIP (entradas stored, ZIP64 si hace falta)."""
+    sink = _Sink()
+    # con un destino sin seek(), zipfile escribe CRC/tamaños en un descriptor tras cada entrada
+    zf = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+    for name, mtime, source, size in _readable(entries):
+        info = zipfile.ZipInfo(name, date_time=time.localtime(max(mtime, 315532800))[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        info.file_size = size
+        info.external_attr = 0o644 << 16
+        with zf.open(info, "w") as dst:
+            for block in _chunks(source, size):
+                dst.write(block)
+                yield sink.drain()
+        yield sink.drain()   # descriptor de datos de la entrada
+    zf.close()
+    yield sink.drain()       # directorio central
+
+
+def stream_tar(entries):
+    """Genera los bytes de un tar (formato PAX, sin comprimir)."""
+    written = 0
+    for name, mtime, source, size in _readable(entries):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        header = info.tobuf(tarfile.PAX_FORMAT)
+        yield header
+        for block in _chunks(source, size):
+            yield block
+        pad = -size % tarfile.BLOCKSIZE
+        if pad:
+            yield tarfile.NUL * pad
+        written += len(header) + size + pad
+    # fin de archivo: dos bloques vacíos y relleno hasta completar el registro
+    end = 2 * tarfile.BLOCKSIZE
+    end += -(written + end) % tarfile.RECORDSIZE
+    yield tarfile.NUL * end
+
+
+FORMATS = {
+    "zip": (stream_zip, "application/zip"),
+    "tar": (stream_tar, "application/x-tar"),
+}
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Índice SQLite de las capturas de static/captures.
+
+Cada captura queda registrada con su timestamp, tamaño, sha256, el
+snapshot de sensores y el tipo de suelo del momento. El listado y las
+búsquedas van contra el índice (nunca se recorre el directorio), con
+paginación por cursor sobre (ts_ms, id). La retención borra primero lo
+más viejo hasta quedar bajo `max_bytes`, y todo lo que supere `max_age_s`.
+
+Las últimas `hot_n` capturas (bytes + sha256) quedan además en un LRU en
+memoria: la galería de la app suele pedir las más recientes una y otra vez.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    name      TEXT NOT NULL UNIQUE,
+    ts_ms     INTEGER NOT NULL,
+    size      INTEGER NOT NULL,
+    sha256    TEXT NOT NULL,
+    soil_type TEXT,
+    sensors   TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_ts ON captures (ts_ms, id);
+CREATE INDEX IF NOT EXISTS captures_soil ON captures (soil_type, ts_ms);
+"""
+
+_NAME_TS = re.compile(r"capture_(\d+)\.jpg$")
+
+
+def _row_dict(row):
+    id_, name, ts_ms, size, sha, soil, sensors = row
+    return {
+        "id": id_,
+        "name": name,
+        "ts": ts_ms,
+        "size": size,
+        "sha256": sha,
+        "soil_type": soil,
+        "sensors": json.loads(sensors) if sensors else None,
+    }
+
+
+def encode_cursor(ts_ms, id_):
+    return f"{ts_ms}_{id_}"
+
+
+def decode_cursor(cursor):
+    try:
+        ts_ms, id_ = cursor.split("_", 1)
+        return int(ts_ms), int(id_)
+    except (AttributeError, ValueError):
+        return None
+
+
+class CaptureStore:
+    def __init__(self, db_path, directory, max_bytes=0, max_age_s=0, hot_n=32, on_evict=None):
+        self.db_path = db_path
+        self.directory = directory
+        self.max_bytes = max_bytes      # 0 = sin límite
+        self.max_age_s = max_age_s      # 0 = sin límite
+        self.on_evict = on_evict        # on_evict(name): limpiar archivos derivados
+        self._lock = threading.Lock()
+        self._last_age_check = 0.0
+        self.evicted = 0
+        self.deduplicated = 0
+        self.hot_n = hot_n
+        self._hot = OrderedDict()   # name -> (bytes, sha256)
+        self.hot_hits = 0
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM captures").fetchone()[0]
+        self._unique_sha()
+
+    def _unique_sha(self):
+        """Índice UNIQUE sobre sha256; en bases anteriores primero se borran las copias repetidas."""
+        dups = self._db.execute(
+            "SELECT id, name, size FROM captures "
+            "WHERE id NOT IN (SELECT MIN(id) FROM captures GROUP BY sha256)").fetchall()
+        if dups:
+            _log.info("Índice de capturas: %d copias con el mismo contenido eliminadas", len(dups))
+            self._evict_rows(dups)
+        self._db.execute("DROP INDEX IF EXISTS captures_sha")
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS captures_sha_unique ON captures (sha256)")
+        self._db.commit()
+
+    # ---------------- altas ----------------
+    def find_by_hash(self, sha):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, name, ts_ms, size, sha256, soil_type, sensors FROM captures "
+                "WHERE sha256 = ?", (sha,)).fetchone()
+        return _row_dict(row) if row else None
+
+    def add(self, name, data, ts_ms, soil_type=None, sensors=None):
+        """
+        Registra una captura. Si ya hay una con el mismo contenido (p.ej. la
+        escena no cambió y el stream entregó el mismo JPEG) retorna
+        (entrada_existente, False) y no hay que escribir nada; si no,
+        (entrada_nueva, True).
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        sensors_json = json.dumps(sensors) if sensors is not None else None
+        with self._lock:
+            # búsqueda por contenido e inserción bajo el mismo lock (una sola conexión,
+            # y nadie deja una transacción abierta al soltarlo); el índice UNIQUE
+            # sobre sha256 impide igual que queden dos filas con el mismo JPEG
+            try:
+                row = self._db.execute(
+                    "SELECT id, name, ts_ms, size, sha256, soil_type, sensors FROM captures "
+                    "WHERE sha256 = ?", (sha,)).fetchone()
+                if row is not None:
+                    self.deduplicated += 1
+                    return _row_dict(row), False
+                # mismo nombre (dos capturas en el mismo milisegundo): la nueva reemplaza el archivo
+                replaced = self._db.execute("SELECT size FROM captures WHERE name = ?", (name,)).fetchone()
+                self._db.execute(
+                    "INSERT INTO captures (name, ts_ms, size, sha256, soil_type, sensors) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET ts_ms = excluded.ts_ms, size = excluded.size, "
+                    "sha256 = excluded.sha256, soil_type = excluded.soil_type, sensors = excluded.sensors",
+                    (name, ts_ms, len(data), sha, soil_type, sensors_json))
+                id_ = self._db.execute("SELECT id FROM captures WHERE name = ?", (name,)).fetchone()[0]
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+            self._total += len(data) - (replaced[0] if replaced else 0)
+            entry = {"id": id_, "name": name, "ts": ts_ms, "size": len(data),
+                     "sha256": sha, "soil_type": soil_type, "sensors": sensors}
+            self._remember(name, data, sha)
+        self.enforce_retention()
+        return entry, True
+
+    def remove(self, name):
+        with self._lock:
+            row = self._db.execute("SELECT size FROM captures WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return False
+            self._db.execute("DELETE FROM captures WHERE name = ?", (name,))
+            self._db.commit()
+            self._total -= row[0]
+            self._hot.pop(name, None)
+        return True
+
+    # ---------------- LRU en memoria ----------------
+    def _remember(self, name, data, sha):
+        # llamar con self._lock tomado
+        if not self.hot_n:
+            return
+        self._hot[name] = (data, sha)
+        self._hot.move_to_end(name)
+        while len(self._hot) > self.hot_n:
+            self._hot.popitem(last=False)
+
+    def remember(self, name, data, sha):
+        with self._lock:
+            self._remember(name, data, sha)
+
+    def hot(self, name):
+        """(bytes, sha256) si la captura está en memoria, si no None."""
+        with self._lock:
+            item = self._hot.get(name)
+            if item is not None:
+                self._hot.move_to_end(name)
+                self.hot_hits += 1
+            return item
+
+    def sha_of(self, name):
+        with self._lock:
+            row = self._db.execute("SELECT sha256 FROM captures WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    # ---------------- consultas ----------------
+    def get(self, name):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, name, ts_ms, size, sha256, soil_type, sensors FROM captures "
+                "WHERE name = ?", (name,)).fetchone()
+        return _row_dict(row) if row else None
+
+    def list(self, limit=50, cursor=None, since_ms=None, until_ms=None, soil_type=None, newest_first=True):
+        """Retorna (entradas, siguiente_cursor). El cursor es opaco ("ts_id")."""
+        where, args = [], []
+        if since_ms is not None:
+            where.append("ts_ms >= ?")
+            args.append(since_ms)
+        if until_ms is not None:
+            where.append("ts_ms <= ?")
+            args.append(until_ms)
+        if soil_type:
+            where.append("soil_type = ?")
+            args.append(soil_type)
+        pos = decode_cursor(cursor) if cursor else None
+        if pos is not None:
+            where.append("(ts_ms, id) < (?, ?)" if newest_first else "(ts_ms, id) > (?, ?)")
+            args.extend(pos)
+        order = "DESC" if newest_first else "ASC"
+        sql = ("SELECT id, name, ts_ms, size, sha256, soil_type, sensors FROM captures"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + f" ORDER BY ts_ms {order}, id {order} LIMIT ?")
+        args.append(limit + 1)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        items = [_row_dict(r) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last["ts"], last["id"])
+        return items, next_cursor
+
+    def stats(self):
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM captures").fetchone()[0]
+            total = self._total
+            return {"count": count, "bytes": total, "max_bytes": self.max_bytes,
+                    "max_age_s": self.max_age_s, "evicted": self.evicted,
+                    "deduplicated": self.deduplicated,
+                    "hot": len(self._hot), "hot_hits": self.hot_hits}
+
+    # ---------------- retención ----------------
+    def _evict_rows(self, rows):
+        for _, name, size in rows:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                _log.warning("No se pudo borrar %s: %s", name, e)
+            self._db.execute("DELETE FROM captures WHERE name = ?", (name,))
+            self._total -= size
+            self._hot.pop(name, None)
+            self.evicted += 1
+            if self.on_evict is not None:
+                self.on_evict(name)
+        self._db.commit()
+
+    def enforce_retention(self):
+        with self._lock:
+            now = time.time()
+            # por antigüedad: como mucho una vez por minuto
+            if self.max_age_s and now - self._last_age_check >= 60:
+                self._last_age_check = now
+                cutoff = int((now - self.max_age_s) * 1000)
+                rows = self._db.execute(
+                    "SELECT id, name, size FROM captures WHERE ts_ms < ?", (cutoff,)).fetchall()
+                if rows:
+                    _log.info("Retención: %d capturas más viejas que %ds", len(rows), self.max_age_s)
+                    self._evict_rows(rows)
+            # por tamaño: lo más viejo primero, en lotes
+            while self.max_bytes and self._total > self.max_bytes:
+                rows = self._db.execute(
+                    "SELECT id, name, size FROM captures ORDER BY ts_ms ASC, id ASC LIMIT 32").fetchall()
+                if not rows:
+                    break
+                excess, batch = self._total - self.max_bytes, []
+                for row in rows:
+                    batch.append(row)
+                    excess -= row[2]
+                    if excess <= 0:
+                        break
+                self._evict_rows(batch)
+
+    # ---------------- importación inicial ----------------
+    def _read_for_import(self, name):
+        """(name, ts_ms, bytes, sha256) de un archivo del directorio, o None si no se pudo leer."""
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            m = _NAME_TS.search(name)
+            ts_ms = int(m.group(1)) if m else int(os.path.getmtime(path) * 1000)
+        except OSError:
+            return None
+        return name, ts_ms, data, hashlib.sha256(data).hexdigest()
+
+    def import_existing(self, batch_size=64):
+        """Indexa una sola vez los .jpg que ya estaban en el directorio (índice vacío)."""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM captures LIMIT 1").fetchone():
+                return 0
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith(".jpg"))
+        except FileNotFoundError:
+            return 0
+        count, duplicates = 0, []
+        for start in range(0, len(names), batch_size):
+            # leer y calcular hashes sin el lock; cada lote se inserta y confirma
+            # con el lock tomado para no dejar una transacción abierta a add()
+            batch = [item for item in map(self._read_for_import, names[start:start + batch_size]) if item]
+            with self._lock:
+                for name, ts_ms, data, sha in batch:
+                    same = self._db.execute("SELECT name FROM captures WHERE sha256 = ?", (sha,)).fetchone()
+                    if same is not None:
+                        if same[0] != name:
+                            duplicates.append(name)
+                        continue
+                    cur = self._db.execute(
+                        "INSERT OR IGNORE INTO captures (name, ts_ms, size, sha256) VALUES (?, ?, ?, ?)",
+                        (name, ts_ms, len(data), sha))
+                    if cur.rowcount:
+                        self._total += len(data)
+                        count += 1
+                self._db.commit()
+        # copias con el mismo contenido que otra ya indexada: sin fila la retención
+        # nunca las borraría, así que se eliminan como hace add() con las nuevas
+        for name in duplicates:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                _log.warning("No se pudo borrar la copia %s: %s", name, e)
+                continue
+            if self.on_evict is not None:
+                self.on_evict(name)
+        if duplicates:
+            with self._lock:
+                self.deduplicated += len(duplicates)
+            _log.info("Índice de capturas: %d archivos repetidos eliminados al importar", len(duplicates))
+        if count:
+            _log.info("Índice de capturas: %d archivos existentes importados", count)
+        self.enforce_retention()
+        return count
+
+    def import_existing_async(self):
+        threading.Thread(target=self.import_existing, name="capture-import", daemon=True).start()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Texto sobre el video (tipo de suelo, humedad, temperatura, hora).
+
+VideoStreamer dibuja esto una sola vez por frame, antes de codificar, y
+todas las variantes con ?overlay=1 parten de ese frame anotado.
+"""
+import time
+
+import cv2
+
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def sensor_lines(payload, ts):
+    """Líneas de texto a partir de sensors.get_payload() y el timestamp del frame."""
+    lines = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))]
+    soil = payload.get("soil_type")
+    if soil:
+        lines.append(f"Suelo: {soil}")
+    moisture = payload.get("soil_moisture")
+    if moisture is not None:
+        lines.append(f"Humedad suelo: {moisture}%")
+    temp = payload.get("temperature")
+    if temp is not None:
+        lines.append(f"Temp: {temp} C  HR: {payload.get('air_humidity')}%")
+    return lines
+
+
+def draw_overlay(frame, lines):
+    """Copia de `frame` con `lines` en la esquina superior izquierda sobre una banda oscura."""
+    out = frame.copy()
+    if not lines:
+        return out
+    h, w = out.shape[:2]
+    scale = max(0.4, min(w / 1280.0, 1.0))
+    thickness = 1 if scale < 0.7 else 2
+    line_h = int(26 * scale) + 4
+    box_w = min(w, max(cv2.getTextSize(t, _FONT, scale, thickness)[0][0] for t in lines) + 12)
+    box_h = min(h, line_h * len(lines) + 8)
+    # oscurecer la banda (más barato que addWeighted sobre todo el frame)
+    band = out[:box_h, :box_w]
+    band >>= 1
+    for i, text in enumerate(lines):
+        y = 4 + line_h * (i + 1) - 6
+        cv2.putText(out, text, (6, y), _FONT, scale, (255, 255, 255), thickness, cv2.LINE_AA)
+    return out
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Grabación continua por segmentos.
+
+En lugar de un archivo por frame, cada segmento de `segment_s` segundos es
+un único archivo .mjpg con los JPEG concatenados (reproducible con
+`ffplay -f mjpeg seg_<ms>.mjpg`) más un índice binario .idx con un registro
+(ts_ms, offset, largo) por frame. La lista de segmentos (index.json) permite
+buscar por rango de tiempo sin recorrer el directorio; dentro del segmento
+se busca con bisect sobre el .idx.
+
+Los JPEG salen de streamer.encode_variant(), así que si /live está abierto
+con la misma variante no se codifica dos veces.
+"""
+import bisect
+import json
+import logging
+import os
+import struct
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+_IDX = struct.Struct("<QQI")   # ts_ms, offset, largo
+
+
+class SegmentRecorder:
+    def __init__(self, streamer, directory, segment_s=60, fps=5, max_bytes=0, quality=None):
+        self.streamer = streamer
+        self.directory = directory
+        self.segment_s = segment_s
+        self.fps = fps
+        self.max_bytes = max_bytes     # 0 = sin límite
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._thread = None
+        self._active = False
+        self._segments = []            # [{"name", "start", "end", "frames", "bytes"}] ordenados por start
+        self._current = None
+        self._data_f = None
+        self._idx_f = None
+        self._total = 0
+        self.deleted = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # ---------------- índice ----------------
+    def _index_path(self):
+        return os.path.join(self.directory, "index.json")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), "r") as f:
+                segs = json.load(f)
+        except (OSError, ValueError):
+            segs = []
+        # descartar entradas sin archivos y completar la del segmento que quedó
+        # abierto si el proceso se cortó (el .idx tiene la verdad)
+        self._segments = []
+        for seg in segs:
+            idx = os.path.join(self.directory, seg["name"][:-5] + ".idx")
+            try:
+                count = os.path.getsize(idx) // _IDX.size
+            except OSError:
+                continue
+            if not count:
+                self._remove_files(seg["name"])
+                continue
+            if count != seg["frames"]:
+                with open(idx, "rb") as f:
+                    f.seek((count - 1) * _IDX.size)
+                    ts_ms, offset, length = _IDX.unpack(f.read(_IDX.size))
+                seg.update(end=ts_ms, frames=count, bytes=offset + length)
+            self._segments.append(seg)
+        self._total = sum(s["bytes"] for s in self._segments)
+
+    def _save_index(self):
+        tmp = self._index_path() + ".part"
+        with open(tmp, "w") as f:
+            json.dump(self._segments, f)
+        os.replace(tmp, self._index_path())
+
+    # ---------------- control ----------------
+    @property
+    def active(self):
+        return self._active
+
+    def start(self):
+        with self._lock:
+            if self._active:
+                return
+            self._active = True
+            self._thread = threading.Thread(target=self._loop, name="recorder", daemon=True)
+            self._thread.start()
+        _log.info("Grabación iniciada (segmentos de %ss, %s fps)", self.segment_s, self.fps)
+
+    def stop(self):
+        with self._lock:
+            self._active = False
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=3.0)
+        with self._lock:
+            self._close_segment()
+        _log.info("Grabación detenida")
+
+    # ---------------- escritura ----------------
+    def _open_segment(self, ts_ms):
+        name = f"seg_{ts_ms}.mjpg"
+        self._data_f = open(os.path.join(self.directory, name), "wb")
+        self._idx_f = open(os.path.join(self.directory, name[:-5] + ".idx"), "wb")
+        self._current = {"name": name, "start": ts_ms, "end": ts_ms, "frames": 0, "bytes": 0}
+        self._segments.append(self._current)
+        self._save_index()
+
+    def _close_segment(self):
+        # llamar con self._lock tomado
+        if self._current is None:
+            return
+        self._data_f.close()
+        self._idx_f.close()
+        self._data_f = self._idx_f = None
+        if not self._current["frames"]:
+            self._segments.remove(self._current)
+            self._remove_files(self._current["name"])
+        self._current = None
+        self._save_index()
+        self._enforce_retention()
+
+    def _remove_files(self, name):
+        for fname in (name, name[:-5] + ".idx"):
+            try:
+                os.remove(os.path.join(self.directory, fname))
+            except FileNotFoundError:
+                pass
+
+    def _enforce_retention(self):
+        while self.max_bytes and self._total > self.max_bytes and self._segments:
+            oldest = self._segments[0]
+            if oldest is self._current:
+                break
+            self._segments.pop(0)
+            self._remove_files(oldest["name"])
+            self._total -= oldest["bytes"]
+            self.deleted += 1
+
+    def _append(self, ts_ms, jpeg):
+        with self._lock:
+            if self._current is not None and ts_ms - self._current["start"] >= self.segment_s * 1000:
+                self._close_segment()
+            if self._current is None:
+                self._open_segment(ts_ms)
+            seg = self._current
+            self._data_f.write(jpeg)
+            self._idx_f.write(_IDX.pack(ts_ms, seg["bytes"], len(jpeg)))
+            seg["bytes"] += len(jpeg)
+            seg["frames"] += 1
+            seg["end"] = ts_ms
+            self._total += len(jpeg)
+
+    def _loop(self):
+        interval = 1.0 / self.fps if self.fps else 0.0
+        seq, next_due, last_flush = 0, 0.0, time.monotonic()
+        while self._active:
+            seq, frame = self.streamer.wait_frame(seq, timeout=1.0)
+            if frame is None:
+                if not self.streamer.enabled:
+                    time.sleep(0.5)
+                continue
+            now = time.monotonic()
+            if now < next_due:
+                continue
+            next_due = now + interval
+            _, ts, jpeg = self.streamer.encode_variant(q=self.quality)
+            if jpeg is None:
+                continue
+            try:
+                self._append(int(ts * 1000), jpeg)
+            except OSError as e:
+                _log.error("Error escribiendo segmento: %s", e)
+                time.sleep(1.0)
+                continue
+            # los datos quedan en el buffer del archivo; vaciar ~1 vez por segundo
+            if now - last_flush >= 1.0:
+                last_flush = now
+                with self._lock:
+                    if self._current is not None:
+                        self._data_f.flush()
+                        self._idx_f.flush()
+
+    # ---------------- lectura ----------------
+    def segments(self, since_ms=None, until_ms=None):
+        """Segmentos que se solapan con [since_ms, until_ms]."""
+        with self._lock:
+            segs = [dict(s) for s in self._segments]
+        if until_ms is not None:
+            segs = [s for s in segs if s["start"] <= until_ms]
+        if since_ms is not None:
+            segs = [s for s in segs if s["end"] >= since_ms]
+        for s in segs:
+            s["recording"] = self._current is not None and s["name"] == self._current["name"]
+        return segs
+
+    def segment_path(self, name):
+        with self._lock:
+            known = any(s["name"] == name for s in self._segments)
+        return os.path.join(self.directory, name) if known else None
+
+    def frame_at(self, ts_ms):
+        """(ts_ms, jpeg) del último frame grabado en o antes de `ts_ms`, o (None, None)."""
+        with self._lock:
+            starts = [s["start"] for s in self._segments]
+            i = bisect.bisect_right(starts, ts_ms) - 1
+            if i < 0:
+                return None, None
+            seg = self._segments[i]
+            if seg is self._current:
+                self._data_f.flush()
+                self._idx_f.flush()
+            base = os.path.join(self.directory, seg["name"][:-5])
+            # abrir con el lock tomado: la retención no puede borrar el segmento en
+            # medio y, ya abiertos, el borrado no afecta a la lectura (POSIX)
+            try:
+                idx_f = open(base + ".idx", "rb")
+            except OSError:
+                return None, None
+            try:
+                data_f = open(base + ".mjpg", "rb")
+            except OSError:
+                idx_f.close()
+                return None, None
+        try:
+            with idx_f:
+                raw = idx_f.read()
+            count = len(raw) // _IDX.size
+            if not count:
+                return None, None
+            stamps = [_IDX.unpack_from(raw, k * _IDX.size)[0] for k in range(count)]
+            k = max(0, bisect.bisect_right(stamps, ts_ms) - 1)
+            frame_ts, offset, length = _IDX.unpack_from(raw, k * _IDX.size)
+            data_f.seek(offset)
+            jpeg = data_f.read(length)
+        except OSError as e:
+            _log.warning("No se pudo leer el segmento %s: %s", base, e)
+            return None, None
+        finally:
+            data_f.close()
+        if len(jpeg) != length:
+            return None, None
+        return frame_ts, jpeg
+
+    def stats(self):
+        with self._lock:
+            return {"active": self._active, "segments": len(self._segments),
+                    "bytes": self._total, "max_bytes": self.max_bytes,
+                    "segment_s": self.segment_s, "fps": self.fps, "deleted": self.deleted,
+                    "current": dict(self._current) if self._current else None}
@@ -149,6 +149,9 @@ class SensorManager:
     def stop(self):
         self.enabled = False
 
+    def set_soil_type(self, s: str):
+        self.soil_type = s or "not found"
+
     def get_payload(self):
         return {
             "soil_type": self.soil_type,  # Ya no hace nada
@@ -4,6 +4,7 @@ from torchvision import transforms
 from soil_classifier.model import get_model
 from soil_classifier.dataset import load_data
 from PIL import Image
+from pachacutin_camera.sources import CAMERA_SOURCE, is_bus, open_capture
 
 # Configuración
 MODEL_PATH = "soil_classifier/soil_model.pth"
@@ -25,15 +26,31 @@ model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
 model = model.to(device)
 model.eval()
 
-def classify_soil():
-    """Captura un solo frame de la cámara USB (/dev/video2) y devuelve el tipo de suelo detectado."""
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("❌ No se pudo abrir la cámara en índice 2 (/dev/video2)")
-        return None
+# Con PACHACUTIN_CAMERA_SOURCE=bus se lee del daemon de cámara: el lector se
+# adjunta una sola vez y no se vuelve a abrir el dispositivo en cada llamada.
+_bus = None
+
+def _read_frame():
+    global _bus
+    if is_bus(CAMERA_SOURCE):
+        if _bus is None or not _bus.isOpened():
+            _bus = open_capture(CAMERA_SOURCE)
+        if not _bus.isOpened():
+            print("❌ No hay daemon de cámara publicando en el bus")
+            return False, None
+        return _bus.read()
 
+    cap = open_capture(CAMERA_SOURCE)
+    if not cap.isOpened():
+        print(f"❌ No se pudo abrir la cámara {CAMERA_SOURCE}")
+        return False, None
     ret, frame = cap.read()
     cap.release()
+    return ret, frame
+
+def classify_soil():
+    """Captura un solo frame de la cámara USB y devuelve el tipo de suelo detectado."""
+    ret, frame = _read_frame()
 
     if not ret:
         print("⚠️ No se pudo leer frame de la cámara")
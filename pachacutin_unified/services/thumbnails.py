@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Miniaturas y vistas previas de capturas.
+
+Cada tamaño con nombre (p.ej. thumb=160, preview=640 px de lado mayor) se
+guarda en una carpeta hermana del original: static/captures/<size>/<name>.
+Se generan en segundo plano cuando el CaptureWriter termina de escribir la
+captura; si alguien las pide antes (o son capturas viejas), se generan en
+la misma petición y quedan en disco para la próxima.
+"""
+import logging
+import os
+import queue
+import threading
+
+import cv2
+
+from pachacutin_camera.codec import default_codec
+
+_log = logging.getLogger(__name__)
+
+
+def parse_sizes(spec):
+    """"thumb:160,preview:640" -> {"thumb": 160, "preview": 640}"""
+    sizes = {}
+    for part in spec.split(","):
+        if ":" not in part:
+            continue
+        label, px = part.split(":", 1)
+        try:
+            sizes[label.strip()] = int(px)
+        except ValueError:
+            continue
+    return sizes
+
+
+def _jpeg_size(data):
+    """(w, h) leyendo solo la cabecera SOF del JPEG, o None."""
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in (0xC0, 0xC1, 0xC2):
+            h = (data[i + 5] << 8) | data[i + 6]
+            w = (data[i + 7] << 8) | data[i + 8]
+            return w, h
+        i += 2 + length
+    return None
+
+
+def make_derived(data, max_side, quality=75, codec=None):
+    """Bytes JPEG reducidos a `max_side` de lado mayor (o None si no se pudo decodificar)."""
+    codec = codec or default_codec()
+    size = _jpeg_size(data)
+    scale = max_side / max(size) if size else 1.0
+    # decodificar ya reducido (DCT escalado) cuando la miniatura es mucho menor
+    img = codec.decode(data, scale=scale)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    if max(w, h) > max_side:
+        f = max_side / max(w, h)
+        img = cv2.resize(img, (max(1, int(w * f)), max(1, int(h * f))), interpolation=cv2.INTER_AREA)
+    return codec.encode(img, quality)
+
+
+class Thumbnailer:
+    def __init__(self, directory, sizes, quality=75, max_pending=64, codec=None):
+        self.directory = directory
+        self.sizes = sizes
+        self.quality = quality
+        self.codec = codec
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.on_demand = 0
+        self.skipped = 0
+
+    def path_for(self, name, size):
+        return os.path.join(self.directory, size, name)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="thumbnailer", daemon=True)
+                self._thread.start()
+
+    def on_written(self, name, path, data):
+        """Callback para CaptureWriter: encola la derivación de todos los tamaños."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((name, data))
+        except queue.Full:
+            # se generarán a pedido cuando alguien las solicite
+            self.skipped += 1
+
+    def _worker(self):
+        while True:
+            name, data = self._queue.get()
+            for size in self.sizes:
+                try:
+                    self._derive(name, size, data)
+                except Exception as e:
+                    _log.warning("No se pudo generar %s/%s: %s", size, name, e)
+
+    def _derive(self, name, size, data):
+        path = self.path_for(name, size)
+        if os.path.exists(path):
+            return path
+        out = make_derived(data, self.sizes[size], self.quality, self.codec)
+        if out is None:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.part"   # el worker y una petición pueden coincidir
+        with open(tmp, "wb") as f:
+            f.write(out)
+        os.replace(tmp, path)
+        self.generated += 1
+        return path
+
+    def get(self, name, size, source=None):
+        """
+        Ruta del derivado `size` de `name`, generándolo si falta. `source` son
+        los bytes del original si ya están en memoria; si no, se lee de disco.
+        Retorna None si el original no existe.
+        """
+        path = self.path_for(name, size)
+        if os.path.exists(path):
+            return path
+        if source is None:
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    source = f.read()
+            except OSError:
+                return None
+        self.on_demand += 1
+        return self._derive(name, size, source)
+
+    def remove(self, name):
+        """Borra los derivados de `name` (p.ej. cuando la retención elimina el original)."""
+        for size in self.sizes:
+            try:
+                os.remove(self.path_for(name, size))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                _log.warning("No se pudo borrar %s/%s: %s", size, name, e)
+
+    def stats(self):
+        return {"sizes": self.sizes, "queued": self._queue.qsize(), "generated": self.generated,
+                "on_demand": self.on_demand, "skipped": self.skipped}
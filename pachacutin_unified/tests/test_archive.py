@@ -0,0 +1,84 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from pachacutin_unified.services import archive
+
+MTIME = 1700000000.0
+
+
+@pytest.fixture
+def entries(tmp_path):
+    big = tmp_path / "capture_2.jpg"
+    big.write_bytes(os.urandom(3 * archive.CHUNK + 17))   # varios bloques
+    return [
+        ("capture_1.jpg", MTIME, b"\xff\xd8en memoria\xff\xd9"),
+        ("capture_2.jpg", MTIME + 60, str(big)),
+        ("capture_3.jpg", MTIME + 120, str(tmp_path / "borrada.jpg")),   # ya no existe
+    ]
+
+
+def _expected(entries):
+    out = {}
+    for name, _, source in entries:
+        if isinstance(source, bytes):
+            out[name] = source
+        elif os.path.exists(source):
+            with open(source, "rb") as f:
+                out[name] = f.read()
+    return out
+
+
+def test_zip_contains_stored_entries(entries):
+    data = b"".join(archive.stream_zip(entries))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert {n: zf.read(n) for n in zf.namelist()} == _expected(entries)
+        assert all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+
+
+def test_tar_contains_entries_with_mtime(entries):
+    data = b"".join(archive.stream_tar(entries))
+    assert len(data) % tarfile.RECORDSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(data)) as tf:
+        members = tf.getmembers()
+        assert [m.name for m in members] == ["capture_1.jpg", "capture_2.jpg"]
+        assert [m.mtime for m in members] == [int(MTIME), int(MTIME + 60)]
+        assert {m.name: tf.extractfile(m).read() for m in members} == _expected(entries)
+
+
+@pytest.mark.parametrize("build", [archive.stream_zip, archive.stream_tar])
+def test_empty_export_is_a_valid_archive(build):
+    data = b"".join(build([]))
+    if build is archive.stream_zip:
+        assert zipfile.ZipFile(io.BytesIO(data)).namelist() == []
+    else:
+        assert tarfile.open(fileobj=io.BytesIO(data)).getmembers() == []
+
+
+@pytest.mark.parametrize("build", [archive.stream_zip, archive.stream_tar])
+def test_streams_before_reading_all_entries(build, entries):
+    consumed = []
+
+    def lazy():
+        for entry in entries:
+            consumed.append(entry[0])
+            yield entry
+
+    gen = build(lazy())
+    first = b""
+    while not first:
+        first = next(gen)
+    # los primeros bytes salen con la primera entrada, sin armar el archivo completo
+    assert consumed == ["capture_1.jpg"]
+    assert max(len(block) for block in gen) <= archive.CHUNK + 1024
+
+
+def test_shrunk_file_keeps_declared_size(tmp_path):
+    path = tmp_path / "capture_9.jpg"
+    path.write_bytes(b"x" * 100)
+    chunks = archive._chunks(str(path), 120)
+    assert b"".join(chunks) == b"x" * 100 + b"\0" * 20
@@ -0,0 +1,93 @@
+import os
+import threading
+
+from pachacutin_unified.services.capture_store import CaptureStore
+
+
+def _store(tmp_path, **kwargs):
+    directory = tmp_path / "captures"
+    directory.mkdir(exist_ok=True)
+    return CaptureStore(str(tmp_path / "captures.db"), str(directory), **kwargs)
+
+
+def _write(store, name, data):
+    with open(os.path.join(store.directory, name), "wb") as f:
+        f.write(data)
+
+
+def test_add_deduplicates_by_content(tmp_path):
+    store = _store(tmp_path)
+    first, new = store.add("capture_1000.jpg", b"\xff\xd8uno", 1000)
+    assert new
+    again, new = store.add("capture_2000.jpg", b"\xff\xd8uno", 2000)
+    assert not new and again["name"] == "capture_1000.jpg"
+    assert store.stats()["count"] == 1 and store.stats()["deduplicated"] == 1
+
+
+def test_concurrent_adds_keep_one_row_per_content(tmp_path):
+    store = _store(tmp_path)
+    results, errors = [], []
+
+    def add(i):
+        try:
+            results.append(store.add(f"capture_{1000 + i}.jpg", b"\xff\xd8igual", 1000 + i)[1])
+        except Exception as e:  # noqa: BLE001 - el test solo junta lo que falló
+            errors.append(e)
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert results.count(True) == 1
+    assert store.stats()["count"] == 1 and store.stats()["bytes"] == len(b"\xff\xd8igual")
+
+
+def test_same_name_replaces_size(tmp_path):
+    store = _store(tmp_path)
+    store.add("capture_1000.jpg", b"a" * 10, 1000)
+    store.add("capture_1000.jpg", b"b" * 4, 1000)
+    assert store.stats()["count"] == 1 and store.stats()["bytes"] == 4
+
+
+def test_add_during_import(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    for i in range(10):
+        _write(store, f"capture_{1000 + i}.jpg", b"\xff\xd8viejo%d" % i)
+    read = store._read_for_import
+    added = []
+
+    def read_and_capture(name):
+        # una captura llega entre dos lotes de la importación (sin el lock tomado)
+        if name == "capture_1004.jpg":
+            added.append(store.add("capture_5000.jpg", b"\xff\xd8nuevo", 5000))
+        return read(name)
+
+    monkeypatch.setattr(store, "_read_for_import", read_and_capture)
+    assert store.import_existing(batch_size=4) == 10
+    assert added and added[0][1]
+    assert not store._db.in_transaction
+    assert store.stats()["count"] == 11
+
+
+def test_import_removes_duplicate_files(tmp_path):
+    evicted = []
+    store = _store(tmp_path, on_evict=evicted.append)
+    _write(store, "capture_1000.jpg", b"\xff\xd8mismo")
+    _write(store, "capture_2000.jpg", b"\xff\xd8mismo")
+    _write(store, "capture_3000.jpg", b"\xff\xd8otro")
+    assert store.import_existing() == 2
+    assert sorted(os.listdir(store.directory)) == ["capture_1000.jpg", "capture_3000.jpg"]
+    assert evicted == ["capture_2000.jpg"]
+    stats = store.stats()
+    assert (stats["count"], stats["deduplicated"]) == (2, 1)
+
+
+def test_retention_by_size_evicts_oldest(tmp_path):
+    store = _store(tmp_path, max_bytes=25)
+    for i in range(5):
+        _write(store, f"capture_{1000 + i}.jpg", b"%d" % i * 10)
+        store.add(f"capture_{1000 + i}.jpg", b"%d" % i * 10, 1000 + i)
+    assert [e["name"] for e in store.list()[0]] == ["capture_1004.jpg", "capture_1003.jpg"]
+    assert sorted(os.listdir(store.directory)) == ["capture_1003.jpg", "capture_1004.jpg"]
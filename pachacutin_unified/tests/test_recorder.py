@@ -0,0 +1,67 @@
+import os
+
+from pachacutin_unified.services.recorder import SegmentRecorder
+
+
+def _recorder(tmp_path, **kwargs):
+    return SegmentRecorder(None, str(tmp_path / "recordings"), segment_s=1, **kwargs)
+
+
+def _jpeg(i):
+    return b"\xff\xd8frame%03d\xff\xd9" % i
+
+
+def _record(rec, stamps):
+    for i, ts_ms in enumerate(stamps):
+        rec._append(ts_ms, _jpeg(i))
+
+
+def test_frame_at_finds_last_frame_at_or_before(tmp_path):
+    rec = _recorder(tmp_path)
+    # tres segmentos de 1 s: [1000, 1500], [2000, 2500], [3000]
+    _record(rec, [1000, 1500, 2000, 2500, 3000])
+    assert [s["start"] for s in rec.segments()] == [1000, 2000, 3000]
+    assert rec.frame_at(999) == (None, None)
+    assert rec.frame_at(1000) == (1000, _jpeg(0))
+    assert rec.frame_at(1999) == (1500, _jpeg(1))
+    assert rec.frame_at(2600) == (2500, _jpeg(3))
+    # el segmento en curso también se lee (se vacía el buffer antes)
+    assert rec.frame_at(9999) == (3000, _jpeg(4))
+
+
+def test_segments_filter_by_range(tmp_path):
+    rec = _recorder(tmp_path)
+    _record(rec, [1000, 1500, 2000, 2500, 3000])
+    assert [s["start"] for s in rec.segments(since_ms=1600, until_ms=2100)] == [2000]
+    assert [s["recording"] for s in rec.segments()] == [False, False, True]
+
+
+def test_retention_drops_oldest_segments(tmp_path):
+    size = len(_jpeg(0))
+    rec = _recorder(tmp_path, max_bytes=3 * size)
+    _record(rec, [1000, 1500, 2000, 2500, 3000, 3500])
+    assert [s["start"] for s in rec.segments()] == [2000, 3000]
+    assert rec.stats()["deleted"] == 1
+    assert not os.path.exists(os.path.join(rec.directory, "seg_1000.mjpg"))
+    # lo borrado ya no se encuentra; lo que queda sí
+    assert rec.frame_at(1500) == (None, None)
+    assert rec.frame_at(2000) == (2000, _jpeg(2))
+
+
+def test_frame_at_with_deleted_files_returns_none(tmp_path):
+    rec = _recorder(tmp_path)
+    _record(rec, [1000, 1500, 2000])
+    # archivos borrados por fuera del índice (p.ej. retención o limpieza manual)
+    os.remove(os.path.join(rec.directory, "seg_1000.mjpg"))
+    assert rec.frame_at(1200) == (None, None)
+    os.remove(os.path.join(rec.directory, "seg_1000.idx"))
+    assert rec.frame_at(1200) == (None, None)
+
+
+def test_index_survives_restart(tmp_path):
+    rec = _recorder(tmp_path)
+    _record(rec, [1000, 1500, 2000])
+    rec.stop()
+    again = _recorder(tmp_path)
+    assert [(s["start"], s["frames"]) for s in again.segments()] == [(1000, 2), (2000, 1)]
+    assert again.frame_at(1700) == (1500, _jpeg(1))
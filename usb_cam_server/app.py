@@ -1,4 +1,5 @@
 import os
+import sys
 from flask import Flask
 try:
     from flask_cors import CORS
@@ -6,6 +7,11 @@ try:
 except Exception:
     CORS_AVAILABLE = False
 
+# paquetes compartidos del repo (pachacutin_camera) viven un nivel arriba
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
 
 def create_app():
     # fija la carpeta /static explícitamente (evita 404)
@@ -0,0 +1,98 @@
+# Modo asíncrono (ASGI) para el streaming: cada visor de /video es una
+# corrutina en lugar de un hilo del servidor Flask. El resto de rutas
+# (/capture, /captures, /live, ...) se sirven con la app Flask de siempre.
+#
+# Uso (desde usb_cam_server/):
+#   python asgi.py
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000   (sin acotar el buffer de envío)
+from urllib.parse import parse_qs
+
+import config
+from app import create_app
+from blueprints.video import cameras
+from pachacutin_camera.streaming import StreamClient
+from pachacutin_camera.async_hub import AsyncFrameHub, serve, stream_mjpeg
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except Exception:
+    WsgiToAsgi = None
+
+def _make_hub(streamer):
+    return AsyncFrameHub(
+        wait_new=lambda last_seq, timeout: streamer.wait_latest(last_seq, timeout)[0],
+        encode=streamer.get_variant,
+    )
+
+# /video y /video/<id>: un hub (hilo pump) por cámara
+hubs = {cam_id: _make_hub(cam) for cam_id, cam in cameras.items()}
+flask_app = create_app()
+_wsgi = WsgiToAsgi(flask_app) if WsgiToAsgi is not None else None
+
+
+def _stream_camera(path):
+    """(streamer, hub) si `path` es /video o /video/<id> de una cámara conocida."""
+    if path == "/video":
+        cam_id = cameras.default_id
+    elif path.startswith("/video/"):
+        cam_id = path[len("/video/"):]
+    else:
+        return None, None
+    return cameras.get(cam_id), hubs.get(cam_id)
+
+
+def _int_arg(args, name):
+    try:
+        v = int(args.get(name, [""])[0])
+    except ValueError:
+        return None
+    return v if v > 0 else None
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    streamer, hub = _stream_camera(scope["path"]) if scope["type"] == "http" else (None, None)
+    if streamer is not None:
+        args = parse_qs(scope.get("query_string", b"").decode())
+        w, h, q, fps = (_int_arg(args, k) for k in ("w", "h", "q", "fps"))
+        max_latency_ms = _int_arg(args, "max_latency_ms")
+        client = StreamClient(
+            remote=(scope.get("client") or [None])[0],
+            max_latency=(max_latency_ms / 1000.0 if max_latency_ms else config.STREAM_MAX_LATENCY_S),
+            variant={"w": w, "h": h, "q": q, "fps": fps, "async": True},
+        )
+        streamer.add_client(client)
+        active = streamer.acquire()
+        try:
+            await stream_mjpeg(hub, send, receive, client, variant=(w, h, q), fps=fps,
+                               timing=streamer.timing)
+        except OSError:
+            pass  # el cliente cerró la conexión
+        finally:
+            if active:
+                streamer.release()
+            streamer.remove_client(client)
+        return
+
+    if _wsgi is not None:
+        await _wsgi(scope, receive, send)
+        return
+
+    await send({"type": "http.response.start", "status": 404,
+                "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"Ruta no disponible en modo ASGI (instala asgiref)"})
+
+
+if __name__ == "__main__":
+    import os
+
+    os.makedirs(config.CAPTURE_DIR, exist_ok=True)
+    serve(app, config.HOST, config.PORT, send_buffer=config.STREAM_SEND_BUFFER, log_level="warning")
@@ -1,28 +1,38 @@
-from flask import Blueprint, jsonify, send_from_directory, url_for, request
+from flask import Blueprint, jsonify, send_from_directory, url_for, request, Response
 import os
-import cv2
 import time
 import config
-from blueprints.video import streamer
+from blueprints.video import get_camera, cameras
+from pachacutin_camera.capture_writer import CaptureWriter
 
 capture_bp = Blueprint("capture", __name__)
 
-@capture_bp.get("/capture")
-def capture_image():
-    # asegurar carpeta
-    os.makedirs(config.CAPTURE_DIR, exist_ok=True)
+writer = CaptureWriter(config.CAPTURE_DIR,
+                       workers=config.CAPTURE_WORKERS,
+                       max_pending=config.CAPTURE_QUEUE_MAX)
 
-    # tomar frame
-    frame = streamer.get_frame()
-    if frame is None:
+@capture_bp.get("/capture")
+@capture_bp.get("/capture/<cam_id>")
+def capture_image(cam_id=None):
+    streamer = get_camera(cam_id)
+    # tomar el JPEG ya codificado del stream si tiene la calidad de captura (o es el de la
+    # cámara en passthrough); si no, codificarlo aparte. Enciende la cámara si estaba en reposo
+    quality = None
+    if not streamer.passthrough and streamer.jpeg_quality < config.CAPTURE_QUALITY:
+        quality = config.CAPTURE_QUALITY
+    with streamer.consumer():
+        _, _, jpeg = streamer.get_fresh_variant(q=quality)
+    if jpeg is None:
         return jsonify({"ok": False, "error": "No hay frame disponible"}), 500
 
-    # guardar archivo
+    # guardar archivo en segundo plano; mientras tanto /captures lo sirve desde memoria
     ts_ms = int(time.time() * 1000)
-    filename = f"capture_{ts_ms}.jpg"
-    filepath = os.path.join(config.CAPTURE_DIR, filename)
-    if not cv2.imwrite(filepath, frame):
-        return jsonify({"ok": False, "error": "No se pudo guardar la imagen"}), 500
+    # las cámaras que no son la principal llevan su id en el nombre
+    if cam_id and cam_id != cameras.default_id:
+        filename = f"capture_{cam_id}_{ts_ms}.jpg"
+    else:
+        filename = f"capture_{ts_ms}.jpg"
+    writer.submit(filename, jpeg)
 
     # servir SIEMPRE por nuestra propia ruta (/captures/...) —evita problemas con /static
     rel_url = url_for("capture.get_capture", name=filename)                 # /captures/...
@@ -38,10 +48,18 @@ def capture_image():
         "full_url": abs_url,
         "url_nocache": f"{rel_url}?nocache={bust}",
         "full_url_nocache": f"{abs_url}?nocache={bust}",
-        "ts": ts_ms
+        "ts": ts_ms,
+        "camera": cam_id or cameras.default_id
     })
 
 @capture_bp.get("/captures/<path:name>")
 def get_capture(name):
+    pending = writer.get_pending(name)
+    if pending is not None:
+        return Response(pending, mimetype="image/jpeg")
     directory = os.path.abspath(config.CAPTURE_DIR)
     return send_from_directory(directory, name, mimetype="image/jpeg")
+
+@capture_bp.get("/capture_stats")
+def capture_stats():
+    return jsonify(writer.stats())
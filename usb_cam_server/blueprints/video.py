@@ -1,37 +1,189 @@
-from flask import Blueprint, Response, render_template
-import time
+from flask import Blueprint, Response, render_template, request, jsonify, abort
+import os
+import threading
 import config
 from camera.streamer import CameraStreamer
+from pachacutin_camera.streaming import CONTENT_TYPE, StreamClient, iter_mjpeg, limit_send_buffer
+from pachacutin_camera.motion import MotionGate
+from camera.registry import CameraRegistry
+from pachacutin_camera.codec import make_codec
 
 video_bp = Blueprint("video", __name__)
 
-# Inicializar la cámara USB
-streamer = CameraStreamer(
-    index=config.CAMERA_INDEX,
-    width=config.WIDTH,
-    height=config.HEIGHT,
-    fps=config.FPS,
-    jpeg_quality=config.JPEG_QUALITY
-)
-streamer.start()
-
-def mjpeg_generator():
-    boundary = b"--frame"
-    while True:
-        jpeg = streamer.get_jpeg()
-        if jpeg is None:
-            time.sleep(0.1)
-            continue
-        yield (
-            boundary + b"\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+# backend JPEG compartido por todas las cámaras (ver JPEG_CODEC en config.py)
+codec = make_codec(config.JPEG_CODEC, config.JPEG_SUBSAMPLING, config.JPEG_FAST_DCT)
+
+def _build_streamer(cam_id, overrides):
+    # ajustes globales de config.py + los propios de la cámara en config.CAMERAS
+    opt = lambda key, default: overrides.get(key, default)
+    probe_cache = config.CAMERA_PROBE_CACHE
+    if cam_id != next(iter(config.CAMERAS)):
+        root, ext = os.path.splitext(probe_cache)
+        probe_cache = f"{root}_{cam_id}{ext}"
+    return CameraStreamer(
+        index=opt("index", config.CAMERA_INDEX),
+        width=opt("width", config.WIDTH),
+        height=opt("height", config.HEIGHT),
+        fps=opt("fps", config.FPS),
+        jpeg_quality=opt("jpeg_quality", config.JPEG_QUALITY),
+        passthrough=opt("passthrough", config.PASSTHROUGH),
+        max_variants=config.STREAM_MAX_VARIANTS,
+        motion_gate=(MotionGate(
+            threshold=config.MOTION_THRESHOLD,
+            idle_after_s=config.MOTION_IDLE_AFTER_S,
+            keepalive_s=config.MOTION_KEEPALIVE_S,
+        ) if opt("motion_gate", config.MOTION_GATE) else None),
+        linger_s=(config.CAMERA_LINGER_S if config.DEMAND_DRIVEN else None),
+        standby_s=config.CAMERA_STANDBY_S,
+        probe=opt("probe", config.CAMERA_PROBE),
+        probe_cache=probe_cache,
+        codec=codec,
+    )
+
+# Inicializar las cámaras USB (cada una con su hilo lector)
+cameras = CameraRegistry()
+for _cam_id, _overrides in config.CAMERAS.items():
+    cameras.add(_cam_id, _build_streamer(_cam_id, _overrides))
+# la primera cámara: la de las rutas sin id
+streamer = cameras.get()
+if not config.DEMAND_DRIVEN:
+    for _cam_id, _cam in cameras.items():
+        try:
+            _cam.start()
+        except RuntimeError as e:
+            print(f"[ERROR] Cámara {_cam_id}: {e}")
+else:
+    # medir los modos ya, en segundo plano: así el primer /video no espera al probe
+    for _cam_id, _cam in cameras.items():
+        threading.Thread(target=_cam.warm_probe, daemon=True).start()
+
+def get_camera(cam_id=None):
+    """CameraStreamer de `cam_id` (None = la principal); 404 si no existe."""
+    cam = cameras.get(cam_id)
+    if cam is None:
+        abort(404, description=f"Cámara desconocida: {cam_id}")
+    return cam
+
+def _int_arg(name):
+    try:
+        v = int(request.args.get(name, ""))
+    except ValueError:
+        return None
+    return v if v > 0 else None
+
+def mjpeg_generator(streamer, client, w=None, h=None, q=None, fps=None):
+    streamer.add_client(client)
+    # cada visor mantiene la cámara activa mientras esté conectado
+    active = streamer.acquire()
+    try:
+        yield from iter_mjpeg(
+            client,
+            lambda seq: streamer.wait_latest(seq, timeout=1.0, w=w, h=h, q=q),
+            fps=fps, timing=streamer.timing,
         )
-        time.sleep(0.05)  # controla el envío (~20 fps máx)
+    finally:
+        if active:
+            streamer.release()
+        streamer.remove_client(client)
 
 @video_bp.get("/video")
-def video_stream():
-    return Response(mjpeg_generator(), mimetype="multipart/x-mixed-replace; boundary=frame")
+@video_bp.get("/video/<cam_id>")
+def video_stream(cam_id=None):
+    # /video?w=320&q=50&fps=5 -> variante liviana para celulares con mala señal
+    streamer = get_camera(cam_id)
+    w, h, q, fps = _int_arg("w"), _int_arg("h"), _int_arg("q"), _int_arg("fps")
+    max_latency_ms = _int_arg("max_latency_ms")
+    client = StreamClient(
+        remote=request.remote_addr,
+        max_latency=(max_latency_ms / 1000.0 if max_latency_ms else config.STREAM_MAX_LATENCY_S),
+        variant={"w": w, "h": h, "q": q, "fps": fps},
+    )
+    # poco video en cola: si el visor no recibe, la escritura se bloquea y se descartan frames
+    limit_send_buffer(request.environ.get("werkzeug.socket"), config.STREAM_SEND_BUFFER)
+    gen = mjpeg_generator(streamer, client, w=w, h=h, q=q, fps=fps)
+    return Response(gen, mimetype=CONTENT_TYPE)
+
+@video_bp.get("/frame.jpg")
+@video_bp.get("/frame/<cam_id>.jpg")
+def frame_jpg(cam_id=None):
+    # último frame ya codificado, desde memoria (para clientes que no soportan
+    # multipart, p.ej. MIT App Inventor). ETag = número de secuencia del frame.
+    streamer = get_camera(cam_id)
+    w, h, q = _int_arg("w"), _int_arg("h"), _int_arg("q")
+    after = request.args.get("after", type=int)
+    with streamer.consumer():
+        if after is not None:
+            # long-poll: espera hasta que exista un frame más nuevo que `after`
+            wait_s = max(0.0, min(request.args.get("wait", default=10.0, type=float), 30.0))
+            seq, ts, jpeg = streamer.wait_latest(after, timeout=wait_s, w=w, h=h, q=q)
+            if jpeg is None:
+                return _not_modified(after)
+        else:
+            # si la cámara estaba detenida, espera el primer frame nuevo en vez de uno viejo
+            seq, ts, jpeg = streamer.get_fresh_variant(w, h, q)
+            if jpeg is None:
+                return jsonify({"ok": False, "error": "No hay frame disponible"}), 503
+
+    if request.if_none_match.contains(str(seq)):
+        return _not_modified(seq)
+    resp = Response(jpeg, mimetype="image/jpeg")
+    resp.set_etag(str(seq))
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Frame-Seq"] = str(seq)
+    resp.headers["X-Frame-Timestamp"] = f"{ts:.3f}"
+    return resp
+
+def _not_modified(seq):
+    resp = Response(status=304)
+    resp.set_etag(str(seq))
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Frame-Seq"] = str(seq)
+    return resp
+
+@video_bp.get("/stream_stats")
+@video_bp.get("/stream_stats/<cam_id>")
+def stream_stats(cam_id=None):
+    # frames entregados vs descartados por conexión
+    streamer = get_camera(cam_id)
+    # + percentiles/histograma por etapa (?reset=1 vacía las muestras)
+    clients = streamer.clients_stats()
+    stages = streamer.timing.snapshot()
+    if request.args.get("reset") == "1":
+        streamer.timing.reset()
+    return jsonify({"clients": clients, "count": len(clients), "camera": streamer.status(),
+                    "stages": stages})
+
+@video_bp.get("/motion")
+@video_bp.get("/motion/<cam_id>")
+def motion_status(cam_id=None):
+    # umbrales y estado actual del detector de movimiento
+    streamer = get_camera(cam_id)
+    if streamer.motion_gate is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **streamer.motion_gate.as_dict()})
 
 @video_bp.get("/live")
-def live_page():
-    return render_template("live.html")
+@video_bp.get("/live/<cam_id>")
+def live_page(cam_id=None):
+    # reenvía w/h/q/fps al <img> para que la página use la misma variante
+    get_camera(cam_id)
+    video_url = f"/video/{cam_id}" if cam_id else "/video"
+    return render_template("live.html", query=request.query_string.decode(), video_url=video_url)
+
+@video_bp.get("/camera_mode")
+@video_bp.get("/camera_mode/<cam_id>")
+def camera_mode(cam_id=None):
+    # modo activo de la cámara y mediciones del probe (?reprobe=1 re-mide y reabre con el modo elegido)
+    streamer = get_camera(cam_id)
+    if request.args.get("reprobe") == "1":
+        try:
+            if not streamer.reprobe():
+                return jsonify({"ok": False, "error": "reprobe no disponible (no es un dispositivo o no terminó)"}), 409
+        except RuntimeError as e:
+            return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, "mode": streamer.mode, "probe": streamer.probe_result})
+
+@video_bp.get("/cameras")
+def cameras_status():
+    # todas las cámaras: estado, consumidores, clientes, fps medidos y % CPU del hilo lector
+    return jsonify({"default": cameras.default_id, "cameras": cameras.status()})
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+import cv2
+
+# candidatos si no hay v4l2-ctl para preguntar al dispositivo
+COMMON_SIZES = [(320, 240), (640, 480), (800, 600), (1280, 720), (1920, 1080)]
+FORMATS = ("MJPG", "YUYV")
+
+
+def _fourcc_str(value):
+    v = int(value)
+    return "".join(chr((v >> (8 * i)) & 0xFF) for i in range(4)).strip("\0")
+
+
+def parse_v4l2_formats(text):
+    """Salida de `v4l2-ctl --list-formats-ext` -> [(fourcc, w, h, [fps...])]"""
+    modes, fmt, size = [], None, None
+    for line in text.splitlines():
+        m = re.search(r"'(\w{4})'", line)
+        if m and ("Pixel Format" in line or re.match(r"\s*\[\d+\]", line)):
+            fmt, size = m.group(1), None
+            continue
+        m = re.search(r"Size: Discrete (\d+)x(\d+)", line)
+        if m and fmt:
+            size = (int(m.group(1)), int(m.group(2)))
+            modes.append((fmt, size[0], size[1], []))
+            continue
+        m = re.search(r"\(([\d.]+) fps\)", line)
+        if m and size and modes:
+            modes[-1][3].append(float(m.group(1)))
+    return modes
+
+
+def list_modes(index):
+    """
+    Modos que anuncia el dispositivo: [(fourcc, w, h, [fps...])].
+    Con v4l2-ctl la lista es la real; si no está (o el índice no es /dev/videoN)
+    se arma con tamaños comunes y fps desconocidos (lista vacía).
+    """
+    if isinstance(index, int) and shutil.which("v4l2-ctl"):
+        try:
+            out = subprocess.run(["v4l2-ctl", "-d", f"/dev/video{index}", "--list-formats-ext"],
+                                 capture_output=True, text=True, timeout=5).stdout
+            modes = parse_v4l2_formats(out)
+            if modes:
+                return modes
+        except (OSError, subprocess.SubprocessError):
+            pass
+    return [(fmt, w, h, []) for fmt in FORMATS for (w, h) in COMMON_SIZES]
+
+
+def candidates(modes, width, height, fps, limit=6):
+    """
+    Modos a medir: solo los que cubren el tamaño pedido, primero el tamaño
+    exacto (sin resize) y luego los más chicos; para cada uno el menor fps
+    anunciado que alcanza el objetivo.
+    """
+    out = []
+    for fmt, w, h, rates in modes:
+        if fmt not in FORMATS or w < width or h < height:
+            continue
+        ok_rates = sorted(r for r in rates if r >= fps)
+        rate = ok_rates[0] if ok_rates else (max(rates) if rates else fps)
+        out.append((fmt, w, h, rate))
+    out.sort(key=lambda m: ((m[1], m[2]) != (width, height), m[1] * m[2], FORMATS.index(m[0])))
+    return out[:limit]
+
+
+def measure_mode(cap, fourcc, w, h, fps, target_size, frames=10, warmup=3):
+    """Configura el modo, lo lee de vuelta y mide fps reales y costo de CPU por frame."""
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    result = {
+        "fourcc": fourcc, "width": w, "height": h, "fps": fps,
+        "actual_fourcc": _fourcc_str(cap.get(cv2.CAP_PROP_FOURCC)),
+        "actual_width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "actual_height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "ok": False,
+    }
+    for _ in range(warmup):
+        cap.read()
+    read_cpu = resize_cpu = 0.0
+    got = 0
+    t0 = time.monotonic()
+    for _ in range(frames):
+        c0 = time.thread_time()
+        ok, frame = cap.read()
+        c1 = time.thread_time()
+        if not ok or frame is None:
+            continue
+        got += 1
+        read_cpu += c1 - c0
+        if (frame.shape[1], frame.shape[0]) != target_size:
+            cv2.resize(frame, target_size)
+            resize_cpu += time.thread_time() - c1
+        result["actual_width"], result["actual_height"] = frame.shape[1], frame.shape[0]
+    elapsed = time.monotonic() - t0
+    if got:
+        result.update(
+            ok=True,
+            fps_measured=round(got / elapsed, 1) if elapsed > 0 else None,
+            decode_ms=round(read_cpu / got * 1000, 2),
+            resize_ms=round(resize_cpu / got * 1000, 2),
+            cost_ms=round((read_cpu + resize_cpu) / got * 1000, 2),
+        )
+    return result
+
+
+def choose(results, width, height, fps):
+    """El modo más barato (CPU por frame) que alcanza ~el fps y tamaño pedidos; si ninguno, el más rápido."""
+    usable = [r for r in results if r["ok"]
+              and r["actual_width"] >= width and r["actual_height"] >= height]
+    meets = [r for r in usable if (r["fps_measured"] or 0) >= 0.9 * fps]
+    if meets:
+        return min(meets, key=lambda r: r["cost_ms"])
+    if usable:
+        return max(usable, key=lambda r: (r["fps_measured"] or 0, -r["cost_ms"]))
+    return None
+
+
+def probe_camera(cap, index, width, height, fps, limit=6, frames=10):
+    t0 = time.monotonic()
+    modes = list_modes(index)
+    results = [measure_mode(cap, fmt, w, h, rate, (width, height), frames=frames)
+               for fmt, w, h, rate in candidates(modes, width, height, fps, limit)]
+    return {
+        "index": index,
+        "target": {"width": width, "height": height, "fps": fps},
+        "modes": [{"fourcc": f, "width": w, "height": h, "fps": r} for f, w, h, r in modes],
+        "measurements": results,
+        "chosen": choose(results, width, height, fps),
+        "probed_at": round(time.time(), 3),
+        "elapsed_s": round(time.monotonic() - t0, 2),
+    }
+
+
+def load_cached(path, index, width, height, fps):
+    """Resultado guardado de un probe anterior para el mismo dispositivo y objetivo (o None)."""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("index") != index or data.get("target") != {"width": width, "height": height, "fps": fps}:
+        return None
+    return data
+
+
+def save_cached(path, result):
+    try:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+    except OSError as e:
+        print(f"[WARN] No se pudo guardar el probe de la cámara: {e}")
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+
+class CameraRegistry:
+    """
+    Cámaras activas del servidor por id (p.ej. "main" = suelo, "drill" = cabezal).
+    Cada una es un CameraStreamer independiente, con su propio hilo lector,
+    variantes, clientes y compuerta de movimiento. La primera registrada es
+    la que usan las rutas sin id (/video, /capture, /frame.jpg).
+    """
+
+    def __init__(self):
+        self._cams = OrderedDict()
+
+    def add(self, cam_id, streamer):
+        self._cams[cam_id] = streamer
+
+    def get(self, cam_id=None):
+        if cam_id is None:
+            return next(iter(self._cams.values()), None)
+        return self._cams.get(cam_id)
+
+    @property
+    def default_id(self):
+        return next(iter(self._cams), None)
+
+    def ids(self):
+        return list(self._cams)
+
+    def items(self):
+        return list(self._cams.items())
+
+    def status(self):
+        return {cam_id: {**s.status(), "index": s.index, "clients": len(s.clients_stats())}
+                for cam_id, s in self._cams.items()}
+
+    def stop_all(self):
+        for s in self._cams.values():
+            s.stop()
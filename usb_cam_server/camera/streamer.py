@@ -1,69 +1,561 @@
 import cv2
+import numpy as np
 import time
 import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import config
+from pachacutin_camera.sources import open_capture, is_device
+from pachacutin_camera.metrics import StageTimer
+from pachacutin_camera.streaming import ClientRegistry, Variant
+from pachacutin_camera.codec import default_codec
+from pachacutin_camera.frame_pool import FramePool
+from camera import probe as camera_probe
 
 class CameraStreamer:
-    def __init__(self, index=0, width=640, height=480, fps=15, jpeg_quality=70):
+    def __init__(self, index=0, width=640, height=480, fps=15, jpeg_quality=70, passthrough=False,
+                 max_variants=8, motion_gate=None, linger_s=None, standby_s=30.0,
+                 probe=False, probe_cache=None, codec=None):
         self.index = index
         self.width = width
         self.height = height
         self.fps = fps
         self.jpeg_quality = jpeg_quality
+        self.passthrough = passthrough
+        # backend JPEG (pachacutin_camera.codec): opencv o turbojpeg
+        self.codec = codec or default_codec()
+        # detector de movimiento opcional: con la escena quieta baja a un keep-alive
+        self.motion_gate = motion_gate
         self._cap = None
         self._running = False
         self._thread = None
         self._frame_lock = threading.Lock()
-        self._last_frame = None
+        self._last_frame = None      # passthrough: último JPEG decodificado (solo lectura)
+        # hub de difusión: el hilo lector codifica cada frame UNA vez,
+        # lo marca con un número de secuencia y despierta a los clientes
+        self._frame_cond = threading.Condition(self._frame_lock)
+        # frames en buffers preasignados: cap.read() y resize escriben directo en el pool
+        # y los lectores reciben vistas de solo lectura que reservan el buffer
+        self._pool = FramePool()
+        self._last_buffer = None
+        self._scratch = None        # destino de cap.read() cuando después hay resize
+        self._native_fits = False   # la cámara ya entrega WIDTHxHEIGHT (se lee directo al pool)
+        self._last_jpeg = None
+        self._last_ts = 0.0
+        self._seq = 0
+        # en modo passthrough los píxeles se decodifican solo cuando alguien los pide
+        self._decoded_seq = 0
+        # variantes (w, h, q) pedidas por los clientes: cada una se codifica
+        # como máximo una vez por frame y se comparte entre todos
+        self.max_variants = max_variants
+        self._variants = OrderedDict()
+        self._variants_lock = threading.Lock()
+        # conexiones activas (para /stream_stats)
+        self._clients = ClientRegistry()
+        # activación por demanda: con linger_s (segundos) la captura solo corre
+        # mientras haya consumidores (acquire/release). Al irse el último, sigue
+        # `linger_s` más, luego pasa a standby (dispositivo abierto, sin leer) y
+        # tras `standby_s` libera la cámara. None = captura continua.
+        self.linger_s = linger_s
+        self.standby_s = standby_s
+        self._users = 0
+        self._idle_since = time.monotonic()
+        self._users_lock = threading.Lock()
+        # abrir/cerrar el dispositivo (puede tardar segundos con el probe) va con su propio lock
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self.state = "off"
+        # negociación de formato: medir los modos del dispositivo y usar el más barato
+        # que cumpla tamaño/fps (el resultado se guarda en `probe_cache`)
+        self.probe = probe
+        self.probe_cache = probe_cache
+        self.probe_result = None
+        self.mode = None
+        self._reprobe_request = None   # Event: el hilo lector debe re-medir con el dispositivo abierto
+        # medición del hilo lector (ventanas de ~1 s): frames publicados/s y % de un núcleo
+        self.measured_fps = 0.0
+        self.cpu_percent = 0.0
+        # tiempos por etapa: read, resize, motion, encode, encode_variant, handoff, send
+        self.timing = StageTimer()
 
     def start(self):
-        if self._running:
-            return
-        print(f"[INFO] Usando índice de cámara: {self.index}")
-        self._cap = cv2.VideoCapture(self.index)
+        with self._start_lock:
+            if self._running:
+                return
+            print(f"[INFO] Usando índice de cámara: {self.index}")
+            self._open()
+            self._running = True
+            self.state = "running"
+            self._thread = threading.Thread(target=self._reader_loop, daemon=True)
+            self._thread.start()
 
-        # 👉 Forzar MJPEG nativo de la cámara (reduce lag si la soporta)
-        self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
-        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-        self._cap.set(cv2.CAP_PROP_FPS, self.fps)
+    def _open(self):
+        # índice de /dev/videoN, "bus" (daemon de cámara) o file:/dir:/synthetic (ver pachacutin_camera.sources)
+        self._cap = open_capture(self.index)
 
         if not self._cap.isOpened():
+            self._cap = None
             raise RuntimeError("❌ No se pudo abrir la cámara")
 
-        self._running = True
-        self._thread = threading.Thread(target=self._reader_loop, daemon=True)
-        self._thread.start()
+        # passthrough necesita MJPG; el bus y las fuentes simuladas no tienen modos
+        chosen = None
+        if self._should_probe():
+            chosen = self._negotiate(self._cap)
+        if chosen:
+            fourcc, w, h, fps = chosen["fourcc"], chosen["width"], chosen["height"], chosen["fps"]
+        else:
+            # 👉 Forzar MJPEG nativo de la cámara (reduce lag si la soporta)
+            fourcc, w, h, fps = "MJPG", self.width, self.height, self.fps
+        self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+        self._cap.set(cv2.CAP_PROP_FPS, fps)
+        if self.passthrough:
+            # entrega los bytes comprimidos del dispositivo en lugar de BGR
+            self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        # lo que el dispositivo aceptó de verdad
+        self.mode = {
+            "fourcc": camera_probe._fourcc_str(self._cap.get(cv2.CAP_PROP_FOURCC)),
+            "width": int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": self._cap.get(cv2.CAP_PROP_FPS),
+            "negotiated": chosen is not None,
+        }
+
+    def _should_probe(self):
+        return self.probe and not self.passthrough and is_device(self.index)
+
+    def _negotiate(self, cap, force=False):
+        """Modo elegido por el probe (desde caché si coincide dispositivo y objetivo)."""
+        if self.probe_result is None and not force and self.probe_cache:
+            self.probe_result = camera_probe.load_cached(self.probe_cache, self.index,
+                                                         self.width, self.height, self.fps)
+        if self.probe_result is None or force:
+            print("[INFO] Midiendo modos de la cámara...")
+            self.probe_result = camera_probe.probe_camera(cap, self.index,
+                                                          self.width, self.height, self.fps)
+            if self.probe_cache:
+                camera_probe.save_cached(self.probe_cache, self.probe_result)
+        chosen = self.probe_result.get("chosen")
+        if chosen:
+            print(f"[INFO] Modo de cámara: {chosen['fourcc']} {chosen['width']}x{chosen['height']}"
+                  f" @ {chosen.get('fps_measured')} fps, {chosen.get('cost_ms')} ms/frame")
+        return chosen
+
+    def _probe_device(self, force=False):
+        """Abre el dispositivo solo para medir (o leer de caché) sus modos y lo libera. Requiere _start_lock."""
+        cap = open_capture(self.index)
+        try:
+            if not cap.isOpened():
+                raise RuntimeError("❌ No se pudo abrir la cámara")
+            self._negotiate(cap, force=force)
+        finally:
+            cap.release()
+
+    def warm_probe(self):
+        """Deja medido el modo antes del primer consumidor (para que no lo pague la primera petición)."""
+        if not self._should_probe():
+            return
+        try:
+            with self._start_lock:
+                if self._cap is None and self.probe_result is None:
+                    self._probe_device()
+        except RuntimeError as e:
+            print(f"[WARN] Probe de la cámara {self.index}: {e}")
+
+    def reprobe(self, timeout=30.0):
+        """Vuelve a medir los modos y reabre con el elegido. Retorna False si no aplica o no terminó a tiempo."""
+        if not is_device(self.index):
+            return False
+        with self._start_lock:
+            if self._cap is None:
+                # apagada o liberada por demanda: el dispositivo está libre
+                self._probe_device(force=True)
+                return True
+            request = self._reprobe_request = threading.Event()
+        # leyendo o en standby: el hilo lector (dueño del dispositivo) lo cierra, mide y reabre
+        self._wake.set()
+        return request.wait(timeout)
+
+    def _reprobe_open(self):
+        """En el hilo lector: atiende un reprobe() pedido con el dispositivo abierto."""
+        request, self._reprobe_request = self._reprobe_request, None
+        try:
+            with self._start_lock:
+                if self._cap is not None:
+                    self._cap.release()
+                    self._cap = None
+                self._probe_device(force=True)
+                self._open()
+        except RuntimeError as e:
+            # sin _cap el lazo vuelve a intentar abrir desde _park()
+            print(f"[ERROR] {e}")
+        finally:
+            request.set()
 
     def stop(self):
         self._running = False
+        self._wake.set()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
         if self._thread:
             self._thread.join(timeout=1.0)
-        if self._cap:
-            self._cap.release()
-        self._thread = None
-        self._cap = None
+        with self._start_lock:
+            if self._cap:
+                self._cap.release()
+            self._thread = None
+            self._cap = None
+            self.state = "off"
+
+    # -------- consumidores (activación por demanda) --------
+    def acquire(self):
+        """Registra un consumidor y arranca/reanuda la captura si hace falta. Retorna False si la cámara no abre."""
+        with self._users_lock:
+            self._users += 1
+            self._wake.set()
+            if self._running:
+                return True
+        # fuera de _users_lock: mientras se abre el dispositivo, release() y el hilo
+        # lector siguen libres; arranques simultáneos se ordenan con _start_lock
+        try:
+            self.start()
+            return True
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            self.release()
+            return False
+
+    def release(self):
+        with self._users_lock:
+            self._users = max(0, self._users - 1)
+            if self._users == 0:
+                self._idle_since = time.monotonic()
+
+    def consumer(self):
+        """Context manager: `with streamer.consumer(): ...` mantiene la cámara activa."""
+        streamer = self
+
+        class _Consumer:
+            def __enter__(self):
+                self.ok = streamer.acquire()
+                return self.ok
+
+            def __exit__(self, *exc):
+                if self.ok:
+                    streamer.release()
+
+        return _Consumer()
+
+    def _has_users(self):
+        with self._users_lock:
+            return self._users > 0
+
+    def _should_park(self):
+        if self.linger_s is None:
+            return False
+        with self._users_lock:
+            return self._users == 0 and time.monotonic() - self._idle_since >= self.linger_s
+
+    def _park(self):
+        """Sin consumidores: deja de leer; tras standby_s libera el dispositivo. Retorna al haber demanda."""
+        self.state = "standby"
+        print("[INFO] Cámara en standby (sin consumidores)")
+        self._wake.clear()
+        # un reprobe() pendiente también despierta: lo atiende el lazo del hilo lector
+        reprobing = lambda: self._reprobe_request is not None
+        woke = self._has_users() or reprobing() or self._wake.wait(self.standby_s)
+        if not woke and self._running:
+            with self._start_lock:
+                if self._cap:
+                    self._cap.release()
+                    self._cap = None
+                self.state = "off"
+            print("[INFO] Cámara liberada")
+            while self._running and not self._has_users() and not reprobing():
+                self._wake.wait(5.0)
+                self._wake.clear()
+        if not self._running or reprobing():
+            return
+        if self._cap is None:
+            try:
+                # con _start_lock: no reabrir mientras reprobe() mide con el dispositivo
+                with self._start_lock:
+                    if self._cap is None:
+                        self._open()
+            except RuntimeError as e:
+                print(f"[ERROR] {e}")
+                time.sleep(1.0)
+                return
+        else:
+            # arranque en caliente: descartar los frames viejos que quedaron en el buffer V4L2
+            for _ in range(4):
+                self._cap.grab()
+        self.state = "running"
+        print("[INFO] Cámara reanudada")
+
+    def _measure(self, window):
+        """Actualiza fps/CPU del hilo lector; `window` = [t0, cpu0, seq0] de la ventana actual."""
+        now = time.monotonic()
+        elapsed = now - window[0]
+        if elapsed < 1.0:
+            return
+        cpu = time.thread_time()
+        self.measured_fps = round((self._seq - window[2]) / elapsed, 1)
+        self.cpu_percent = round((cpu - window[1]) / elapsed * 100, 1)
+        window[:] = [now, cpu, self._seq]
 
     def _reader_loop(self):
         delay = 1.0 / max(self.fps, 1)
-        while self._running and self._cap:
-            ok, frame = self._cap.read()
+        window =  [time.monotonic(), time.thread_time(), self._seq]
+        while self._running:
+            self._measure(window)
+            if self._reprobe_request is not None:
+                self._reprobe_open()
+            if self._should_park() or self._cap is None:
+                self.measured_fps = self.cpu_percent = 0.0
+                self._park()
+                window[:] = [time.monotonic(), time.thread_time(), self._seq]
+                continue
+            t0 = time.monotonic()
+            buf = None
+            if self.passthrough:
+                ok, frame = self._cap.read()
+            else:
+                # leer directo a un buffer del pool (o al de trabajo si después hay resize)
+                if self._pool.shape is not None:
+                    buf = self._pool.acquire(self._pool.shape)
+                dst = buf.array if buf is not None and self._native_fits else self._scratch
+                ok, frame = self._cap.read(dst) if dst is not None else self._cap.read()
+            t_read = time.monotonic()
             if not ok:
+                if buf is not None:
+                    buf.release()
                 time.sleep(0.05)
                 continue
-            with self._frame_lock:
-                self._last_frame = cv2.resize(frame, (self.width, self.height))
-            time.sleep(delay)
+            # hora de captura del frame: viaja con él hasta cada cliente (X-Timestamp)
+            captured = time.time()
+            self.timing.record("read", t_read - t0)
+            if self.passthrough:
+                jpeg = self._as_jpeg(frame)
+                if jpeg is not None:
+                    if self.motion_gate:
+                        with self.timing.time("motion"):
+                            moved = self.motion_gate.check_jpeg(jpeg, self.codec)
+                        if not moved:
+                            time.sleep(max(0.0, delay - (time.monotonic() - t0)))
+                            continue
+                    with self._frame_cond:
+                        self._set_last_buffer(None)
+                        self._last_frame = None
+                        self._last_jpeg = jpeg
+                        self._last_ts = captured
+                        self._seq += 1
+                        self._frame_cond.notify_all()
+                    time.sleep(max(0.0, delay - (time.monotonic() - t0)))
+                    continue
+                # el backend ignoró CONVERT_RGB=0: seguimos por la ruta normal
+                print("[WARN] La cámara no entrega MJPEG crudo; se desactiva passthrough")
+                self.passthrough = False
+            buf, frame = self._into_pool(buf, frame)
+            if self.motion_gate:
+                with self.timing.time("motion"):
+                    moved = self.motion_gate.check(frame)
+                if not moved:
+                    # escena quieta: ni se codifica ni se despierta a los clientes
+                    buf.release()
+                    time.sleep(max(0.0, delay - (time.monotonic() - t0)))
+                    continue
+            # codificar aquí, una sola vez, sin importar cuántos clientes haya
+            with self.timing.time("encode"):
+                jpeg = self.codec.encode(frame, self.jpeg_quality)
+            with self._frame_cond:
+                self._set_last_buffer(buf)
+                if jpeg is not None:
+                    self._last_jpeg = jpeg
+                    self._last_ts = captured
+                    self._seq += 1
+                    self._frame_cond.notify_all()
+            # respeta el FPS configurado sin sumar un retardo fijo al tiempo de lectura
+            time.sleep(max(0.0, delay - (time.monotonic() - t0)))
 
-    def get_frame(self):
-        with self._frame_lock:
-            return self._last_frame
+    def _into_pool(self, buf, frame):
+        """Deja el frame leído en un buffer del pool (WIDTHxHEIGHT). Retorna (buffer, array)."""
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            # el modo de la cámara no coincide: el frame crudo queda como buffer de
+            # trabajo para la próxima lectura y el resize escribe en el pool
+            self._native_fits = False
+            self._scratch = frame
+            shape = (self.height, self.width) + frame.shape[2:]
+            if buf is None or buf.array.shape != shape:
+                if buf is not None:
+                    buf.release()
+                buf = self._pool.acquire(shape, frame.dtype)
+            with self.timing.time("resize"):
+                cv2.resize(frame, (self.width, self.height), dst=buf.array)
+        elif buf is None or frame is not buf.array:
+            # primer frame (o el backend no escribió en el buffer dado): una copia y
+            # desde el próximo se lee directo al pool
+            self._native_fits = True
+            self._scratch = None
+            if buf is None or buf.array.shape != frame.shape:
+                if buf is not None:
+                    buf.release()
+                buf = self._pool.acquire(frame.shape, frame.dtype)
+            np.copyto(buf.array, frame)
+        return buf, buf.array
 
-    def get_jpeg(self):
-        frame = self.get_frame()
-        if frame is None:
+    def _set_last_buffer(self, buf):
+        # con _frame_lock tomado: el buffer publicado antes vuelve al pool cuando nadie lo lea
+        old, self._last_buffer = self._last_buffer, buf
+        if old is not None:
+            old.release()
+
+    @staticmethod
+    def _as_jpeg(raw):
+        """Bytes JPEG si `raw` es el buffer comprimido (1-D, empieza con FFD8); si no, None."""
+        if raw is None or raw.dtype != np.uint8 or raw.size < 4:
             return None
-        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
-        if not ok:
+        if raw.ndim == 3 or (raw.ndim == 2 and min(raw.shape) != 1):
             return None
-        return buf.tobytes()
+        data = raw.tobytes()
+        if data[:2] != b"\xff\xd8":
+            return None
+        return data
+
+    @contextmanager
+    def _latest_frame(self):
+        """(seq, frame) de solo lectura; si viene del pool, el buffer se devuelve al salir del with."""
+        with self._frame_lock:
+            lease = self._last_buffer.lease() if self._last_buffer is not None else None
+            seq = self._seq
+        if lease is not None:
+            with lease as frame:
+                yield seq, frame
+            return
+        yield self._decoded_frame()
+
+    def _decoded_frame(self):
+        """(seq, frame) sin pool: el último frame o, en passthrough, el JPEG decodificado."""
+        with self._frame_lock:
+            if not self.passthrough or self._decoded_seq == self._seq:
+                return self._seq, self._last_frame
+            seq, jpeg = self._seq, self._last_jpeg
+        # decodificación perezosa (solo para quien necesita píxeles: capturas, clasificación)
+        frame = self.codec.decode(jpeg) if jpeg else None
+        if frame is not None and (frame.shape[1], frame.shape[0]) != (self.width, self.height):
+            frame = cv2.resize(frame, (self.width, self.height))
+        if frame is not None:
+            frame.flags.writeable = False
+        with self._frame_lock:
+            if seq == self._seq:
+                self._last_frame = frame
+                self._decoded_seq = seq
+        return seq, frame
+
+    def get_frame(self):
+        """Último frame BGR (copia propia: el buffer del pool vuelve a usarse al retornar)."""
+        with self._latest_frame() as (_, frame):
+            return None if frame is None else frame.copy()
+
+    def get_jpeg(self):
+        with self._frame_lock:
+            return self._last_jpeg
+
+    def variant_size(self, w=None, h=None):
+        """Tamaño (w, h) de una variante: mantiene la proporción si falta un lado y nunca agranda."""
+        if not w and not h:
+            return self.width, self.height
+        if not h:
+            h = round(w * self.height / self.width)
+        elif not w:
+            w = round(h * self.width / self.height)
+        return max(16, min(int(w), self.width)), max(16, min(int(h), self.height))
+
+    def get_variant(self, w=None, h=None, q=None):
+        """Retorna (seq, ts, jpeg) del último frame en el tamaño/calidad pedidos, codificando a lo sumo una vez por frame."""
+        size = self.variant_size(w, h)
+        q = self.jpeg_quality if not q else max(10, min(int(q), 95))
+        if size == (self.width, self.height) and q == self.jpeg_quality:
+            with self._frame_lock:
+                return self._seq, self._last_ts, self._last_jpeg
+
+        key = (size, q)
+        with self._variants_lock:
+            entry = self._variants.get(key)
+            if entry is None:
+                entry = self._variants[key] = Variant()
+                while len(self._variants) > self.max_variants:
+                    self._variants.popitem(last=False)
+            else:
+                self._variants.move_to_end(key)
+
+        with entry.lock:
+            with self._frame_lock:
+                current, ts = self._seq, self._last_ts
+            if entry.seq == current and entry.jpeg is not None:
+                return entry.seq, entry.ts, entry.jpeg
+            with self._latest_frame() as (seq, frame):
+                if frame is None:
+                    return seq, ts, None
+                with self.timing.time("encode_variant"):
+                    if size != (frame.shape[1], frame.shape[0]):
+                        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    jpeg = self.codec.encode(frame, q)
+            if jpeg is None:
+                return seq, ts, None
+            entry.seq, entry.ts, entry.jpeg = seq, ts, jpeg
+            return entry.seq, entry.ts, entry.jpeg
+
+    def wait_latest(self, last_seq=0, timeout=1.0, w=None, h=None, q=None):
+        """Espera un frame más nuevo que `last_seq`. Retorna (seq, ts, jpeg) o (last_seq, None, None) si vence el timeout."""
+        with self._frame_cond:
+            self._frame_cond.wait_for(lambda: self._seq > last_seq, timeout)
+            if self._seq <= last_seq or self._last_jpeg is None:
+                return last_seq, None, None
+            if not (w or h or q):
+                return self._seq, self._last_ts, self._last_jpeg
+        seq, ts, jpeg = self.get_variant(w, h, q)
+        if jpeg is None:
+            return last_seq, None, None
+        return seq, ts, jpeg
+
+    def wait_jpeg(self, last_seq=0, timeout=1.0, w=None, h=None, q=None):
+        """Espera un JPEG más nuevo que `last_seq`. Retorna (seq, jpeg) o (last_seq, None) si vence el timeout."""
+        seq, _, jpeg = self.wait_latest(last_seq, timeout, w, h, q)
+        return seq, jpeg
+
+    def add_client(self, client):
+        self._clients.add(client)
+
+    def remove_client(self, client):
+        self._clients.remove(client)
+
+    def clients_stats(self):
+        return self._clients.stats()
+
+    def status(self):
+        with self._users_lock:
+            users = self._users
+        return {"state": self.state, "consumers": users, "linger_s": self.linger_s,
+                "standby_s": self.standby_s, "seq": self._seq, "mode": self.mode,
+                "codec": self.codec.info(), "frame_pool": self._pool.stats(),
+                "fps": self.measured_fps if self.state == "running" else 0.0,
+                "cpu_percent": self.cpu_percent if self.state == "running" else 0.0}
+
+    def get_fresh_variant(self, w=None, h=None, q=None, max_age=1.0, timeout=3.0):
+        """Como get_variant(), pero si el último frame es más viejo que `max_age` (p.ej. cámara recién reanudada) espera uno nuevo."""
+        seq, ts, jpeg = self.get_variant(w, h, q)
+        if jpeg is not None and time.time() - ts <= max_age:
+            return seq, ts, jpeg
+        new_seq, new_ts, new_jpeg = self.wait_latest(seq, timeout=timeout, w=w, h=h, q=q)
+        if new_jpeg is None:
+            return seq, ts, jpeg
+        return new_seq, new_ts, new_jpeg
+
+    def get_fresh_frame(self, max_age=1.0, timeout=3.0):
+        """Último frame BGR; espera uno nuevo si el guardado es más viejo que `max_age`."""
+        with self._frame_lock:
+            seq, ts = self._seq, self._last_ts
+        if self._last_jpeg is None or time.time() - ts > max_age:
+            self.wait_latest(seq, timeout=timeout)
+        return self.get_frame()
@@ -1,11 +1,58 @@
-CAMERA_INDEX = 0
+CAMERA_INDEX = 0   # o "bus" para leer del daemon de cámara (python -m pachacutin_camera.daemon)
+                   # o "synthetic", "file:video.mp4", "dir:carpeta" para probar sin cámara
 WIDTH = 640
 HEIGHT = 480
 FPS = 15
 JPEG_QUALITY = 70
+# backend JPEG: "opencv", "turbojpeg" (pip install PyTurboJPEG) o "auto".
+# Medir con: python -m pachacutin_camera.codec  (desde la raíz del repo)
+JPEG_CODEC = "opencv"
+JPEG_SUBSAMPLING = ""     # "420", "422", "444"; vacío = el del backend
+JPEG_FAST_DCT = False     # solo turbojpeg: DCT rápida (algo menos precisa)
+# al abrir la cámara se miden sus modos (formato/tamaño/fps) y se usa el más barato
+# que cumpla WIDTH/HEIGHT/FPS; el resultado queda en CAMERA_PROBE_CACHE (borrar para re-medir).
+# Apagado: la cámara se abre como siempre, con WIDTH/HEIGHT/FPS tal cual
+CAMERA_PROBE = False
+CAMERA_PROBE_CACHE = "camera_probe.json"
+# reenvía los JPEG que entrega la cámara (MJPG) tal cual, sin decodificar ni recodificar
+PASSTHROUGH = False
+# máximo de variantes (w, h, q) distintas en caché para /video?w=&h=&q=&fps=
+STREAM_MAX_VARIANTS = 8
+# latencia máxima por cliente: frames más viejos que esto se descartan (?max_latency_ms= lo ajusta)
+STREAM_MAX_LATENCY_S = 0.5
+# bytes en cola sin enviar por visor: con un cliente lento la escritura se bloquea y los
+# frames atrasados se descartan en vez de acumularse en el kernel (0 = sin límite)
+STREAM_SEND_BUFFER = 16 * 1024
+
+# compuerta de movimiento: con la escena quieta solo se publica un frame cada MOTION_KEEPALIVE_S.
+# Apagada: se publican todos los frames
+MOTION_GATE = False
+MOTION_THRESHOLD = 3.0      # diferencia media (0-255) sobre la imagen reducida
+MOTION_IDLE_AFTER_S = 3.0   # segundos sin cambios antes de bajar al keep-alive
+MOTION_KEEPALIVE_S = 1.0
+
+# activación por demanda: la captura corre solo mientras haya visores/capturas.
+# Apagada: la cámara se abre al arrancar y queda capturando
+DEMAND_DRIVEN = False
+CAMERA_LINGER_S = 10.0    # sigue capturando este tiempo después del último consumidor
+CAMERA_STANDBY_S = 30.0   # luego queda abierta sin leer (reanuda rápido) y al final se libera
+
+# varias cámaras a la vez: id -> ajustes que cambian respecto a los de arriba
+# (index, width, height, fps, jpeg_quality, passthrough, motion_gate, probe).
+# La primera es la de /video, /capture y /frame.jpg; el resto va en /video/<id>, /capture/<id>...
+CAMERAS = {
+    "main": {},
+    # "drill": {"index": 2, "width": 320, "height": 240, "fps": 10},
+}
 
 HOST = "0.0.0.0"
 PORT = 5000
 DEBUG = False
 
 CAPTURE_DIR = "static/captures"
+
+# escritura diferida de /capture: la respuesta no espera al disco
+CAPTURE_WORKERS = 2
+CAPTURE_QUEUE_MAX = 32    # con la cola llena se escribe en el hilo de la petición
+# calidad JPEG de /capture (la de cv2.imwrite); el JPEG del stream se reutiliza solo si ya la alcanza
+CAPTURE_QUALITY = 95